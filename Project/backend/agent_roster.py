@@ -0,0 +1,139 @@
+import os
+import json
+import time
+import threading
+from roster_snapshot import SnapshotRoster, snapshot_source_mtime
+
+ROSTER_CHECK_INTERVAL = float(os.getenv("ROSTER_CHECK_INTERVAL", "1"))
+
+class _JsonRoster:
+    """One immutable load of data.json plus its lookup indexes"""
+    def __init__(self, data, mtime):
+        self.data = data
+        self.mtime = mtime
+        self.agents = data.get("agents", [])
+        self._by_name = {}
+        self._by_id = {}
+        # setdefault keeps the first agent on duplicate keys, like the old linear scans
+        for agent in self.agents:
+            name = agent.get("name")
+            if name:
+                self._by_name.setdefault(name.lower(), agent)
+            agent_id = agent.get("agent_id")
+            if agent_id is not None:
+                self._by_id.setdefault(str(agent_id), agent)
+
+    def by_name(self, name):
+        return self._by_name.get(name.lower())
+
+    def by_id(self, agent_id):
+        return self._by_id.get(str(agent_id))
+
+    def summaries(self):
+        return [{"name": agent.get("name"), "agent_id": agent.get("agent_id")} for agent in self.agents]
+
+    def __len__(self):
+        return len(self.agents)
+
+class AgentRoster:
+    """
+    data.json indexed by lowercase agent name and by agent_id.
+
+    The file's mtime is checked at most every check_interval seconds; when it
+    changes the indexes are rebuilt off to the side and swapped in with a
+    single assignment, so concurrent lookups see either the old roster or the
+    new one, never a mix. A file that fails to parse keeps the last good roster.
+
+    If snapshot_path holds a snapshot compiled from the current data.json
+    (see roster_snapshot.py) it is used instead of parsing the JSON, so
+    agents are only materialized as they are looked up.
+    """
+    def __init__(self, path, snapshot_path=None, check_interval=ROSTER_CHECK_INTERVAL):
+        self.path = path
+        self.snapshot_path = snapshot_path
+        self.check_interval = check_interval
+        self.reloads = 0
+        self._lock = threading.Lock()
+        self._next_check = 0.0
+        self._failed_mtime = None
+        self._snapshot = _JsonRoster({}, None)
+        self._maybe_reload(force=True)
+
+    def _current(self):
+        if time.monotonic() >= self._next_check:
+            self._maybe_reload()
+        return self._snapshot
+
+    def _maybe_reload(self, force=False):
+        # Only one thread stats/rebuilds; the rest keep using the current snapshot
+        if not self._lock.acquire(blocking=force):
+            return
+        try:
+            self._next_check = time.monotonic() + self.check_interval
+            try:
+                mtime = os.stat(self.path).st_mtime_ns
+            except OSError:
+                return
+            if mtime == self._snapshot.mtime or mtime == self._failed_mtime:
+                return
+            if self.snapshot_path and snapshot_source_mtime(self.snapshot_path) == mtime:
+                self._snapshot = SnapshotRoster(self.snapshot_path, mtime)
+                self.reloads += 1
+                return
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Failed to reload {self.path}: {e}")
+                self._failed_mtime = mtime
+                return
+            self._snapshot = _JsonRoster(data, mtime)
+            self.reloads += 1
+        finally:
+            self._lock.release()
+
+    @property
+    def data(self):
+        return self._current().data
+
+    @property
+    def agents(self):
+        return self._current().agents
+
+    @property
+    def version(self):
+        """data.json mtime of the roster currently served; changes on every reload"""
+        return self._current().mtime
+
+    def summaries(self):
+        """name/agent_id for every agent, without materializing snapshot records"""
+        return self._current().summaries()
+
+    def __len__(self):
+        return len(self._current())
+
+    def by_name(self, name):
+        if not name:
+            return None
+        return self._current().by_name(name)
+
+    def by_id(self, agent_id):
+        if agent_id is None:
+            return None
+        return self._current().by_id(agent_id)
+
+    def find(self, key):
+        """Agent by name (case-insensitive), falling back to agent_id"""
+        snapshot = self._current()
+        if not key:
+            return None
+        return snapshot.by_name(key) or snapshot.by_id(key)
+
+    def stats(self):
+        snapshot = self._snapshot
+        return {
+            "agents": len(snapshot),
+            "source": "snapshot" if isinstance(snapshot, SnapshotRoster) else "json",
+            "reloads": self.reloads,
+            "mtime_ns": snapshot.mtime
+        }
@@ -2,29 +2,78 @@ import os
 import json
 import sys
 import re
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
 from datetime import datetime
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify, stream_with_context, g
 from flask_cors import CORS, cross_origin
-from sqlalchemy import create_engine, Column, Integer, String, Text, DateTime, ForeignKey, inspect, text
+from sqlalchemy import create_engine, event, Column, Integer, String, Text, DateTime, ForeignKey, Index, inspect, text, select, insert, func, or_, and_
 from sqlalchemy.orm import sessionmaker, declarative_base, relationship
 
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from message_writer import MessageWriter
+from session_turns import SessionTurns, TurnWaitTimeout
+from job_queue import JobQueue
+from agent_roster import AgentRoster
+from clock_time import format_clock, clock_difference
+from roster_triage import RosterTriage, SCENARIO_SEVERITY, time_scenario
+from metrics import REGISTRY, CONTENT_TYPE, REQUEST_SECONDS, STAGE_SECONDS, LLM_TIMEOUTS, LLM_FALLBACKS
+
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "..", "data", "sessions.db")
-DATA_JSON_PATH = os.path.join(BASE_DIR, "..", "data", "data.json")
+DB_PATH = os.getenv("DB_PATH", os.path.join(BASE_DIR, "..", "data", "sessions.db"))
+DATA_JSON_PATH = os.getenv("DATA_JSON_PATH", os.path.join(BASE_DIR, "..", "data", "data.json"))
+ROSTER_SNAPSHOT_PATH = os.getenv("ROSTER_SNAPSHOT_PATH", os.path.join(BASE_DIR, "..", "data", "roster.db"))
 DB_URL = f"sqlite:///{DB_PATH}"
 
+SQLITE_JOURNAL_MODE = os.getenv("SQLITE_JOURNAL_MODE", "WAL")
+SQLITE_SYNCHRONOUS = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+SQLITE_CACHE_KB = int(os.getenv("SQLITE_CACHE_KB", "20000"))
+SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "5000"))
+DB_GROUP_COMMIT = os.getenv("DB_GROUP_COMMIT", "0") == "1"
+DB_GROUP_COMMIT_MS = float(os.getenv("DB_GROUP_COMMIT_MS", "5"))
+DB_GROUP_COMMIT_MAX_ROWS = int(os.getenv("DB_GROUP_COMMIT_MAX_ROWS", "256"))
+BULK_CHUNK_ROWS = int(os.getenv("BULK_CHUNK_ROWS", "1000"))
+AGENT_PROFILE_CACHE_SIZE = int(os.getenv("AGENT_PROFILE_CACHE_SIZE", "4096"))
+
+TRACKER_MAX_SESSIONS = int(os.getenv("TRACKER_MAX_SESSIONS", "1000"))
+TRACKER_IDLE_TTL = int(os.getenv("TRACKER_IDLE_TTL", "1800"))
+SESSION_TURN_DEDUP_S = float(os.getenv("SESSION_TURN_DEDUP_S", "2"))
+SESSION_TURN_WAIT_S = float(os.getenv("SESSION_TURN_WAIT_S", "60"))
+SUMMARY_JOBS = os.getenv("SUMMARY_JOBS", "1") == "1"
+SUMMARY_LLM = os.getenv("SUMMARY_LLM", "0") == "1"
+REANALYZE_JOB_MAX_SESSIONS = int(os.getenv("REANALYZE_JOB_MAX_SESSIONS", "1000"))
+
+LLM_MODES = ("full", "off", "shadow", "budgeted")
+LLM_MODE = os.getenv("LLM_MODE", "full").lower()
+LLM_BUDGET_MS = int(os.getenv("LLM_BUDGET_MS", "1500"))
+if LLM_MODE not in LLM_MODES:
+    print(f"Unknown LLM_MODE '{LLM_MODE}', using 'full'")
+    LLM_MODE = "full"
+
 os.makedirs(os.path.join(BASE_DIR, "..", "data"), exist_ok=True)
+os.makedirs(os.path.dirname(os.path.abspath(DB_PATH)), exist_ok=True)
+
+agent_roster = AgentRoster(DATA_JSON_PATH, snapshot_path=ROSTER_SNAPSHOT_PATH)
+roster_triage = RosterTriage(agent_roster)
 
-if os.path.exists(DATA_JSON_PATH):
-    with open(DATA_JSON_PATH, "r", encoding="utf-8") as f:
-        localData = json.load(f)
-else:
-    localData = {}
+engine = create_engine(DB_URL, connect_args={"check_same_thread": False, "timeout": SQLITE_BUSY_TIMEOUT_MS / 1000})
+
+@event.listens_for(engine, "connect")
+def configure_sqlite(dbapi_connection, connection_record):
+    """WAL lets readers run alongside the single writer; NORMAL sync fsyncs at checkpoints, not per commit"""
+    cursor = dbapi_connection.cursor()
+    cursor.execute(f"PRAGMA journal_mode={SQLITE_JOURNAL_MODE}")
+    cursor.execute(f"PRAGMA synchronous={SQLITE_SYNCHRONOUS}")
+    cursor.execute(f"PRAGMA cache_size=-{SQLITE_CACHE_KB}")
+    cursor.execute("PRAGMA temp_store=MEMORY")
+    cursor.execute(f"PRAGMA busy_timeout={SQLITE_BUSY_TIMEOUT_MS}")
+    cursor.close()
 
-engine = create_engine(DB_URL, connect_args={"check_same_thread": False})
 SessionLocal = sessionmaker(bind=engine)
 Base = declarative_base()
 
@@ -37,6 +86,10 @@ class ChatSession(Base):
 
     messages = relationship("ChatMessage", back_populates="session", cascade="all, delete-orphan")
 
+    __table_args__ = (
+        Index("ix_sessions_created_at_id", "created_at", "id"),
+    )
+
 class ChatMessage(Base):
     __tablename__ = "messages"
     id = Column(Integer, primary_key=True, index=True)
@@ -47,6 +100,11 @@ class ChatMessage(Base):
 
     session = relationship("ChatSession", back_populates="messages")
 
+    __table_args__ = (
+        Index("ix_messages_session_created_at", "session_id", "created_at"),
+        Index("ix_messages_session_id_id", "session_id", "id"),
+    )
+
 def check_and_update_database():
     """Check if database needs to be updated and handle migrations"""
     inspector = inspect(engine)
@@ -85,32 +143,394 @@ def check_and_update_database():
                 Base.metadata.create_all(bind=engine)
 
     Base.metadata.create_all(bind=engine)
+
+    # create_all skips indexes on tables that already exist
+    for table in Base.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=engine, checkfirst=True)
 check_and_update_database()
 
+message_writer = MessageWriter(
+    engine,
+    ChatMessage.__table__,
+    ChatSession.__table__,
+    max_batch=DB_GROUP_COMMIT_MAX_ROWS,
+    max_delay_ms=DB_GROUP_COMMIT_MS
+) if DB_GROUP_COMMIT else None
+
 
 app = Flask(__name__)
 CORS(app) 
 
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
 @app.after_request
 def after_request(response):
+    started = g.get("request_started")
+    if started is not None:
+        REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            route=request.url_rule.rule if request.url_rule else "unmatched",
+            method=request.method,
+            status=response.status_code
+        )
     response.headers.add('Access-Control-Allow-Origin', '*')
     response.headers.add('Access-Control-Allow-Headers', 'Content-Type,Authorization')
     response.headers.add('Access-Control-Allow-Methods', 'GET,PUT,POST,DELETE,OPTIONS')
     response.headers.add('Access-Control-Allow-Credentials', 'true')
+    response.headers.add('Access-Control-Expose-Headers', 'X-Next-Cursor, ETag')
     return response
 
+from state_store import STATE_BACKEND, create_state_store
+from keyword_matcher import KeywordMatcher
+
 try:
-    from openai_client import chat_with_gpt
+    from openai_client import chat_with_gpt, submit_chat_with_gpt, stream_chat_with_gpt, validate_question, response_cache, record_llm_error, llm_backend_stats, complete_text
     OPENAI_AVAILABLE = True
     print("OpenAI client imported successfully")
 except ImportError as e:
     print(f"Could not import OpenAI client: {e}")
     OPENAI_AVAILABLE = False
+    response_cache = None
+    submit_chat_with_gpt = None
+    stream_chat_with_gpt = None
+    validate_question = None
+    record_llm_error = None
+    llm_backend_stats = None
+    complete_text = None
     def chat_with_gpt(messages, model="qwen:1.8b", temperature=0.2, max_tokens=100, **kwargs):
         return "What were you doing during this time?"
 
+TRACKER_FIELDS = ("asked_questions", "established_facts", "unresolved_issues")
+
+def new_tracker():
+    """Empty per-session investigation tracker"""
+    return {
+        "asked_questions": [],
+        "established_facts": set(),
+        "unresolved_issues": set(),
+        "processed_messages": 0,
+        "last_message_digest": "",
+        "assistant_questions": 0
+    }
+
+def message_digest(message):
+    return hashlib.sha1(f"{message['role']}:{message['content']}".encode("utf-8", "ignore")).hexdigest()[:16]
+
+def tracker_to_state(tracker):
+    """Convert a tracker into JSON-serializable lists"""
+    return {
+        "asked_questions": list(tracker["asked_questions"]),
+        "established_facts": sorted(tracker["established_facts"]),
+        "unresolved_issues": sorted(tracker["unresolved_issues"]),
+        "processed_messages": tracker.get("processed_messages", 0),
+        "last_message_digest": tracker.get("last_message_digest", ""),
+        "assistant_questions": tracker.get("assistant_questions", 0)
+    }
+
+def tracker_from_state(state):
+    """Rebuild a tracker from a stored conversation_state dict, or None if it has no tracker fields"""
+    if not isinstance(state, dict) or not any(field in state for field in TRACKER_FIELDS):
+        return None
+    return {
+        "asked_questions": list(state.get("asked_questions") or []),
+        "established_facts": set(state.get("established_facts") or []),
+        "unresolved_issues": set(state.get("unresolved_issues") or []),
+        "processed_messages": int(state.get("processed_messages") or 0),
+        "last_message_digest": state.get("last_message_digest") or "",
+        "assistant_questions": int(state.get("assistant_questions") or 0)
+    }
+
+def merge_tracker_states(base, ours, theirs):
+    """
+    Three-way merge of tracker states: apply what this worker changed since
+    `base` on top of `theirs`, the newer state another worker saved.
+    """
+    base = base or tracker_to_state(new_tracker())
+    added_facts = set(ours["established_facts"]) - set(base["established_facts"])
+    added_issues = set(ours["unresolved_issues"]) - set(base["unresolved_issues"])
+    resolved_issues = set(base["unresolved_issues"]) - set(ours["unresolved_issues"])
+    asked = list(theirs["asked_questions"])
+    for question in ours["asked_questions"]:
+        if question not in base["asked_questions"] and question not in asked:
+            asked.append(question)
+    latest = ours if ours["processed_messages"] >= theirs["processed_messages"] else theirs
+    return {
+        "asked_questions": asked,
+        "established_facts": sorted(set(theirs["established_facts"]) | added_facts),
+        "unresolved_issues": sorted((set(theirs["unresolved_issues"]) | added_issues) - resolved_issues),
+        "processed_messages": latest["processed_messages"],
+        "last_message_digest": latest["last_message_digest"],
+        "assistant_questions": max(ours["assistant_questions"], theirs["assistant_questions"])
+    }
+
+class SessionTracker:
+    """Bounded per-session tracker cache with LRU and idle-TTL eviction.
+
+    Misses are rehydrated from the shared `store` first and then through
+    `loader`, so evicted sessions and sessions from before a restart pick up
+    where they left off. With a shared store, call refresh() at the start of a
+    turn and save() after it so every worker process sees the same state.
+    save() is a compare-and-set against the version read by refresh(); if
+    another worker saved the session in between, the two updates are merged.
+    """
+    def __init__(self, loader=None, max_sessions=1000, idle_ttl=1800, store=None):
+        self.loader = loader
+        self.store = store
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self._entries = OrderedDict()
+        # key -> (state as read from the store, its version) for compare-and-set saves
+        self._bases = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(session_id):
+        try:
+            return int(session_id)
+        except (TypeError, ValueError):
+            return session_id
+
+    def _evict(self, now):
+        while self._entries:
+            key, (_, last_access) = next(iter(self._entries.items()))
+            if len(self._entries) > self.max_sessions or now - last_access > self.idle_ttl:
+                del self._entries[key]
+                self._bases.pop(key, None)
+            else:
+                break
+
+    def get(self, session_id, default=None):
+        key = self._key(session_id)
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries[key] = (entry[0], now)
+                self._entries.move_to_end(key)
+                return entry[0]
+
+        tracker = None
+        base = None
+        if self.store is not None:
+            try:
+                state, version = self.store.load_versioned(key)
+                tracker = tracker_from_state(state)
+                base = (tracker_to_state(tracker) if tracker is not None else None, version)
+            except Exception as e:
+                print(f"State store load error: {e}")
+        if tracker is None and self.loader is not None:
+            try:
+                tracker = self.loader(key)
+            except Exception as e:
+                print(f"Tracker rehydration error: {e}")
+            if tracker is not None and base is not None:
+                base = (tracker_to_state(tracker), base[1])
+        if tracker is None:
+            return default
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[0]
+            self._entries[key] = (tracker, now)
+            if base is not None:
+                self._bases[key] = base
+            self._evict(now)
+        return tracker
+
+    def __setitem__(self, session_id, tracker):
+        key = self._key(session_id)
+        now = time.monotonic()
+        with self._lock:
+            self._entries[key] = (tracker, now)
+            self._entries.move_to_end(key)
+            self._evict(now)
+
+    def __getitem__(self, session_id):
+        tracker = self.get(session_id)
+        if tracker is None:
+            raise KeyError(session_id)
+        return tracker
+
+    def __contains__(self, session_id):
+        return self.get(session_id) is not None
+
+    def refresh(self, session_id):
+        """Drop the local copy so the next access reads the shared store"""
+        if self.store is not None:
+            self.pop(session_id)
+
+    def save(self, session_id, max_attempts=5):
+        """Write the local tracker back to the shared store, merging with concurrent saves"""
+        if self.store is None:
+            return
+        key = self._key(session_id)
+        with self._lock:
+            entry = self._entries.get(key)
+            base, version = self._bases.get(key, (None, 0))
+        if entry is None:
+            return
+        tracker = entry[0]
+        ours = tracker_to_state(tracker)
+        state = ours
+        try:
+            for _ in range(max_attempts):
+                if self.store.compare_and_save(key, state, version):
+                    break
+                theirs, version = self.store.load_versioned(key)
+                theirs = tracker_to_state(tracker_from_state(theirs) or new_tracker())
+                state = merge_tracker_states(base, ours, theirs)
+            else:
+                print(f"State store save conflict for session {key}: gave up after {max_attempts} attempts")
+                return
+        except Exception as e:
+            print(f"State store save error: {e}")
+            return
+
+        merged = tracker_from_state(state)
+        with self._lock:
+            if state is not ours:
+                for field in merged:
+                    tracker[field] = merged[field]
+            self._bases[key] = (state, version + 1)
+
+    def pop(self, session_id, default=None):
+        key = self._key(session_id)
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            self._bases.pop(key, None)
+        return entry[0] if entry is not None else default
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+TIME_PATTERN = re.compile(r'(\d{1,2}):?(\d{2})?\s*(am|pm|AM|PM)?')
+
+# "time_mention" stands in for TIME_PATTERN, which matches wherever a digit appears
+USER_FACT_MATCHER = KeywordMatcher({
+    "activity": ["meeting", "training", "session", "conference", "briefing", "workshop"],
+    "time_mention": list("0123456789"),
+    "arrival": ["arrived", "came", "reached", "started", "clocked", "entered", "early", "before"],
+    "organizer": ["supervisor", "manager", "team lead", "organized", "lead", "headed", "colleague", "coworker"],
+    "duration": ["minutes", "hours", "duration", "lasted", "until", "from", "about"],
+    "purpose": ["topic", "about", "purpose", "discuss", "agenda", "subject", "work", "preparation"],
+    "phone_explanation": ["glitch", "error", "technical", "issue", "problem", "malfunction", "wrong", "incorrect", "faulty"]
+})
+
+SUMMARY_MATCHER = KeywordMatcher({
+    "meeting": ["meeting", "conference", "briefing"],
+    "technical": ["glitch", "error", "technical", "system wrong"],
+    "early": ["early", "before time", "arrived early"],
+    "work": ["work", "preparation", "routine", "task"],
+    "no_witness": ["no one", "nobody", "alone", "verify"],
+    "colleagues": ["supervisor", "manager", "colleague", "team"]
+})
+
+CONTEXTUAL_FOLLOWUPS = {
+    "system.*wrong|phone.*wrong": [
+        "What makes you think the system and phone recordings are incorrect?",
+        "How did you determine your actual start time if both system and phone are wrong?",
+        "Do you have any other way to verify your arrival time?"
+    ],
+    "daily routine|normal routine|regular routine": [
+        "Could you describe what your daily routine involves when you first arrive?",
+        "What specific tasks are part of your morning routine at the office?",
+        "When you say 'daily routine', what work activities does that typically include?"
+    ],
+    "not specific|nothing specific|just routine": [
+        "Let me be more specific - were you checking emails, preparing equipment, or something else?",
+        "What's the first work-related task you typically complete when you arrive early?",
+        "Could you give an example of what you might do during this early arrival time?"
+    ],
+    "security|face scan|building.*enter": [
+        "Does the building security system provide any timestamp confirmation of your arrival?",
+        "If you use face scan for tracking, why do you think it didn't record your early arrival?",
+        "Can the security system logs verify your entry time?"
+    ],
+    "no one|nobody|alone": [
+        "Since no one was present, how do you typically document your early start times for record-keeping?",
+        "What process do you follow to ensure early arrivals are properly recorded when working alone?",
+        "Do you use any digital tools or apps to track your time when arriving before others?"
+    ],
+    "meeting|conference|briefing": [
+        "Who organized this meeting and what was its purpose?",
+        "Was this meeting scheduled in advance or was it impromptu?",
+        "How long did the meeting last and who else attended?"
+    ],
+    "glitch|error|technical|issue|problem": [
+        "Have you experienced similar technical issues with the time tracking system before?",
+        "Did you report this technical issue to IT or your supervisor?",
+        "What steps did you take to address the technical problem you mentioned?"
+    ],
+    "early|before.*time|arrived.*early": [
+        "What was the reason for arriving early today specifically?",
+        "Did you have any urgent tasks that required early preparation?",
+        "Is arriving early part of your regular schedule or was this unusual?"
+    ]
+}
+
+FOLLOWUP_MATCHER = KeywordMatcher({pattern: [pattern] for pattern in CONTEXTUAL_FOLLOWUPS}, regex=True)
+
+SIMILAR_PHRASES = [
+    "what.*activity", "work.*related", "personal",
+    "who.*verify", "anyone.*verify", "witness",
+    "how.*track", "track.*work", "record.*time",
+    "what.*routine", "daily.*routine", "morning.*routine",
+    "technical.*issue", "system.*wrong", "phone.*wrong"
+]
+
+SIMILAR_PHRASE_MATCHER = KeywordMatcher({phrase: [phrase] for phrase in SIMILAR_PHRASES}, regex=True)
+
+KEY_PHRASE_MATCHER = KeywordMatcher({phrase: [phrase] for phrase in [
+    "why did you edit", 
+    "phone shows", 
+    "explain this difference",
+    "what activities",
+    "who organized",
+    "how long",
+    "can verify",
+    "work-related"
+]})
+
+@lru_cache(maxsize=4096)
+def similar_phrase_hits(question_lower):
+    """Questions come from a small fixed set, so their phrase hits are cached"""
+    return frozenset(SIMILAR_PHRASE_MATCHER.categories(question_lower))
+
+PROFILE_TIME_FIELDS = [
+    ("scheduled", "start"), ("scheduled", "end"),
+    ("system", "start"), ("system", "end"),
+    ("phone", "start"), ("phone", "end"),
+    ("edited", "start"), ("edited", "end")
+]
+PROFILE_SECTIONS = {"scheduled": "schedule", "system": "system", "phone": "phone", "edited": "agent_disputed"}
+
+def agent_time_key(agent_context):
+    """The agent's raw time strings, in PROFILE_TIME_FIELDS order"""
+    return tuple(
+        (agent_context.get(PROFILE_SECTIONS[label]) or {}).get(f"{edge}_time")
+        for label, edge in PROFILE_TIME_FIELDS
+    )
+
+def shift_date_label(time_str):
+    """'10/14/2025 9:00 AM' -> 'October 14, 2025', or 'N/A'"""
+    if not time_str or time_str == 'unknown':
+        return 'N/A'
+    try:
+        date_part = time_str.split(' ')[0]
+        dt = datetime.strptime(date_part, '%m/%d/%Y')
+        return dt.strftime('%B %d, %Y')
+    except:
+        return 'N/A'
+
 class ConversationManager:
-    def __init__(self):
+    def __init__(self, tracker=None, incremental_analysis=True):
+        self.incremental_analysis = incremental_analysis
         self.question_sequences = {
             "initial": "Why did you edit your start time from {system_start} to {edited_start}?",
             "followup_1": "You mentioned arriving early. What specific activities were you engaged in before your scheduled start time?",
@@ -120,127 +540,79 @@ class ConversationManager:
             "followup_5": "How do you typically track your work hours when you arrive early?",
             "verification": "To confirm: You {activity_description}. Is this complete and accurate?"
         }
-        self.asked_questions_tracker = {}
+        self.asked_questions_tracker = tracker if tracker is not None else SessionTracker()
+        self._profiles = OrderedDict()
+        self._profiles_lock = threading.Lock()
+
+    def time_profile(self, agent_context):
+        """
+        Normalized times, pairwise start-time diffs and scenario label for an agent.
+
+        Profiles depend only on the agent's raw time strings, so they're cached
+        by those (bounded by AGENT_PROFILE_CACHE_SIZE) and survive roster
+        reloads for agents whose times didn't change.
+        """
+        key = agent_time_key(agent_context)
+        with self._profiles_lock:
+            profile = self._profiles.get(key)
+            if profile is not None:
+                self._profiles.move_to_end(key)
+                return profile
+
+        times = {
+            f"{label}_{edge}": self.standardize_time_format(raw)
+            for (label, edge), raw in zip(PROFILE_TIME_FIELDS, key)
+        }
+        diffs = {
+            "start_time_diff": self.get_time_difference(times["edited_start"], times["system_start"]),
+            "phone_system_diff": self.get_time_difference(times["phone_start"], times["system_start"]),
+            "phone_edited_diff": self.get_time_difference(times["phone_start"], times["edited_start"])
+        }
+        profile = {
+            "shift_date": shift_date_label(key[0]),
+            "times": times,
+            "diffs": diffs,
+            "scenario": analyze_time_scenario(
+                times["system_start"], times["phone_start"], times["edited_start"],
+                diffs["start_time_diff"], diffs["phone_system_diff"], diffs["phone_edited_diff"]
+            )
+        }
+        with self._profiles_lock:
+            self._profiles[key] = profile
+            if len(self._profiles) > AGENT_PROFILE_CACHE_SIZE:
+                self._profiles.popitem(last=False)
+        return profile
 
     def standardize_time_format(self, time_str):
-        """Convert many time formats to consistent h:mm:ss AM/PM or return 'unknown'."""
-        if not time_str or str(time_str).strip() == '':
-            return 'unknown'
-
-        try:
-            s = str(time_str).strip()
-            try:
-                dt = datetime.fromisoformat(s)
-                return dt.strftime("%I:%M:%S %p")
-            except Exception:
-                pass
-
-            m = re.search(r'(\d{1,2}):(\d{2})(?::(\d{2}))?\s*(AM|PM|am|pm)?', s)
-            if m:
-                hour = int(m.group(1))
-                minute = int(m.group(2))
-                second = int(m.group(3)) if m.group(3) else 0
-                period = m.group(4)
-
-                if period:
-                    period = period.upper()
-                    if period == 'PM' and hour != 12:
-                        hour += 12
-                    if period == 'AM' and hour == 12:
-                        hour = 0
-                else:
-                    if 0 <= hour <= 23:
-                        pass  
-                    else:
-                        
-                        return 'unknown'
-
-                disp_hour = hour
-                disp_period = 'AM'
-                if hour == 0:
-                    disp_hour = 12
-                    disp_period = 'AM'
-                elif hour == 12:
-                    disp_hour = 12
-                    disp_period = 'PM'
-                elif hour > 12:
-                    disp_hour = hour - 12
-                    disp_period = 'PM'
-                else:
-                    disp_period = 'AM'
-
-                return f"{disp_hour:02d}:{minute:02d}:{second:02d} {disp_period}"
-
-            m2 = re.search(r'^\d{1,4}$', s)
-            if m2:
-                val = s
-                if len(val) in (3,4):
-                    minute_part = val[-2:]
-                    hour_part = val[:-2]
-                    hour = int(hour_part)
-                    minute = int(minute_part)
-                    return self.standardize_time_format(f"{hour}:{minute}:00")
-                elif len(val) <= 2:
-                    hour = int(val)
-                    return self.standardize_time_format(f"{hour}:00:00")
-
-            return 'unknown'
-
-        except Exception as e:
-            print(f"Time standardization error: {e}")
-            return 'unknown'
+        """Convert many time formats to consistent hh:mm:ss AM/PM or return 'unknown'."""
+        return format_clock(time_str)
 
     def get_time_difference(self, time1_str, time2_str):
         """Calculate time difference in minutes between two time strings. Returns int or None."""
-        if not time1_str or not time2_str:
-            return None
-
-        try:
-            def parse_time_to_minutes(time_str):
-                standardized = self.standardize_time_format(time_str)
-                if standardized == 'unknown':
-                    return None
-                parts = standardized.split(' ')
-                time_part = parts[0]
-                period = parts[1] if len(parts) > 1 else 'AM'
-
-                hours, minutes, seconds = map(int, time_part.split(':'))
-
-                if period.upper() == 'PM' and hours != 12:
-                    hours += 12
-                elif period.upper() == 'AM' and hours == 12:
-                    hours = 0
-
-                return hours * 60 + minutes
-
-            t1 = parse_time_to_minutes(time1_str)
-            t2 = parse_time_to_minutes(time2_str)
-
-            if t1 is None or t2 is None:
-                return None
-
-            return abs(t1 - t2)
-
-        except Exception as e:
-            print(f"Time difference calculation error: {e}")
-            return None
+        return clock_difference(time1_str, time2_str)
 
     def analyze_conversation_state(self, messages, agent_context, session_id):
         """Analyze current conversation state and determine next action"""
-        user_messages = [msg["content"] for msg in messages if msg["role"] == "user"]
-        assistant_messages = [msg["content"] for msg in messages if msg["role"] == "assistant"]
-        
-        question_count = sum(1 for msg in assistant_messages if msg.strip().endswith('?'))
-        
-        if session_id not in self.asked_questions_tracker:
-            self.asked_questions_tracker[session_id] = {
-                "asked_questions": [],
-                "established_facts": set(),
-                "unresolved_issues": set()
-            }
-        
-        tracker = self.asked_questions_tracker[session_id]
-        
+        tracker = self.asked_questions_tracker.get(session_id)
+        if tracker is None:
+            tracker = new_tracker()
+            self.asked_questions_tracker[session_id] = tracker
+
+        # Facts only ever get added, so messages already scanned on an earlier
+        # turn cannot change the outcome; only scan from the watermark on.
+        start = self.unprocessed_start(tracker, messages)
+        new_messages = messages[start:]
+        new_user_messages = [msg["content"] for msg in new_messages if msg["role"] == "user"]
+
+        question_count = tracker.get("assistant_questions", 0) if start else 0
+        question_count += sum(1 for msg in new_messages if msg["role"] == "assistant" and msg["content"].strip().endswith('?'))
+        last_question_asked = next((msg["content"] for msg in reversed(messages) if msg["role"] == "assistant"), "")
+
+        if messages:
+            tracker["processed_messages"] = len(messages)
+            tracker["last_message_digest"] = message_digest(messages[-1])
+            tracker["assistant_questions"] = question_count
+
         state = {
             "established_facts": list(tracker["established_facts"]),
             "unresolved_issues": list(tracker["unresolved_issues"]),
@@ -248,31 +620,32 @@ class ConversationManager:
             "conversation_stage": "initial",
             "quality_score": 0,
             "question_count": question_count,
-            "last_question_asked": assistant_messages[-1] if assistant_messages else "",
+            "last_question_asked": last_question_asked,
             "asked_questions": tracker["asked_questions"]
         }
 
-        recent_user_text = " ".join(user_messages[-3:]).lower() if user_messages else ""
-        all_user_text = " ".join(user_messages).lower()
+        recent_hits = USER_FACT_MATCHER.categories(" ".join(new_user_messages[-3:]).lower())
+        if len(new_user_messages) > 3:
+            all_hits = USER_FACT_MATCHER.categories(" ".join(new_user_messages).lower())
+        else:
+            all_hits = recent_hits
 
-        if any(word in all_user_text for word in ["meeting", "training", "session", "conference", "briefing", "workshop"]):
+        if "activity" in all_hits:
             tracker["established_facts"].add("was_in_activity")
         
-        time_pattern = re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm|AM|PM)?', recent_user_text)
-        if (time_pattern or any(word in recent_user_text for word in 
-            ["arrived", "came", "reached", "started", "clocked", "entered", "early", "before"])):
+        if "time_mention" in recent_hits or "arrival" in recent_hits:
             tracker["established_facts"].add("stated_arrival_time")
         
-        if any(word in recent_user_text for word in ["supervisor", "manager", "team lead", "organized", "lead", "headed", "colleague", "coworker"]):
+        if "organizer" in recent_hits:
             tracker["established_facts"].add("mentioned_organizer")
         
-        if any(word in recent_user_text for word in ["minutes", "hours", "duration", "lasted", "until", "from", "about"]):
+        if "duration" in recent_hits:
             tracker["established_facts"].add("provided_duration")
         
-        if any(word in recent_user_text for word in ["topic", "about", "purpose", "discuss", "agenda", "subject", "work", "preparation"]):
+        if "purpose" in recent_hits:
             tracker["established_facts"].add("mentioned_purpose")
         
-        if any(word in recent_user_text for word in ["glitch", "error", "technical", "issue", "problem", "malfunction", "wrong", "incorrect", "faulty"]):
+        if "phone_explanation" in recent_hits:
             tracker["established_facts"].add("explained_phone_discrepancy")
             if "phone_vs_edited_discrepancy" in tracker["unresolved_issues"]:
                 tracker["unresolved_issues"].remove("phone_vs_edited_discrepancy")
@@ -280,16 +653,14 @@ class ConversationManager:
         state["established_facts"] = list(tracker["established_facts"])
         state["unresolved_issues"] = list(tracker["unresolved_issues"])
 
-        phone_time = self.standardize_time_format(agent_context.get('phone', {}).get('start_time', ''))
-        system_time = self.standardize_time_format(agent_context.get('system', {}).get('start_time', ''))
-        edited_time = self.standardize_time_format(agent_context.get('agent_disputed', {}).get('start_time', ''))
+        profile_diffs = self.time_profile(agent_context)["diffs"]
 
-        phone_edited_diff = self.get_time_difference(phone_time, edited_time)
+        phone_edited_diff = profile_diffs["phone_edited_diff"]
         if (phone_edited_diff is not None and phone_edited_diff > 0 and 
             "explained_phone_discrepancy" not in tracker["established_facts"]):
             tracker["unresolved_issues"].add("phone_vs_edited_discrepancy")
 
-        system_edited_diff = self.get_time_difference(system_time, edited_time)
+        system_edited_diff = profile_diffs["start_time_diff"]
         if system_edited_diff is not None and system_edited_diff > 0 and "explained_system_discrepancy" not in tracker["established_facts"]:
             tracker["unresolved_issues"].add("system_vs_edited_discrepancy")
 
@@ -309,6 +680,39 @@ class ConversationManager:
 
         return state
 
+    def replay_conversation_state(self, messages, agent_context, session_id):
+        """
+        analyze_conversation_state over each prefix of messages that ends in
+        a user turn, as the live chat ran it, then over the whole history.
+        Most facts only count in the last few user messages of a scan, so
+        one pass over a long history would miss facts stated early on.
+        """
+        state = None
+        for end, msg in enumerate(messages, 1):
+            if msg["role"] == "user":
+                state = self.analyze_conversation_state(messages[:end], agent_context, session_id)
+        if state is None or messages[-1]["role"] != "user":
+            state = self.analyze_conversation_state(messages, agent_context, session_id)
+        return state
+
+    def unprocessed_start(self, tracker, messages):
+        """Index of the first message not yet scanned into this session's tracker"""
+        if not self.incremental_analysis:
+            return 0
+        processed = tracker.get("processed_messages", 0)
+        if (processed <= 0 or processed > len(messages) or
+                tracker.get("last_message_digest") != message_digest(messages[processed - 1])):
+            return 0
+        return processed
+
+    def persistable_state(self, session_id, conversation_state=None):
+        """Conversation state merged with the live tracker, ready for sessions.conversation_state"""
+        out = dict(conversation_state or {})
+        tracker = self.asked_questions_tracker.get(session_id)
+        if tracker is not None:
+            out.update(tracker_to_state(tracker))
+        return out
+
     def build_activity_description(self, conversation_state, agent_context):
         """Build a summary description for verification"""
         parts = []
@@ -316,7 +720,7 @@ class ConversationManager:
         if "was_in_activity" in conversation_state["established_facts"]:
             parts.append("were engaged in preparatory work activities")
 
-        edited_time = self.standardize_time_format(agent_context.get('agent_disputed', {}).get('start_time', ''))
+        edited_time = self.time_profile(agent_context)["times"]["edited_start"]
         if edited_time != 'unknown':
             parts.append(f"starting at {edited_time}")
 
@@ -347,29 +751,29 @@ class ConversationManager:
         key_points = []
         
         for i, (user_msg, assistant_msg) in enumerate(zip(user_messages, assistant_messages)):
-            user_lower = user_msg.lower()
+            hits = SUMMARY_MATCHER.categories(user_msg.lower())
             
-            time_match = re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm|AM|PM)?', user_msg)
+            time_match = TIME_PATTERN.search(user_msg)
             if time_match and "arrival time" not in str(key_points).lower():
                 hour = time_match.group(1)
                 minute = time_match.group(2) or '00'
                 period = (time_match.group(3) or 'AM').upper()
                 key_points.append(f"Arrival time: {hour}:{minute} {period}")
             
-            if any(word in user_lower for word in ["meeting", "conference", "briefing"]):
+            if "meeting" in hits:
                 key_points.append("Reason: Scheduled meeting")
-            elif any(word in user_lower for word in ["glitch", "error", "technical", "system wrong"]):
+            elif "technical" in hits:
                 key_points.append("Reason: Technical/system issues")
-            elif any(word in user_lower for word in ["early", "before time", "arrived early"]):
+            elif "early" in hits:
                 key_points.append("Reason: Early arrival for preparation")
             
-            if any(word in user_lower for word in ["work", "preparation", "routine", "task"]):
+            if "work" in hits:
                 if "Activities:" not in str(key_points):
                     key_points.append("Activities: Work-related tasks")
             
-            if any(word in user_lower for word in ["no one", "nobody", "alone", "verify"]):
+            if "no_witness" in hits:
                 key_points.append("Verification: No witnesses mentioned")
-            elif any(word in user_lower for word in ["supervisor", "manager", "colleague", "team"]):
+            elif "colleagues" in hits:
                 key_points.append("Verification: Colleagues involved")
         
         seen = set()
@@ -379,13 +783,14 @@ class ConversationManager:
                 seen.add(point)
                 unique_key_points.append(point)
         
-        edited_start = self.standardize_time_format(agent_context.get('agent_disputed', {}).get('start_time', ''))
-        system_start = self.standardize_time_format(agent_context.get('system', {}).get('start_time', ''))
+        profile = self.time_profile(agent_context)
+        edited_start = profile["times"]["edited_start"]
+        system_start = profile["times"]["system_start"]
         
         summary_lines = ["CONVERSATION SUMMARY:"]
         
         if edited_start != 'unknown' and system_start != 'unknown':
-            time_diff = self.get_time_difference(edited_start, system_start)
+            time_diff = profile["diffs"]["start_time_diff"]
             if time_diff:
                 summary_lines.append(f"Time edit: {system_start} → {edited_start} ({time_diff} min difference)")
         
@@ -421,53 +826,10 @@ class ConversationManager:
         if not user_input:
             return None
             
-        user_input_lower = user_input.lower()
-        
-        contextual_followups = {
-            "system.*wrong|phone.*wrong": [
-                "What makes you think the system and phone recordings are incorrect?",
-                "How did you determine your actual start time if both system and phone are wrong?",
-                "Do you have any other way to verify your arrival time?"
-            ],
-            "daily routine|normal routine|regular routine": [
-                "Could you describe what your daily routine involves when you first arrive?",
-                "What specific tasks are part of your morning routine at the office?",
-                "When you say 'daily routine', what work activities does that typically include?"
-            ],
-            "not specific|nothing specific|just routine": [
-                "Let me be more specific - were you checking emails, preparing equipment, or something else?",
-                "What's the first work-related task you typically complete when you arrive early?",
-                "Could you give an example of what you might do during this early arrival time?"
-            ],
-            "security|face scan|building.*enter": [
-                "Does the building security system provide any timestamp confirmation of your arrival?",
-                "If you use face scan for tracking, why do you think it didn't record your early arrival?",
-                "Can the security system logs verify your entry time?"
-            ],
-            "no one|nobody|alone": [
-                "Since no one was present, how do you typically document your early start times for record-keeping?",
-                "What process do you follow to ensure early arrivals are properly recorded when working alone?",
-                "Do you use any digital tools or apps to track your time when arriving before others?"
-            ],
-            "meeting|conference|briefing": [
-                "Who organized this meeting and what was its purpose?",
-                "Was this meeting scheduled in advance or was it impromptu?",
-                "How long did the meeting last and who else attended?"
-            ],
-            "glitch|error|technical|issue|problem": [
-                "Have you experienced similar technical issues with the time tracking system before?",
-                "Did you report this technical issue to IT or your supervisor?",
-                "What steps did you take to address the technical problem you mentioned?"
-            ],
-            "early|before.*time|arrived.*early": [
-                "What was the reason for arriving early today specifically?",
-                "Did you have any urgent tasks that required early preparation?",
-                "Is arriving early part of your regular schedule or was this unusual?"
-            ]
-        }
+        hits = FOLLOWUP_MATCHER.categories(user_input.lower())
         
-        for pattern, questions in contextual_followups.items():
-            if re.search(pattern, user_input_lower):
+        for pattern, questions in CONTEXTUAL_FOLLOWUPS.items():
+            if pattern in hits:
                 available_questions = []
                 for q in questions:
                     question_already_asked = False
@@ -488,34 +850,20 @@ class ConversationManager:
         if not question1 or not question2:
             return False
             
-        q1_lower = question1.lower()
-        q2_lower = question2.lower()
-        
-        similar_phrases = [
-            "what.*activity", "work.*related", "personal",
-            "who.*verify", "anyone.*verify", "witness",
-            "how.*track", "track.*work", "record.*time",
-            "what.*routine", "daily.*routine", "morning.*routine",
-            "technical.*issue", "system.*wrong", "phone.*wrong"
-        ]
-        
-        for phrase in similar_phrases:
-            if re.search(phrase, q1_lower) and re.search(phrase, q2_lower):
-                return True
-        
-        return False
+        return bool(similar_phrase_hits(question1.lower()) & similar_phrase_hits(question2.lower()))
 
     def generate_fallback_question(self, conversation_state, agent_context, session_id):
         """Fallback to the original logic if no contextual question fits"""
         tracker = self.asked_questions_tracker.get(session_id, {"asked_questions": []})
         asked_questions = tracker["asked_questions"]
+        profile = self.time_profile(agent_context)
 
         if ("phone_vs_edited_discrepancy" in conversation_state["unresolved_issues"] and
             not any("phone shows" in q.lower() for q in asked_questions)):
             
-            phone_time = self.standardize_time_format(agent_context.get('phone', {}).get('start_time', ''))
-            edited_time = self.standardize_time_format(agent_context.get('agent_disputed', {}).get('start_time', ''))
-            difference = self.get_time_difference(phone_time, edited_time) or 'some'
+            phone_time = profile["times"]["phone_start"]
+            edited_time = profile["times"]["edited_start"]
+            difference = profile["diffs"]["phone_edited_diff"] or 'some'
             
             question = self.question_sequences["followup_4"].format(
                 phone_start=phone_time,
@@ -528,8 +876,8 @@ class ConversationManager:
         if (not any("why did you edit" in q.lower() for q in asked_questions) and
             "stated_arrival_time" not in conversation_state["established_facts"]):
             
-            system_start = self.standardize_time_format(agent_context.get('system', {}).get('start_time', ''))
-            edited_start = self.standardize_time_format(agent_context.get('agent_disputed', {}).get('start_time', ''))
+            system_start = profile["times"]["system_start"]
+            edited_start = profile["times"]["edited_start"]
             
             if system_start != 'unknown' and edited_start != 'unknown':
                 question = self.question_sequences["initial"].format(
@@ -557,26 +905,26 @@ class ConversationManager:
 
 def is_similar_question(question1, question2):
     """Check if two questions are similar in meaning"""
-    key_phrases = [
-        "why did you edit", 
-        "phone shows", 
-        "explain this difference",
-        "what activities",
-        "who organized",
-        "how long",
-        "can verify",
-        "work-related"
-    ]
-    
-    q1_lower = question1.lower()
-    q2_lower = question2.lower()
-    
-    for phrase in key_phrases:
-        if phrase in q1_lower and phrase in q2_lower:
-            return True
-    return False
+    return bool(KEY_PHRASE_MATCHER.categories(question1.lower()) & KEY_PHRASE_MATCHER.categories(question2.lower()))
+
+def load_tracker_state(session_id):
+    """Rehydrate a session tracker from sessions.conversation_state"""
+    db = SessionLocal()
+    try:
+        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if not session or not session.conversation_state:
+            return None
+        return tracker_from_state(json.loads(session.conversation_state))
+    finally:
+        db.close()
 
-conv_manager = ConversationManager()
+conv_manager = ConversationManager(SessionTracker(
+    loader=load_tracker_state,
+    max_sessions=TRACKER_MAX_SESSIONS,
+    idle_ttl=TRACKER_IDLE_TTL,
+    store=create_state_store(STATE_BACKEND)
+))
+session_turns = SessionTurns(dedup_window=SESSION_TURN_DEDUP_S)
 
 def format_time_display(time_str):
     """Format time for display using standardized format"""
@@ -586,19 +934,25 @@ def get_time_difference(time1_str, time2_str):
     """Calculate time difference using conversation manager"""
     return conv_manager.get_time_difference(time1_str, time2_str)
 
+def agent_profile(schedule, system_data, phone, agent_disputed):
+    """Cached time profile for an agent's schedule/system/phone/agent_disputed sections"""
+    return conv_manager.time_profile({
+        "schedule": schedule,
+        "system": system_data,
+        "phone": phone,
+        "agent_disputed": agent_disputed
+    })
+
 def generate_initial_question(agent_name, schedule, system_data, phone, agent_disputed):
     """Generate dynamic initial question based on time discrepancy scenario"""
     
-    scheduled_start = format_time_display(schedule.get('start_time')) if schedule else 'unknown'
-    system_start = format_time_display(system_data.get('start_time')) if system_data else 'unknown'
-    phone_start = format_time_display(phone.get('start_time')) if phone else 'unknown'
-    agent_edited_start = format_time_display(agent_disputed.get('start_time')) if agent_disputed else 'unknown'
-    
-    start_time_diff = get_time_difference(agent_edited_start, system_start)
-    phone_system_diff = get_time_difference(phone_start, system_start)
-    phone_edited_diff = get_time_difference(phone_start, agent_edited_start)
-    
-    scenario = analyze_time_scenario(system_start, phone_start, agent_edited_start, start_time_diff, phone_system_diff, phone_edited_diff)
+    profile = agent_profile(schedule, system_data, phone, agent_disputed)
+    system_start = profile["times"]["system_start"]
+    phone_start = profile["times"]["phone_start"]
+    agent_edited_start = profile["times"]["edited_start"]
+    start_time_diff = profile["diffs"]["start_time_diff"]
+    phone_edited_diff = profile["diffs"]["phone_edited_diff"]
+    scenario = profile["scenario"]
     
     context_lines = build_context_lines(agent_name, schedule, system_data, phone, agent_disputed, start_time_diff)
     
@@ -609,32 +963,14 @@ def generate_initial_question(agent_name, schedule, system_data, phone, agent_di
 
 def analyze_time_scenario(system_start, phone_start, agent_edited_start, start_time_diff, phone_system_diff, phone_edited_diff):
     """Analyze the time discrepancy scenario"""
-    
-    if system_start == 'unknown' and agent_edited_start != 'unknown':
-        return "missing_system_time"
-    
-    if phone_start == 'unknown' and agent_edited_start != 'unknown':
-        return "missing_phone_time"
-    
-    if start_time_diff and start_time_diff > 30:
-        if phone_edited_diff and phone_edited_diff > 15:
-            return "large_discrepancy_both"
-        elif phone_system_diff and phone_system_diff < 5:
-            return "system_vs_edited_large"
-        else:
-            return "significant_edit"
-    
-    elif start_time_diff and start_time_diff > 15:
-        if phone_edited_diff and phone_edited_diff < 10:
-            return "phone_supports_edit"
-        else:
-            return "moderate_edit"
-    
-    elif phone_start != 'unknown' and phone_edited_diff and phone_edited_diff > 20:
-        return "phone_disagrees"
-    
-    else:
-        return "general_inquiry"
+    return time_scenario(
+        system_start != 'unknown',
+        phone_start != 'unknown',
+        agent_edited_start != 'unknown',
+        start_time_diff,
+        phone_system_diff,
+        phone_edited_diff
+    )
 
 def generate_scenario_based_question(scenario, system_start, phone_start, agent_edited_start, start_time_diff, phone_edited_diff):
     """Generate question based on the specific scenario"""
@@ -663,27 +999,17 @@ def generate_scenario_based_question(scenario, system_start, phone_start, agent_
 
 def build_context_lines(agent_name, schedule, system_data, phone, agent_disputed, start_time_diff):
     """Build the context part (your existing code)"""
-    def extract_date(time_str):
-        if not time_str or time_str == 'unknown':
-            return 'N/A'
-        try:
-            date_part = time_str.split(' ')[0]
-            from datetime import datetime
-            dt = datetime.strptime(date_part, '%m/%d/%Y')
-            return dt.strftime('%B %d, %Y')
-        except:
-            return 'N/A'
-
-    shift_date = extract_date(schedule.get('start_time') if schedule else None)
+    profile = agent_profile(schedule, system_data, phone, agent_disputed)
+    shift_date = profile["shift_date"]
     
-    scheduled_start = format_time_display(schedule.get('start_time')) if schedule else 'unknown'
-    scheduled_end = format_time_display(schedule.get('end_time')) if schedule else 'unknown'
-    system_start = format_time_display(system_data.get('start_time')) if system_data else 'unknown'
-    system_end = format_time_display(system_data.get('end_time')) if system_data else 'unknown'
-    phone_start = format_time_display(phone.get('start_time')) if phone else 'unknown'
-    phone_end = format_time_display(phone.get('end_time')) if phone else 'unknown'
-    agent_edited_start = format_time_display(agent_disputed.get('start_time')) if agent_disputed else 'unknown'
-    agent_edited_end = format_time_display(agent_disputed.get('end_time')) if agent_disputed else 'unknown'
+    scheduled_start = profile["times"]["scheduled_start"]
+    scheduled_end = profile["times"]["scheduled_end"]
+    system_start = profile["times"]["system_start"]
+    system_end = profile["times"]["system_end"]
+    phone_start = profile["times"]["phone_start"]
+    phone_end = profile["times"]["phone_end"]
+    agent_edited_start = profile["times"]["edited_start"]
+    agent_edited_end = profile["times"]["edited_end"]
 
     context_lines = [
         f"Hi {agent_name},",
@@ -711,9 +1037,97 @@ def build_context_lines(agent_name, schedule, system_data, phone, agent_disputed
     
     return context_lines
 
+class LLMModeStats:
+    """Counters for shadow agreement and budgeted latency outcomes"""
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counts = {
+            "shadow_agree": 0,
+            "shadow_disagree": 0,
+            "shadow_error": 0,
+            "budget_hit": 0,
+            "budget_miss": 0
+        }
+
+    def incr(self, name):
+        with self._lock:
+            self.counts[name] += 1
+
+    def snapshot(self):
+        with self._lock:
+            counts = dict(self.counts)
+        shadow_total = counts["shadow_agree"] + counts["shadow_disagree"]
+        budget_total = counts["budget_hit"] + counts["budget_miss"]
+        counts["shadow_agreement_rate"] = round(counts["shadow_agree"] / shadow_total, 4) if shadow_total else None
+        counts["budget_hit_rate"] = round(counts["budget_hit"] / budget_total, 4) if budget_total else None
+        return counts
+
+llm_mode_stats = LLMModeStats()
+
+def normalize_question(question):
+    return " ".join((question or "").lower().split()).rstrip("?").strip()
+
+def record_shadow_result(next_question, future):
+    """Compare a background LLM answer with the deterministic question that was served"""
+    try:
+        llm_response = future.result()
+    except Exception as e:
+        print(f"Shadow LLM error: {e}")
+        llm_mode_stats.incr("shadow_error")
+        return
+    expected = normalize_question(next_question)
+    actual = normalize_question(llm_response)
+    if expected and (actual == expected or expected in actual):
+        llm_mode_stats.incr("shadow_agree")
+    else:
+        llm_mode_stats.incr("shadow_disagree")
+
+def generate_llm_response(enhanced_messages, next_question, mode=None):
+    """Phrase next_question through the LLM according to LLM_MODE.
+
+    full waits for the model, off skips it, shadow serves next_question and
+    scores the model in the background, budgeted uses the model only if it
+    answers within LLM_BUDGET_MS.
+    """
+    mode = mode or LLM_MODE
+    llm_params = {"temperature": 0.1, "max_tokens": 50, "top_p": 0.2}
+
+    if not OPENAI_AVAILABLE or mode == "off":
+        return next_question
+
+    if mode == "shadow":
+        # Nothing is served from a shadow call, so its errors aren't fallbacks
+        future = submit_chat_with_gpt(enhanced_messages, fallback=False, **llm_params)
+        future.add_done_callback(lambda f: record_shadow_result(next_question, f))
+        return next_question
+
+    if mode == "budgeted":
+        # Errors must land in the except below as budget misses, not come back as the fallback question
+        future = submit_chat_with_gpt(enhanced_messages, fallback=False, **llm_params)
+        try:
+            response = future.result(timeout=LLM_BUDGET_MS / 1000)
+            llm_mode_stats.incr("budget_hit")
+            return response
+        except Exception as e:
+            future.cancel()
+            llm_mode_stats.incr("budget_miss")
+            if isinstance(e, TimeoutError):
+                LLM_TIMEOUTS.inc(client="budget")
+                LLM_FALLBACKS.inc(reason="budget")
+            else:
+                record_llm_error(e, "async")
+            return next_question
+
+    try:
+        return chat_with_gpt(enhanced_messages, **llm_params)
+    except Exception as e:
+        print(f"OpenAI API error: {e}")
+        LLM_FALLBACKS.inc(reason="error")
+        return next_question
+
 @app.route("/data", methods=["GET"])
 def get_json_data():
-    return jsonify(localData)
+    return jsonify(agent_roster.data)
 
 @app.route("/create_session", methods=["POST"])
 def create_session():
@@ -727,6 +1141,14 @@ def create_session():
     db.close()
     return jsonify({"id": s.id, "agent": s.agent, "created_at": s.created_at.isoformat()}), 201
 
+def parse_created_at(ts):
+    if ts:
+        try:
+            return datetime.fromisoformat(ts)
+        except (TypeError, ValueError):
+            pass
+    return datetime.utcnow()
+
 @app.route("/sessions/<int:session_id>/messages", methods=["POST"])
 def add_message(session_id):
     body = request.get_json() or {}
@@ -738,13 +1160,16 @@ def add_message(session_id):
     if not s:
         db.close()
         return jsonify({"error": "session not found"}), 404
-    if ts:
-        try:
-            created_at = datetime.fromisoformat(ts)
-        except:
-            created_at = datetime.utcnow()
-    else:
-        created_at = datetime.utcnow()
+    created_at = parse_created_at(ts)
+    if message_writer is not None:
+        db.close()
+        message_id = message_writer.write([{
+            "session_id": session_id,
+            "role": role,
+            "content": content,
+            "created_at": created_at
+        }])[0]
+        return jsonify({"message_id": message_id, "session_id": session_id}), 201
     msg = ChatMessage(session_id=session_id, role=role, content=content, created_at=created_at)
     db.add(msg)
     db.commit()
@@ -752,107 +1177,374 @@ def add_message(session_id):
     db.close()
     return jsonify({"message_id": msg.id, "session_id": session_id}), 201
 
+def iter_bulk_records(key):
+    """(index, record) pairs from an NDJSON stream or a JSON array (bare or under `key`).
+
+    NDJSON is read line by line so large imports never sit in memory whole;
+    a line that isn't a JSON object is yielded as a ValueError.
+    """
+    if request.mimetype in ("application/x-ndjson", "application/jsonl"):
+        index = 0
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError as e:
+                record = ValueError(f"invalid JSON: {e}")
+            yield index, record if isinstance(record, (dict, ValueError)) else ValueError("expected an object")
+            index += 1
+        return
+
+    body = request.get_json(silent=True)
+    if isinstance(body, dict):
+        body = body.get(key)
+    if not isinstance(body, list):
+        raise ValueError(f"expected a JSON array, {{\"{key}\": [...]}} or NDJSON")
+    for index, record in enumerate(body):
+        yield index, record if isinstance(record, dict) else ValueError("expected an object")
+
+def iter_chunks(records, size):
+    chunk = []
+    for item in records:
+        chunk.append(item)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def message_row(record, session_id=None):
+    """messages row for a bulk record; raises ValueError if it's unusable"""
+    session_id = record.get("session_id") if session_id is None else session_id
+    if not isinstance(session_id, int) or isinstance(session_id, bool):
+        raise ValueError("session_id must be an integer")
+    content = record.get("content")
+    if not isinstance(content, str):
+        raise ValueError("content must be a string")
+    return {
+        "session_id": session_id,
+        "role": str(record.get("role", "user")),
+        "content": content,
+        "created_at": parse_created_at(record.get("created_at"))
+    }
+
+@app.route("/messages/bulk", methods=["POST"])
+def bulk_add_messages():
+    """Insert many messages across sessions from a JSON array or NDJSON stream.
+
+    Rows are inserted with one executemany per BULK_CHUNK_ROWS chunk, each
+    chunk in its own transaction. Invalid rows and rows for unknown sessions
+    are skipped and reported by index.
+    """
+    inserted = 0
+    errors = []
+    try:
+        for chunk in iter_chunks(iter_bulk_records("messages"), BULK_CHUNK_ROWS):
+            rows = []
+            for index, record in chunk:
+                try:
+                    if isinstance(record, ValueError):
+                        raise record
+                    rows.append((index, message_row(record)))
+                except ValueError as e:
+                    errors.append({"index": index, "error": str(e)})
+
+            with engine.begin() as conn:
+                session_ids = {row["session_id"] for _, row in rows}
+                known = set(conn.execute(
+                    select(ChatSession.id).where(ChatSession.id.in_(session_ids))
+                ).scalars()) if session_ids else set()
+                valid = []
+                for index, row in rows:
+                    if row["session_id"] in known:
+                        valid.append(row)
+                    else:
+                        errors.append({"index": index, "error": "session not found"})
+                if valid:
+                    conn.execute(insert(ChatMessage.__table__), valid)
+            inserted += len(valid)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error in bulk message insert: {e}")
+        return jsonify({"error": "Database error occurred", "inserted": inserted}), 500
+
+    return jsonify({"inserted": inserted, "errors": errors}), 201 if inserted else 200
+
+@app.route("/sessions/bulk", methods=["POST"])
+def bulk_create_sessions():
+    """Create many sessions (optionally with their `messages`) from a JSON array or NDJSON stream.
+
+    Each BULK_CHUNK_ROWS chunk of sessions, and their messages, is written in
+    one transaction. Returns the new ids in request order.
+    """
+    ids = []
+    messages_inserted = 0
+    errors = []
+    try:
+        for chunk in iter_chunks(iter_bulk_records("sessions"), BULK_CHUNK_ROWS):
+            sessions = []
+            for index, record in chunk:
+                try:
+                    if isinstance(record, ValueError):
+                        raise record
+                    messages = record.get("messages") or []
+                    if not isinstance(messages, list) or not all(isinstance(m, dict) for m in messages):
+                        raise ValueError("messages must be a list of objects")
+                    state = record.get("conversation_state", {})
+                    sessions.append((index, {
+                        "agent": str(record.get("agent", "unknown")),
+                        "created_at": parse_created_at(record.get("created_at")),
+                        "conversation_state": state if isinstance(state, str) else json.dumps(state)
+                    }, [message_row(m, session_id=0) for m in messages]))
+                except ValueError as e:
+                    errors.append({"index": index, "error": str(e)})
+            new_ids = []
+            message_rows = []
+
+            with engine.begin() as conn:
+                if sessions:
+                    new_ids = conn.execute(
+                        insert(ChatSession.__table__).returning(ChatSession.__table__.c.id, sort_by_parameter_order=True),
+                        [row for _, row, _ in sessions]
+                    ).scalars().all()
+                for session_id, (_, _, messages) in zip(new_ids, sessions):
+                    for m in messages:
+                        m["session_id"] = session_id
+                    message_rows.extend(messages)
+                for start in range(0, len(message_rows), BULK_CHUNK_ROWS):
+                    conn.execute(insert(ChatMessage.__table__), message_rows[start:start + BULK_CHUNK_ROWS])
+
+            # Rejected records keep their slot as None so ids line up with the request
+            by_index = {index: session_id for (index, _, _), session_id in zip(sessions, new_ids)}
+            ids.extend(by_index.get(index) for index, _ in chunk)
+            messages_inserted += len(message_rows)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    except Exception as e:
+        print(f"Error in bulk session insert: {e}")
+        return jsonify({"error": "Database error occurred", "ids": ids}), 500
+
+    created = sum(1 for session_id in ids if session_id is not None)
+    return jsonify({"ids": ids, "created": created, "messages_inserted": messages_inserted, "errors": errors}), 201 if created else 200
+
+SESSIONS_PAGE_DEFAULT = 100
+SESSIONS_PAGE_MAX = 1000
+
+def encode_session_cursor(created_at, session_id):
+    return f"{created_at.isoformat()}|{session_id}"
+
+def decode_session_cursor(cursor):
+    created_at, _, session_id = cursor.rpartition("|")
+    return datetime.fromisoformat(created_at), int(session_id)
+
 @app.route("/sessions", methods=["GET"])
 def list_sessions():
+    """
+    Newest-first sessions. Without ?limit= or ?after= every session is
+    returned, as before; either one switches to keyset pages of at most
+    SESSIONS_PAGE_MAX, with the next page's ?after= in X-Next-Cursor.
+    """
+    try:
+        after = request.args.get("after")
+        paged = "limit" in request.args or after is not None
+        limit = min(max(int(request.args.get("limit", SESSIONS_PAGE_DEFAULT)), 1), SESSIONS_PAGE_MAX) if paged else None
+        cursor = decode_session_cursor(after) if after else None
+    except ValueError:
+        return jsonify({"error": "Invalid limit or cursor"}), 400
+
     db = SessionLocal()
     try:
-        sessions = db.query(ChatSession).order_by(ChatSession.created_at.desc()).all()
-        out = []
-        for s in sessions:
-            last_msg = None
-            if s.messages:
-                last_msg = max(s.messages, key=lambda m: m.created_at).created_at.isoformat()
-            out.append({
-                "id": s.id,
-                "agent": s.agent,
-                "created_at": s.created_at.isoformat(),
-                "last_message_at": last_msg
-            })
+        last_message_at = (
+            select(func.max(ChatMessage.created_at))
+            .where(ChatMessage.session_id == ChatSession.id)
+            .correlate(ChatSession)
+            .scalar_subquery()
+        )
+        message_count = (
+            select(func.count())
+            .select_from(ChatMessage)
+            .where(ChatMessage.session_id == ChatSession.id)
+            .correlate(ChatSession)
+            .scalar_subquery()
+        )
+        query = db.query(
+            ChatSession.id,
+            ChatSession.agent,
+            ChatSession.created_at,
+            last_message_at.label("last_message_at"),
+            message_count.label("message_count")
+        )
+        if cursor:
+            created_at, session_id = cursor
+            query = query.filter(or_(
+                ChatSession.created_at < created_at,
+                and_(ChatSession.created_at == created_at, ChatSession.id < session_id)
+            ))
+        query = query.order_by(ChatSession.created_at.desc(), ChatSession.id.desc())
+        rows = query.limit(limit + 1).all() if paged else query.all()
         db.close()
-        return jsonify(out)
+
+        out = [{
+            "id": row.id,
+            "agent": row.agent,
+            "created_at": row.created_at.isoformat(),
+            "last_message_at": row.last_message_at.isoformat() if row.last_message_at else None,
+            "message_count": row.message_count
+        } for row in rows[:limit]]
+
+        response = jsonify(out)
+        if paged and len(rows) > limit:
+            last = rows[limit - 1]
+            response.headers["X-Next-Cursor"] = encode_session_cursor(last.created_at, last.id)
+        return response
     except Exception as e:
         db.close()
         print(f"Error listing sessions: {e}")
         return jsonify({"error": "Database error occurred"}), 500
 
+def session_etag(session_id, since_id, limit):
+    """Strong ETag from the session's message high-water mark, or None if the session doesn't exist.
+
+    Messages are append-only, so (max id, count) identifies the content; this
+    reads only the (session_id, id) index, not the ORM.
+    """
+    with engine.connect() as conn:
+        row = conn.execute(text("""
+            SELECT (SELECT 1 FROM sessions WHERE id = :sid), MAX(id), COUNT(*)
+            FROM messages WHERE session_id = :sid
+        """), {"sid": session_id}).first()
+    if not row[0]:
+        return None
+    return f"{session_id}-{row[1] or 0}-{row[2]}-{since_id}-{limit or 'all'}"
+
 @app.route("/sessions/<int:session_id>", methods=["GET"])
 def get_session(session_id):
-    db = SessionLocal()
+    """Session with its messages in id order; ?since_id= and ?limit= return only newer rows"""
+    try:
+        since_id = int(request.args.get("since_id", 0))
+        limit = int(request.args["limit"]) if request.args.get("limit") else None
+        if limit is not None and limit < 1:
+            raise ValueError("limit must be positive")
+    except ValueError:
+        return jsonify({"error": "Invalid since_id or limit"}), 400
+
+    db = None
     try:
+        etag = session_etag(session_id, since_id, limit)
+        if etag is None:
+            return jsonify({"error": "session not found"}), 404
+        if request.if_none_match.contains(etag):
+            not_modified = Response(status=304)
+            not_modified.set_etag(etag)
+            return not_modified
+
+        db = SessionLocal()
         s = db.query(ChatSession).filter(ChatSession.id == session_id).first()
         if not s:
             db.close()
             return jsonify({"error": "session not found"}), 404
+        query = (
+            db.query(ChatMessage)
+            .filter(ChatMessage.session_id == session_id, ChatMessage.id > since_id)
+            .order_by(ChatMessage.id)
+        )
+        if limit is not None:
+            query = query.limit(limit + 1)
+        rows = query.all()
+        has_more = limit is not None and len(rows) > limit
         messages = [
             {
                 "id": m.id,
                 "role": m.role,
                 "content": m.content,
                 "created_at": m.created_at.isoformat()
-            } for m in sorted(s.messages, key=lambda mm: mm.created_at)
+            } for m in rows[:limit]
         ]
         out = {
             "id": s.id,
             "agent": s.agent,
             "created_at": s.created_at.isoformat(),
-            "messages": messages
+            "messages": messages,
+            "has_more": has_more
         }
         db.close()
-        return jsonify(out)
+        response = jsonify(out)
+        response.set_etag(etag)
+        return response
     except Exception as e:
-        db.close()
+        if db is not None:
+            db.close()
         print(f"Error getting session: {e}")
         return jsonify({"error": "Database error occurred"}), 500
 
-@app.route("/chat_with_ai", methods=["POST"])
-def chat_with_ai():
-    """AI chat endpoint with STRICT conversation management"""
-    try:
-        body = request.get_json() or {}
-        messages = body.get("messages", [])
-        session_id = body.get("session_id")
-        agent_name = body.get("agent_name", "")
-
-        if not messages or not session_id:
-            return jsonify({"error": "No messages or session_id provided"}), 400
-
-        db = SessionLocal()
-        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
-        if not session:
-            db.close()
-            return jsonify({"error": "Session not found"}), 404
-
-        agents = localData.get("agents", [])
-        agent_context = next((a for a in agents if a.get("name", "").lower() == agent_name.lower()), {}) if agent_name else {}
-
+def load_session_history(db, session_id):
+    """Stored conversation for a session as chat messages, oldest first"""
+    rows = (
+        db.query(ChatMessage.role, ChatMessage.content)
+        .filter(ChatMessage.session_id == session_id)
+        .order_by(ChatMessage.id)
+        .all()
+    )
+    return [{"role": role, "content": content} for role, content in rows]
+
+def resolve_turn_messages(db, session_id, body):
+    """Client-supplied `messages`, or in server-history mode the stored history plus the new `message`.
+
+    Returns (messages, pending_rows); the new user message is in pending_rows
+    and gets committed together with the assistant reply.
+    """
+    if body.get("messages"):
+        return body["messages"], []
+
+    content = (body.get("message") or "").strip()
+    if not content:
+        return [], []
+
+    history = load_session_history(db, session_id)
+    history.append({"role": "user", "content": content})
+    return history, [{
+        "session_id": int(session_id),
+        "role": "user",
+        "content": content,
+        "created_at": datetime.utcnow()
+    }]
+
+def start_chat_turn(messages, session_id, agent_name):
+    """Analyze the conversation and pick the deterministic next question (or the closing summary)"""
+    with STAGE_SECONDS.time(stage="agent_lookup"):
+        agent_context = agent_roster.find(agent_name) or {}
+
+    with STAGE_SECONDS.time(stage="analyze"):
+        conv_manager.asked_questions_tracker.refresh(session_id)
         conversation_state = conv_manager.analyze_conversation_state(messages, agent_context, session_id)
 
-        recent_user_input = ""
-        if messages and messages[-1]["role"] == "user":
-            recent_user_input = messages[-1]["content"]
+    recent_user_input = ""
+    if messages and messages[-1]["role"] == "user":
+        recent_user_input = messages[-1]["content"]
 
+    with STAGE_SECONDS.time(stage="question_selection"):
         next_question = conv_manager.generate_intelligent_question(
             conversation_state, agent_context, recent_user_input, session_id
         )
 
-        if (next_question == "SUMMARY_REQUEST" or 
-            conv_manager.should_end_conversation(conversation_state, recent_user_input) or 
-            conversation_state.get('question_count', 0) >= 5):
-            
-            summary = conv_manager.generate_conversation_summary(messages, agent_context)
-            
-            confirmation_msg = ChatMessage(
-                session_id=session_id,
-                role="assistant",
-                content=summary,
-                created_at=datetime.utcnow()
-            )
-            db.add(confirmation_msg)
-            db.commit()
-            db.close()
-            return jsonify({"response": summary})
+    final = (next_question == "SUMMARY_REQUEST" or 
+             conv_manager.should_end_conversation(conversation_state, recent_user_input) or 
+             conversation_state.get('question_count', 0) >= 5)
 
-        system_prompt = f"""You are Quartz AI conducting a professional time discrepancy investigation.
+    return {
+        "agent_context": agent_context,
+        "conversation_state": conversation_state,
+        "recent_user_input": recent_user_input,
+        "next_question": next_question,
+        "final": final
+    }
+
+def build_question_prompt(messages, conversation_state, recent_user_input, next_question):
+    """System prompt plus the trailing turns that ask the LLM to phrase next_question"""
+    system_prompt = f"""You are Quartz AI conducting a professional time discrepancy investigation.
 
 CONVERSATION CONTEXT:
 - Question {conversation_state.get('question_count', 1)} of maximum 5
@@ -867,73 +1559,309 @@ CRITICAL INSTRUCTIONS:
 
 OUTPUT ONLY this question: {next_question}"""
 
-        enhanced_messages = [{"role": "system", "content": system_prompt}]
-        enhanced_messages.extend(messages[-2:])  
+    enhanced_messages = [{"role": "system", "content": system_prompt}]
+    enhanced_messages.extend(messages[-2:])  
+    return enhanced_messages
 
-        if OPENAI_AVAILABLE:
-            try:
-                response = chat_with_gpt(
-                    enhanced_messages,
-                    temperature=0.1,
-                    max_tokens=50,
-                    top_p=0.2
-                )
-            except Exception as e:
-                print(f"OpenAI API error: {e}")
-                response = next_question
+def finalize_response(response, next_question, messages):
+    """Fall back to next_question when the LLM output is empty, malformed or repetitive"""
+    response = (response or "").strip()
+
+    previous_assistant_messages = [msg["content"] for msg in messages if msg["role"] == "assistant"]
+    is_repetitive = any(
+        prev_msg and response and 
+        (prev_msg.lower() == response.lower() or 
+         is_similar_question(prev_msg, response))
+        for prev_msg in previous_assistant_messages
+    )
+
+    if (not response or len(response) < 8 or '?' not in response or is_repetitive):
+        if response and response != next_question:
+            LLM_FALLBACKS.inc(reason="rejected")
+        response = next_question
+
+    return response
+
+def persist_assistant_turn(db, session, session_id, content, conversation_state, track_question=True, pending_rows=None):
+    """Store pending user rows, the assistant reply (unless None) and the updated tracker in one commit"""
+    if track_question:
+        tracker = conv_manager.asked_questions_tracker.get(session_id)
+        if tracker is not None:
+            tracker["asked_questions"].append(content)
+
+    rows = list(pending_rows or [])
+    if content is not None:
+        rows.append({
+            "session_id": session.id,
+            "role": "assistant",
+            "content": content,
+            "created_at": datetime.utcnow()
+        })
+    state = json.dumps(conv_manager.persistable_state(session_id, conversation_state))
+
+    with STAGE_SECONDS.time(stage="commit"):
+        if message_writer is not None:
+            session_key = session.id
+            db.rollback()
+            message_writer.write(rows, session_key, state)
         else:
-            response = next_question
+            db.add_all([ChatMessage(**row) for row in rows])
+            session.conversation_state = state
+            db.commit()
+        conv_manager.asked_questions_tracker.save(session_id)
+
+SUMMARY_PENDING_RESPONSE = "That covers everything I needed. I'm preparing your summary now."
+
+def close_conversation(db, session, session_id, agent_name, messages, turn, pending_rows):
+    """
+    Final turn. With SUMMARY_JOBS the user's message is stored and the
+    summary is left to a background job whose id is returned; otherwise
+    the summary is generated and stored inline.
+    """
+    if not SUMMARY_JOBS:
+        with STAGE_SECONDS.time(stage="summary"):
+            summary = conv_manager.generate_conversation_summary(messages, turn["agent_context"])
+        persist_assistant_turn(db, session, session_id, summary, turn["conversation_state"], track_question=False, pending_rows=pending_rows)
+        return {"response": summary}
+
+    persist_assistant_turn(db, session, session_id, None, turn["conversation_state"], track_question=False, pending_rows=pending_rows)
+    payload = {"session_id": int(session_id), "agent_name": agent_name}
+    if not pending_rows:
+        # Clients that post the whole `messages` array don't get user rows
+        # stored, so the job can't rebuild the conversation from the database
+        payload["messages"] = messages
+    job_id = job_queue.enqueue("summary", payload, dedupe_key=f"summary:{session_id}:{len(messages)}")
+    return {"response": SUMMARY_PENDING_RESPONSE, "job_id": job_id, "status": "queued"}
+
+def sse_event(event, data):
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+CHAT_FALLBACK_RESPONSE = "Could you please provide more details about the time discrepancy?"
+
+def turn_fingerprint(body):
+    """Identity of a chat turn request, so double-submits and retries coalesce"""
+    turn = [body.get("agent_name", ""), (body.get("message") or "").strip(), body.get("messages")]
+    return hashlib.sha1(json.dumps(turn, sort_keys=True, default=str).encode("utf-8", "ignore")).hexdigest()
+
+def run_chat_turn(body, session_id, agent_name):
+    """One /chat_with_ai turn; returns (payload, status)"""
+    db = SessionLocal()
+    try:
+        with STAGE_SECONDS.time(stage="session_lookup"):
+            session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if not session:
+            return {"error": "Session not found"}, 404
 
-        response = (response or "").strip()
+        with STAGE_SECONDS.time(stage="history_load"):
+            messages, pending_rows = resolve_turn_messages(db, session_id, body)
+        turn = start_chat_turn(messages, session_id, agent_name)
+        conversation_state = turn["conversation_state"]
+        next_question = turn["next_question"]
 
-        previous_assistant_messages = [msg["content"] for msg in messages if msg["role"] == "assistant"]
-        is_repetitive = any(
-            prev_msg and response and 
-            (prev_msg.lower() == response.lower() or 
-             is_similar_question(prev_msg, response))
-            for prev_msg in previous_assistant_messages
-        )
+        if turn["final"]:
+            return close_conversation(db, session, session_id, agent_name, messages, turn, pending_rows), 200
 
-        if (not response or len(response) < 8 or '?' not in response or is_repetitive):
-            response = next_question
+        enhanced_messages = build_question_prompt(messages, conversation_state, turn["recent_user_input"], next_question)
 
-        if session_id in conv_manager.asked_questions_tracker:
-            conv_manager.asked_questions_tracker[session_id]["asked_questions"].append(response)
+        with STAGE_SECONDS.time(stage="llm"):
+            response = generate_llm_response(enhanced_messages, next_question)
+        with STAGE_SECONDS.time(stage="repetition_check"):
+            response = finalize_response(response, next_question, messages)
 
-        ai_msg = ChatMessage(
-            session_id=session_id,
-            role="assistant",
-            content=response,
-            created_at=datetime.utcnow()
-        )
-        db.add(ai_msg)
-        db.commit()
+        persist_assistant_turn(db, session, session_id, response, conversation_state, pending_rows=pending_rows)
+        return {"response": response}, 200
+    finally:
         db.close()
 
-        return jsonify({"response": response})
+@app.route("/chat_with_ai", methods=["POST"])
+def chat_with_ai():
+    """AI chat endpoint with STRICT conversation management"""
+    try:
+        body = request.get_json() or {}
+        session_id = body.get("session_id")
+        agent_name = body.get("agent_name", "")
+
+        if not (body.get("messages") or body.get("message")) or not session_id:
+            return jsonify({"error": "No messages or session_id provided"}), 400
+
+        with STAGE_SECONDS.time(stage="session_queue"):
+            flight, leader = session_turns.begin(session_id, turn_fingerprint(body), timeout=SESSION_TURN_WAIT_S)
+            result = flight.wait(SESSION_TURN_WAIT_S) if not leader else None
+        if not leader:
+            if result is None:
+                return jsonify({"response": CHAT_FALLBACK_RESPONSE})
+            return jsonify(result[0]), result[1]
 
+        try:
+            result = run_chat_turn(body, session_id, agent_name)
+        finally:
+            session_turns.finish(flight, result)
+        return jsonify(result[0]), result[1]
+
+    except TurnWaitTimeout as e:
+        print(f"Chat turn not started: {e}")
+        return jsonify({"response": CHAT_FALLBACK_RESPONSE})
     except Exception as e:
         print(f"Error in chat_with_ai: {str(e)}")
-        return jsonify({"response": "Could you please provide more details about the time discrepancy?"})
+        return jsonify({"response": CHAT_FALLBACK_RESPONSE})
+
+def sse_response(events):
+    return Response(
+        stream_with_context(events),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.route("/chat_with_ai/stream", methods=["POST"])
+def chat_with_ai_stream():
+    """Server-Sent Events variant of /chat_with_ai.
+
+    Emits a `token` event per model chunk and a final `done` event carrying
+    the validated response, which is what gets persisted. Tokens are only
+    streamed in LLM_MODE=full; the other modes go through
+    generate_llm_response and send just the `done` event, as does a
+    duplicate of a turn already in flight.
+    """
+    try:
+        body = request.get_json() or {}
+        session_id = body.get("session_id")
+        agent_name = body.get("agent_name", "")
+
+        if not (body.get("messages") or body.get("message")) or not session_id:
+            return jsonify({"error": "No messages or session_id provided"}), 400
+
+        with STAGE_SECONDS.time(stage="session_queue"):
+            flight, leader = session_turns.begin(session_id, turn_fingerprint(body), timeout=SESSION_TURN_WAIT_S)
+    except TurnWaitTimeout as e:
+        print(f"Chat turn not started: {e}")
+        return jsonify({"response": CHAT_FALLBACK_RESPONSE})
+    except Exception as e:
+        print(f"Error in chat_with_ai_stream: {str(e)}")
+        return jsonify({"response": CHAT_FALLBACK_RESPONSE})
+
+    if not leader:
+        def replay():
+            result = flight.wait(SESSION_TURN_WAIT_S)
+            yield sse_event("done", result[0] if result is not None and result[1] == 200 else {"response": CHAT_FALLBACK_RESPONSE})
+        return sse_response(replay())
+
+    db = SessionLocal()
+    try:
+        with STAGE_SECONDS.time(stage="session_lookup"):
+            session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if not session:
+            db.close()
+            session_turns.finish(flight, ({"error": "Session not found"}, 404))
+            return jsonify({"error": "Session not found"}), 404
+
+        with STAGE_SECONDS.time(stage="history_load"):
+            messages, pending_rows = resolve_turn_messages(db, session_id, body)
+        turn = start_chat_turn(messages, session_id, agent_name)
+    except Exception as e:
+        db.close()
+        session_turns.finish(flight)
+        print(f"Error in chat_with_ai_stream: {str(e)}")
+        return jsonify({"response": CHAT_FALLBACK_RESPONSE})
+
+    conversation_state = turn["conversation_state"]
+    next_question = turn["next_question"]
+
+    def generate():
+        result = None
+        try:
+            if turn["final"]:
+                result = (close_conversation(db, session, session_id, agent_name, messages, turn, pending_rows), 200)
+                yield sse_event("done", result[0])
+                return
+
+            enhanced_messages = build_question_prompt(messages, conversation_state, turn["recent_user_input"], next_question)
+            response = next_question
+            if LLM_MODE != "full":
+                # off/shadow/budgeted serve a complete answer, so there is nothing to stream
+                with STAGE_SECONDS.time(stage="llm"):
+                    response = generate_llm_response(enhanced_messages, next_question)
+            elif OPENAI_AVAILABLE:
+                tokens = []
+                llm_started = time.perf_counter()
+                try:
+                    for token in stream_chat_with_gpt(enhanced_messages, temperature=0.1, max_tokens=50, top_p=0.2):
+                        tokens.append(token)
+                        yield sse_event("token", {"token": token})
+                    response = validate_question("".join(tokens), enhanced_messages[0]["content"])
+                except Exception as e:
+                    print(f"OpenAI stream error: {e}")
+                    record_llm_error(e, "stream")
+                    response = next_question
+                # Includes time the client took to read the tokens
+                STAGE_SECONDS.observe(time.perf_counter() - llm_started, stage="llm_stream")
+
+            with STAGE_SECONDS.time(stage="repetition_check"):
+                response = finalize_response(response, next_question, messages)
+            persist_assistant_turn(db, session, session_id, response, conversation_state, pending_rows=pending_rows)
+            result = ({"response": response}, 200)
+            yield sse_event("done", result[0])
+        except Exception as e:
+            print(f"Error in chat_with_ai_stream: {str(e)}")
+            yield sse_event("done", {"response": next_question if not turn["final"] and next_question != "SUMMARY_REQUEST" else CHAT_FALLBACK_RESPONSE})
+        finally:
+            db.close()
+            session_turns.finish(flight, result)
+
+    response = sse_response(generate())
+    # A generator closed before its first chunk never runs its finally block
+    response.call_on_close(lambda: session_turns.finish(flight))
+    return response
 
 @app.route("/agents", methods=["GET"])
 def get_agents():
     """Get list of all available agents"""
-    agents = localData.get("agents", [])
-    agent_list = [{"name": agent.get("name"), "agent_id": agent.get("agent_id")} for agent in agents]
-    return jsonify(agent_list)
+    return jsonify(agent_roster.summaries())
 
 @app.route("/agent/<agent_name>", methods=["GET"])
 def get_agent_details(agent_name):
     """Get detailed information for a specific agent"""
-    agents = localData.get("agents", [])
-    agent = next((a for a in agents if a.get("name", "").lower() == agent_name.lower()), None)
+    agent = agent_roster.find(agent_name)
 
     if not agent:
         return jsonify({"error": "Agent not found"}), 404
 
     return jsonify(agent)
 
+@app.route("/agent/<agent_name>/profile", methods=["GET"])
+def get_agent_profile(agent_name):
+    """Normalized times, start-time diffs and discrepancy scenario for an agent"""
+    agent = agent_roster.find(agent_name)
+
+    if not agent:
+        return jsonify({"error": "Agent not found"}), 404
+
+    return jsonify({"name": agent.get("name"), "agent_id": agent.get("agent_id"), **conv_manager.time_profile(agent)})
+
+TRIAGE_PAGE_DEFAULT = 100
+TRIAGE_PAGE_MAX = 1000
+
+@app.route("/triage", methods=["GET"])
+def get_triage():
+    """Agents ranked by start-time discrepancy; ?offset=&limit=&scenario="""
+    try:
+        offset = max(int(request.args.get("offset", 0)), 0)
+        limit = min(max(int(request.args.get("limit", TRIAGE_PAGE_DEFAULT)), 1), TRIAGE_PAGE_MAX)
+    except ValueError:
+        return jsonify({"error": "Invalid offset or limit"}), 400
+    scenario = request.args.get("scenario")
+    if scenario and scenario not in SCENARIO_SEVERITY:
+        return jsonify({"error": f"Unknown scenario '{scenario}'"}), 400
+
+    total, rows = roster_triage.page(offset, limit, scenario)
+    return jsonify({
+        "total": total,
+        "offset": offset,
+        "limit": limit,
+        "engine": roster_triage.engine,
+        "compute_ms": round(roster_triage.compute_ms, 1),
+        "agents": rows
+    })
+
 @app.route("/initialize_session/<int:session_id>", methods=["POST"])
 def initialize_session(session_id):
     """Initialize session with proper context and clear time information"""
@@ -944,8 +1872,7 @@ def initialize_session(session_id):
         if not agent_name:
             return jsonify({"error": "Agent name required"}), 400
 
-        agents = localData.get("agents", [])
-        agent_details = next((a for a in agents if a.get("name", "").lower() == agent_name.lower()), None)
+        agent_details = agent_roster.find(agent_name)
 
         if not agent_details:
             return jsonify({"error": "Agent not found"}), 404
@@ -980,11 +1907,13 @@ def initialize_session(session_id):
             )
             db.add(ai_msg)
 
+        conv_manager.asked_questions_tracker.refresh(session_id)
         conversation_state = conv_manager.analyze_conversation_state([], agent_details, session_id)
-        session.conversation_state = json.dumps(conversation_state)
+        session.conversation_state = json.dumps(conv_manager.persistable_state(session_id, conversation_state))
 
         db.commit()
         db.close()
+        conv_manager.asked_questions_tracker.save(session_id)
 
         return jsonify({
             "success": True,
@@ -1023,8 +1952,7 @@ def initialize_session_new():
         
         session_id = session.id
 
-        agents = localData.get("agents", [])
-        agent_details = next((a for a in agents if a.get("name", "").lower() == agent_name.lower()), None)
+        agent_details = agent_roster.find(agent_name)
 
         if not agent_details:
             db.close()
@@ -1046,10 +1974,11 @@ def initialize_session_new():
         db.add(ai_msg)
 
         conversation_state = conv_manager.analyze_conversation_state([], agent_details, session_id)
-        session.conversation_state = json.dumps(conversation_state)
+        session.conversation_state = json.dumps(conv_manager.persistable_state(session_id, conversation_state))
 
         db.commit()
         db.close()
+        conv_manager.asked_questions_tracker.save(session_id)
 
         return jsonify({
             "session_id": session_id,
@@ -1080,9 +2009,9 @@ def get_conversation_analysis(session_id):
             } for m in sorted(session.messages, key=lambda mm: mm.created_at)
         ]
 
-        agents = localData.get("agents", [])
-        agent_context = next((a for a in agents if a.get("name", "").lower() == session.agent.lower()), {})
+        agent_context = agent_roster.find(session.agent) or {}
 
+        conv_manager.asked_questions_tracker.refresh(session_id)
         conversation_state = conv_manager.analyze_conversation_state(messages, agent_context, session_id)
 
         db.close()
@@ -1098,15 +2027,191 @@ def get_conversation_analysis(session_id):
         print(f"Error in conversation analysis: {str(e)}")
         return jsonify({"error": "Analysis failed"}), 500
 
+job_queue = JobQueue()
+_job_manager = None
+
+def job_conversation_manager():
+    """ConversationManager with its own trackers, so re-analysis never touches live sessions' state"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = ConversationManager(SessionTracker())
+    return _job_manager
+
+def reanalyze_session(manager, session_id, agent_name, stored_state, messages):
+    """
+    Fresh analysis and summary for one session; returns the new
+    conversation_state dict, or None if messages has no user turns to
+    replay (clients that post the whole `messages` array only get assistant
+    rows stored), in which case the stored state must be kept.
+    """
+    if not any(msg["role"] == "user" for msg in messages):
+        return None
+    agent_context = agent_roster.find(agent_name) or {}
+    previous = tracker_from_state(stored_state) or new_tracker()
+    tracker = new_tracker()
+    tracker["asked_questions"] = list(previous["asked_questions"])
+    manager.asked_questions_tracker[session_id] = tracker
+    try:
+        state = manager.replay_conversation_state(messages, agent_context, session_id)
+        out = manager.persistable_state(session_id, state)
+    finally:
+        manager.asked_questions_tracker.pop(session_id)
+    out["summary"] = manager.generate_conversation_summary(messages, agent_context)
+    return out
+
+def stored_state(session):
+    try:
+        return json.loads(session.conversation_state or "{}")
+    except ValueError:
+        return {}
+
+def summary_job(payload, job):
+    """Generate and store the closing summary of a conversation"""
+    session_id = payload["session_id"]
+    # A busy session raises TurnWaitTimeout, and the job is retried later
+    flight, _ = session_turns.begin(session_id, f"job:{job['id']}", timeout=SESSION_TURN_WAIT_S)
+    db = SessionLocal()
+    try:
+        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if not session:
+            return {"summary": None, "error": "Session not found"}
+        stored = load_session_history(db, session_id)
+        if stored and stored[-1]["role"] == "assistant" and stored[-1]["content"].startswith("CONVERSATION SUMMARY:"):
+            # Stored by an earlier attempt that failed afterwards
+            summary = stored[-1]["content"]
+        else:
+            messages = payload.get("messages") or stored
+            agent_context = agent_roster.find(payload.get("agent_name", "")) or {}
+            with STAGE_SECONDS.time(stage="summary"):
+                summary = conv_manager.generate_conversation_summary(messages, agent_context)
+            persist_assistant_turn(db, session, session_id, summary, stored_state(session), track_question=False)
+    finally:
+        db.close()
+        session_turns.finish(flight)
+
+    result = {"summary": summary}
+    if SUMMARY_LLM and OPENAI_AVAILABLE:
+        result["llm_summary_job_id"] = job_queue.enqueue(
+            "summary_llm", {"session_id": session_id, "summary": summary}, dedupe_key=f"summary_llm:{job['id']}"
+        )
+    return result
+
+def summary_llm_job(payload, job):
+    """Ask the model for a short prose version of a summary; stored as conversation_state["llm_summary"]"""
+    text = complete_text([
+        {"role": "system", "content": "Rewrite this time discrepancy investigation summary as two or three plain sentences "
+                                      "for a reviewer. Use only the facts given; do not add any."},
+        {"role": "user", "content": payload["summary"]}
+    ]).strip()
+    if not text:
+        raise ValueError("Empty model response")
+
+    session_id = payload["session_id"]
+    # A busy session raises TurnWaitTimeout, and the job is retried later
+    flight, _ = session_turns.begin(session_id, f"job:{job['id']}", timeout=SESSION_TURN_WAIT_S)
+    db = SessionLocal()
+    try:
+        session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+        if session:
+            state = stored_state(session)
+            state["llm_summary"] = text
+            session.conversation_state = json.dumps(state)
+            db.commit()
+    finally:
+        db.close()
+        session_turns.finish(flight)
+    return {"llm_summary": text}
+
+def reanalyze_job(payload, job):
+    """Re-run analysis and summaries for the given sessions (see reanalyze.py for the whole table)"""
+    manager = job_conversation_manager()
+    store = conv_manager.asked_questions_tracker.store
+    done, missing, busy, skipped = 0, [], [], []
+    for session_id in payload["session_ids"]:
+        try:
+            flight, _ = session_turns.begin(session_id, f"job:{job['id']}", timeout=SESSION_TURN_WAIT_S)
+        except TurnWaitTimeout:
+            busy.append(session_id)
+            continue
+        db = SessionLocal()
+        try:
+            session = db.query(ChatSession).filter(ChatSession.id == session_id).first()
+            if not session:
+                missing.append(session_id)
+                continue
+            state = reanalyze_session(manager, session_id, session.agent, stored_state(session), load_session_history(db, session_id))
+            if state is None:
+                skipped.append(session_id)
+                continue
+            session.conversation_state = json.dumps(state)
+            db.commit()
+            if store is not None:
+                store.save(session_id, tracker_to_state(tracker_from_state(state)))
+            # The next turn rehydrates the tracker from the new state
+            conv_manager.asked_questions_tracker.pop(session_id)
+            done += 1
+        finally:
+            db.close()
+            session_turns.finish(flight)
+    # Busy sessions are reported rather than retried, so the rest aren't redone
+    return {"reanalyzed": done, "missing": missing, "busy": busy, "skipped": skipped}
+
+job_queue.register("summary", summary_job)
+job_queue.register("summary_llm", summary_llm_job)
+job_queue.register("reanalyze", reanalyze_job)
+
+def start_background_workers():
+    """
+    Start the job workers in the serving process, so jobs left queued by an
+    earlier run resume without waiting for a new enqueue. CLIs that import
+    app don't call this; under a WSGI server call it from the post-fork hook.
+    """
+    job_queue.start()
+
+@app.route("/jobs/<int:job_id>", methods=["GET"])
+def get_job(job_id):
+    job = job_queue.get(job_id)
+    if job is None:
+        return jsonify({"error": "Job not found"}), 404
+    return jsonify(job)
+
+@app.route("/jobs/reanalyze", methods=["POST"])
+def enqueue_reanalysis():
+    body = request.get_json(silent=True) or {}
+    session_ids = body.get("session_ids")
+    if not isinstance(session_ids, list) or not session_ids:
+        return jsonify({"error": "session_ids must be a non-empty list"}), 400
+    if len(session_ids) > REANALYZE_JOB_MAX_SESSIONS:
+        return jsonify({"error": f"At most {REANALYZE_JOB_MAX_SESSIONS} sessions per job; use reanalyze.py for more"}), 400
+    try:
+        session_ids = [int(session_id) for session_id in session_ids]
+    except (TypeError, ValueError):
+        return jsonify({"error": "session_ids must be integers"}), 400
+    job_id = job_queue.enqueue("reanalyze", {"session_ids": session_ids})
+    return jsonify({"job_id": job_id, "status": "queued"}), 202
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """Prometheus text-format request/stage latency histograms and LLM counters"""
+    return Response(REGISTRY.render(), content_type=CONTENT_TYPE)
+
 @app.route("/health", methods=["GET"])
 def health_check():
     """Health check endpoint"""
     return jsonify({
         "status": "healthy",
         "timestamp": datetime.utcnow().isoformat(),
-        "agents_count": len(localData.get("agents", [])),
+        "agents_count": len(agent_roster),
+        "roster": agent_roster.stats(),
         "openai_available": OPENAI_AVAILABLE,
+        "llm_cache": response_cache.stats() if response_cache else None,
+        "llm_backends": llm_backend_stats() if llm_backend_stats else None,
+        "llm_mode": {"mode": LLM_MODE, "budget_ms": LLM_BUDGET_MS, **llm_mode_stats.snapshot()},
         "database": "connected" if os.path.exists(DB_PATH) else "not_found",
+        "sqlite": {"journal_mode": SQLITE_JOURNAL_MODE, "synchronous": SQLITE_SYNCHRONOUS},
+        "group_commit": message_writer.stats() if message_writer else None,
+        "session_turns": session_turns.stats(),
+        "jobs": job_queue.stats(),
         "conversation_manager": "active"
     })
 
@@ -1120,16 +2225,24 @@ def home():
         "routes": [
             "GET / - This info",
             "GET /health - Health check",
+            "GET /metrics - Prometheus latency histograms and LLM counters",
             "GET /data - View data.json",
             "GET /agents - List all agents",
             "GET /agent/<name> - Get agent details",
+            "GET /agent/<name>/profile - Get agent's time discrepancy profile",
+            "GET /triage?offset=&limit=&scenario= - Agents ranked by discrepancy",
             "GET /conversation_analysis/<id> - Analyze conversation state",
             "POST /create_session - Create new chat session",
             "POST /initialize_session/<id> - Initialize session with AI",
-            "GET /sessions - List all sessions",
-            "GET /sessions/<id> - Get session details",
+            "GET /sessions?limit=&after= - List sessions (cursor in X-Next-Cursor)",
+            "GET /sessions/<id>?since_id=&limit= - Get session messages (ETag aware)",
             "POST /sessions/<id>/messages - Add message to session",
-            "POST /chat_with_ai - Chat with AI (intelligent)"
+            "POST /sessions/bulk - Create sessions (JSON array or NDJSON, optional messages)",
+            "POST /messages/bulk - Add messages across sessions (JSON array or NDJSON)",
+            "POST /chat_with_ai - Chat with AI (intelligent)",
+            "POST /chat_with_ai/stream - Chat with AI as Server-Sent Events",
+            "GET /jobs/<id> - Background job status and result (closing summaries, re-analysis)",
+            "POST /jobs/reanalyze - Queue re-analysis of {\"session_ids\": [...]}"
         ]
     })
 
@@ -1138,10 +2251,14 @@ if __name__ == "__main__":
     print(f"Database path: {DB_PATH}")
     print(f"Data.json path: {DATA_JSON_PATH}")
     print(f"Data.json exists: {os.path.exists(DATA_JSON_PATH)}")
-    print(f"Agents loaded: {len(localData.get('agents', []))}")
+    print(f"Agents loaded: {len(agent_roster)}")
     print(f"OpenAI client available: {OPENAI_AVAILABLE}")
+    print(f"LLM mode: {LLM_MODE}")
     print(f"Conversation Manager: Active")
 
+    # The debug reloader serves from a child process; only that one runs jobs
+    if os.environ.get("WERKZEUG_RUN_MAIN") == "true":
+        start_background_workers()
     app.run(host="0.0.0.0", port=5000, debug=True)
     
     
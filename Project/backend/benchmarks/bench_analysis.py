@@ -0,0 +1,116 @@
+"""Incremental vs full re-scan analyze_conversation_state on long transcripts.
+
+Checks that both modes produce identical established_facts / unresolved_issues
+on every turn, and that re-analysing a finished transcript
+(replay_conversation_state, as reanalyze.py and the reanalyze job do) ends
+with the live session's state. Then times a full conversation in each mode.
+
+    python benchmarks/bench_analysis.py [--turns 500] [--transcripts 20]
+"""
+import os
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import ConversationManager, SessionTracker
+
+AGENT = {
+    "name": "Bench Agent",
+    "schedule": {"start_time": "10/14/2025 9:00 AM"},
+    "system": {"start_time": "10/14/2025 9:05 AM"},
+    "phone": {"start_time": "10/14/2025 8:40 AM"},
+    "agent_disputed": {"start_time": "10/14/2025 8:15 AM"}
+}
+
+USER_PHRASES = [
+    "I was in a meeting", "there was a training session", "I arrived early",
+    "my supervisor organized it", "it lasted about 30 minutes", "the phone had a glitch",
+    "I was doing preparation work", "nothing specific really", "no one was there",
+    "I think the system is wrong", "it was my daily routine", "the team lead asked me",
+    "ok", "sure", "I don't remember", "I came in at 8:15 am", "we discussed the agenda",
+    "I was checking emails", "the security face scan", "from 8 until 9"
+]
+
+ASSISTANT_PHRASES = [
+    "What were you doing?", "Who organized this meeting and what was its purpose?",
+    "Were these activities work-related or personal?", "Thanks.",
+    "Is there anyone who can verify your early arrival time?"
+]
+
+def make_transcript(turns, rng):
+    messages = []
+    for _ in range(turns):
+        messages.append({"role": "assistant", "content": rng.choice(ASSISTANT_PHRASES)})
+        messages.append({"role": "user", "content": " ".join(rng.sample(USER_PHRASES, rng.randint(0, 2))) or "hmm"})
+    return messages
+
+def run_conversation(manager, messages, session_id, check_against=None):
+    state = None
+    for end in range(2, len(messages) + 1, 2):
+        history = messages[:end]
+        state = manager.analyze_conversation_state(history, AGENT, session_id)
+        if check_against is not None:
+            expected = check_against.analyze_conversation_state(history, AGENT, session_id)
+            for key in ("established_facts", "unresolved_issues", "conversation_stage", "quality_score", "question_count"):
+                got = sorted(state[key]) if isinstance(state[key], list) else state[key]
+                want = sorted(expected[key]) if isinstance(expected[key], list) else expected[key]
+                assert got == want, f"turn {end // 2}: {key} differs: {got} != {want}"
+    return state
+
+def check_replay(messages, session_id):
+    """Stored state after the live turns vs a fresh replay of the transcript; True if one pass would differ"""
+    live = ConversationManager(SessionTracker())
+    expected = live.persistable_state(session_id, run_conversation(live, messages, session_id))
+    replay = ConversationManager(SessionTracker())
+    got = replay.persistable_state(session_id, replay.replay_conversation_state(messages, AGENT, session_id))
+    assert got == expected, f"replay differs from live: {got} != {expected}"
+    one_pass = ConversationManager(SessionTracker())
+    one_pass.analyze_conversation_state(messages, AGENT, session_id)
+    return one_pass.persistable_state(session_id)["established_facts"] != expected["established_facts"]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--turns", type=int, default=500)
+    parser.add_argument("--transcripts", type=int, default=20)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    transcripts = [make_transcript(args.turns, rng) for _ in range(args.transcripts)]
+
+    for i, messages in enumerate(transcripts):
+        run_conversation(
+            ConversationManager(SessionTracker()),
+            messages,
+            i,
+            check_against=ConversationManager(SessionTracker(), incremental_analysis=False)
+        )
+    print(f"Equivalence: OK ({args.transcripts} transcripts x {args.turns} turns)")
+
+    short = [make_transcript(rng.randint(1, 8), rng) for _ in range(200)]
+    # Facts from turn 1 fall out of the last-3-user-messages window by turn 5
+    short.append([
+        {"role": "assistant", "content": "What were you doing before your shift?"},
+        {"role": "user", "content": "my supervisor organized a meeting"},
+        *({"role": role, "content": content} for _ in range(4) for role, content in (
+            ("assistant", "What were you doing?"), ("user", "ok")
+        ))
+    ])
+    one_pass_misses = sum(check_replay(messages, i) for i, messages in enumerate(transcripts + short))
+    print(f"Replay matches live: OK ({len(transcripts) + len(short)} transcripts; "
+          f"a single pass would lose facts on {one_pass_misses})")
+
+    for label, incremental in (("full re-scan", False), ("incremental", True)):
+        manager = ConversationManager(SessionTracker(max_sessions=len(transcripts) + 1), incremental_analysis=incremental)
+        started = time.perf_counter()
+        for i, messages in enumerate(transcripts):
+            run_conversation(manager, messages, i)
+        elapsed = time.perf_counter() - started
+        per_turn_us = elapsed / (len(transcripts) * args.turns) * 1e6
+        print(f"{label:>13}: {elapsed:.3f}s total, {per_turn_us:.1f} us/turn")
+
+if __name__ == "__main__":
+    main()
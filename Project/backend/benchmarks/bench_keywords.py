@@ -0,0 +1,160 @@
+"""Per-turn keyword scanning: legacy list/regex scans vs the shared KeywordMatcher.
+
+Verifies the matchers agree with the original scans on a corpus of user
+messages and questions, then times one turn's worth of scanning each way.
+
+    python benchmarks/bench_keywords.py [--rounds 2000]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import (
+    USER_FACT_MATCHER, SUMMARY_MATCHER, FOLLOWUP_MATCHER, CONTEXTUAL_FOLLOWUPS,
+    ConversationManager, SessionTracker, is_similar_question
+)
+
+USER_MESSAGES = [
+    "I was in a meeting with my supervisor", "there was a training session at 8:15 am",
+    "I arrived early to prepare", "it lasted about 30 minutes", "the phone had a glitch",
+    "nothing specific, just routine", "no one was there, I was alone", "I think the system is wrong",
+    "my daily routine is checking emails", "the team lead organized a briefing",
+    "the building security face scan should show when I enter", "ok", "I don't remember",
+    "I came in before my time to finish a task", "we discussed the agenda for the workshop",
+    "Honestly I am not sure what else to tell you, I was just doing the usual things everyone does"
+]
+
+QUESTIONS = [
+    "Who organized this meeting and what was its purpose?",
+    "Were these activities work-related or personal?",
+    "Is there anyone who can verify your early arrival time?",
+    "How do you typically track your work hours when you arrive early?",
+    "What makes you think the system and phone recordings are incorrect?",
+    "Could you describe what your daily routine involves when you first arrive?",
+    "Why did you edit your start time from 09:05:00 AM to 08:15:00 AM?",
+    "I notice your phone shows 08:40:00 AM but you mentioned 08:15:00 AM. Can you explain this 25 minute difference?"
+]
+
+LEGACY_FACTS = {
+    "activity": ["meeting", "training", "session", "conference", "briefing", "workshop"],
+    "arrival": ["arrived", "came", "reached", "started", "clocked", "entered", "early", "before"],
+    "organizer": ["supervisor", "manager", "team lead", "organized", "lead", "headed", "colleague", "coworker"],
+    "duration": ["minutes", "hours", "duration", "lasted", "until", "from", "about"],
+    "purpose": ["topic", "about", "purpose", "discuss", "agenda", "subject", "work", "preparation"],
+    "phone_explanation": ["glitch", "error", "technical", "issue", "problem", "malfunction", "wrong", "incorrect", "faulty"]
+}
+
+LEGACY_SUMMARY = {
+    "meeting": ["meeting", "conference", "briefing"],
+    "technical": ["glitch", "error", "technical", "system wrong"],
+    "early": ["early", "before time", "arrived early"],
+    "work": ["work", "preparation", "routine", "task"],
+    "no_witness": ["no one", "nobody", "alone", "verify"],
+    "colleagues": ["supervisor", "manager", "colleague", "team"]
+}
+
+LEGACY_SIMILAR = [
+    "what.*activity", "work.*related", "personal",
+    "who.*verify", "anyone.*verify", "witness",
+    "how.*track", "track.*work", "record.*time",
+    "what.*routine", "daily.*routine", "morning.*routine",
+    "technical.*issue", "system.*wrong", "phone.*wrong"
+]
+
+LEGACY_KEY_PHRASES = [
+    "why did you edit", "phone shows", "explain this difference", "what activities",
+    "who organized", "how long", "can verify", "work-related"
+]
+
+def legacy_user_facts(text):
+    hits = {name for name, words in LEGACY_FACTS.items() if any(word in text for word in words)}
+    if re.search(r'(\d{1,2}):?(\d{2})?\s*(am|pm|AM|PM)?', text):
+        hits.add("time_mention")
+    return hits
+
+def legacy_summary(text):
+    return {name for name, words in LEGACY_SUMMARY.items() if any(word in text for word in words)}
+
+def legacy_followup(text):
+    for pattern in CONTEXTUAL_FOLLOWUPS:
+        if re.search(pattern, text):
+            return pattern
+    return None
+
+def legacy_are_questions_similar(q1, q2):
+    q1_lower, q2_lower = q1.lower(), q2.lower()
+    return any(re.search(p, q1_lower) and re.search(p, q2_lower) for p in LEGACY_SIMILAR)
+
+def legacy_is_similar_question(q1, q2):
+    q1_lower, q2_lower = q1.lower(), q2.lower()
+    return any(p in q1_lower and p in q2_lower for p in LEGACY_KEY_PHRASES)
+
+def matcher_followup(text):
+    hits = FOLLOWUP_MATCHER.categories(text)
+    return next((pattern for pattern in CONTEXTUAL_FOLLOWUPS if pattern in hits), None)
+
+def legacy_turn(user_message, asked, previous):
+    text = user_message.lower()
+    legacy_user_facts(text)
+    legacy_summary(text)
+    legacy_followup(text)
+    for candidate in QUESTIONS[:3]:
+        for q in asked:
+            legacy_are_questions_similar(candidate, q)
+    for q in previous:
+        legacy_is_similar_question(q, asked[-1])
+
+def matcher_turn(manager, user_message, asked, previous):
+    text = user_message.lower()
+    USER_FACT_MATCHER.categories(text)
+    SUMMARY_MATCHER.categories(text)
+    matcher_followup(text)
+    for candidate in QUESTIONS[:3]:
+        for q in asked:
+            manager.are_questions_similar(candidate, q)
+    for q in previous:
+        is_similar_question(q, asked[-1])
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rounds", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    manager = ConversationManager(SessionTracker())
+
+    corpus = USER_MESSAGES + [" ".join(rng.sample(USER_MESSAGES, 3)) for _ in range(200)]
+    for message in corpus:
+        text = message.lower()
+        assert USER_FACT_MATCHER.categories(text) == legacy_user_facts(text), message
+        assert SUMMARY_MATCHER.categories(text) == legacy_summary(text), message
+        assert matcher_followup(text) == legacy_followup(text), message
+    for q1 in QUESTIONS:
+        for q2 in QUESTIONS:
+            assert manager.are_questions_similar(q1, q2) == legacy_are_questions_similar(q1, q2), (q1, q2)
+            assert is_similar_question(q1, q2) == legacy_is_similar_question(q1, q2), (q1, q2)
+    print(f"Equivalence: OK ({len(corpus)} messages, {len(QUESTIONS) ** 2} question pairs)")
+
+    turns = [(rng.choice(USER_MESSAGES), rng.sample(QUESTIONS, 5), rng.sample(QUESTIONS, 5)) for _ in range(args.rounds)]
+
+    started = time.perf_counter()
+    for turn in turns:
+        legacy_turn(*turn)
+    legacy = (time.perf_counter() - started) / len(turns) * 1e6
+
+    started = time.perf_counter()
+    for turn in turns:
+        matcher_turn(manager, *turn)
+    matcher = (time.perf_counter() - started) / len(turns) * 1e6
+
+    print(f"legacy scans: {legacy:.1f} us/turn")
+    print(f"     matcher: {matcher:.1f} us/turn ({legacy / matcher:.1f}x)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""chat_with_gpt throughput across a pool of stub model servers.
+
+Each stub processes --parallel requests at a time (like OLLAMA_NUM_PARALLEL)
+with --latency-ms per request. --clients threads call chat_with_gpt for
+--seconds against pools of 1..--max-backends stubs, for both routing
+policies, and once more with one backend --slow-factor times slower to
+show how each policy steers around it.
+
+    python benchmarks/bench_llm_pool.py [--max-backends 4] [--parallel 2] [--latency-ms 100] [--clients 16]
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+os.environ.setdefault("LLM_CACHE_SIZE", "0")
+os.environ.setdefault("LLM_HEALTH_INTERVAL_S", "0")
+
+import openai_client
+from llm_pool import BackendPool, LLMBackend
+from stub_llm import start_stub_server
+
+MESSAGES = [
+    {"role": "system", "content": 'Ask ONLY this specific question: "What time did your shift start?"'},
+    {"role": "user", "content": "I was in a meeting"}
+]
+
+def run(pool, clients, seconds):
+    """Completed calls per second and the per-backend request split"""
+    openai_client.llm_pool = pool
+    deadline = time.monotonic() + seconds
+    done = [0] * clients
+
+    def client(i):
+        while time.monotonic() < deadline:
+            openai_client.chat_with_gpt(MESSAGES, use_cache=False)
+            done[i] += 1
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    return sum(done) / elapsed, [backend.requests for backend in pool.backends]
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--max-backends", type=int, default=4)
+    parser.add_argument("--parallel", type=int, default=2)
+    parser.add_argument("--latency-ms", type=float, default=100)
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--slow-factor", type=float, default=4)
+    args = parser.parse_args()
+
+    def stub(latency_ms):
+        server, _ = start_stub_server(0, latency_ms, latency_ms / 10, 0.0, 1, args.parallel)
+        return f"http://127.0.0.1:{server.server_address[1]}/v1"
+
+    urls = [stub(args.latency_ms) for _ in range(args.max_backends)]
+    slow_url = stub(args.latency_ms * args.slow_factor)
+
+    def pool(backend_urls, routing):
+        # Cap at the server's own parallelism so excess requests wait for the least busy backend
+        return BackendPool([LLMBackend(url, None, args.parallel) for url in backend_urls], routing, health_interval=0)
+
+    print(f"{args.clients} clients, stubs: {args.latency_ms:.0f} ms, {args.parallel} parallel each")
+    for routing in ("least_outstanding", "ewma"):
+        for n in range(1, args.max_backends + 1):
+            rate, split = run(pool(urls[:n], routing), args.clients, args.seconds)
+            print(f"{routing:>17} {n} backend(s): {rate:7.1f} calls/s  split {split}")
+        rate, split = run(pool(urls[:args.max_backends - 1] + [slow_url], routing), args.clients, args.seconds)
+        print(f"{routing:>17} {args.max_backends - 1} + 1 slow:    {rate:7.1f} calls/s  split {split}")
+
+if __name__ == "__main__":
+    main()
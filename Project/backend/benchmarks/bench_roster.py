@@ -0,0 +1,100 @@
+"""Backend startup time and memory: data.json vs the compiled roster snapshot.
+
+Generates a synthetic roster, compiles it with roster_snapshot.build_snapshot,
+then imports app in a fresh process per configuration and reports import
+time, peak RSS and agent lookup latency.
+
+    python benchmarks/bench_roster.py [--agents 100000] [--lookups 2000]
+"""
+import os
+import sys
+import json
+import time
+import random
+import resource
+import tempfile
+import argparse
+import subprocess
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+def make_agent(i):
+    day = "10/14/2025"
+    return {
+        "name": f"Agent {i:06d}",
+        "agent_id": f"A{i}",
+        "schedule": {"start_time": f"{day} 9:00 AM", "end_time": f"{day} 5:00 PM"},
+        "system": {"start_time": f"{day} 9:{i % 60:02d} AM", "end_time": f"{day} 5:00 PM"},
+        "phone": {"start_time": f"{day} 8:{i % 60:02d} AM", "end_time": f"{day} 5:00 PM"},
+        "agent_disputed": {"start_time": f"{day} 8:15 AM", "end_time": f"{day} 5:00 PM"}
+    }
+
+def run_worker(agents, lookups):
+    started = time.perf_counter()
+    import app
+    import_ms = (time.perf_counter() - started) * 1000
+
+    rng = random.Random(7)
+    names = [f"agent {rng.randrange(max(agents, 1)):06d}" for _ in range(lookups)]
+    started = time.perf_counter()
+    for name in names:
+        app.agent_roster.find(name)
+    lookup_us = (time.perf_counter() - started) / max(lookups, 1) * 1e6
+
+    print(json.dumps({
+        "import_ms": import_ms,
+        "max_rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "lookup_us": lookup_us,
+        "source": app.agent_roster.stats()["source"]
+    }))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--agents", type=int, default=100000)
+    parser.add_argument("--lookups", type=int, default=2000)
+    parser.add_argument("--worker", action="store_true")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.agents, args.lookups)
+        return
+
+    from roster_snapshot import build_snapshot
+
+    with tempfile.TemporaryDirectory() as tmp:
+        empty_path = os.path.join(tmp, "empty.json")
+        json_path = os.path.join(tmp, "data.json")
+        snapshot_path = os.path.join(tmp, "roster.db")
+        with open(empty_path, "w", encoding="utf-8") as f:
+            json.dump({"agents": []}, f)
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump({"agents": [make_agent(i) for i in range(args.agents)]}, f)
+
+        started = time.perf_counter()
+        build_snapshot(json_path, snapshot_path)
+        print(f"snapshot build: {time.perf_counter() - started:.2f}s for {args.agents} agents "
+              f"({os.path.getsize(json_path) / 1e6:.1f} MB json -> {os.path.getsize(snapshot_path) / 1e6:.1f} MB snapshot)")
+
+        configs = [
+            ("empty roster", empty_path, os.path.join(tmp, "missing.db")),
+            ("data.json", json_path, os.path.join(tmp, "missing.db")),
+            ("snapshot", json_path, snapshot_path)
+        ]
+        for label, data_path, roster_path in configs:
+            env = dict(
+                os.environ,
+                DATA_JSON_PATH=data_path,
+                ROSTER_SNAPSHOT_PATH=roster_path,
+                DB_PATH=os.path.join(tmp, f"{label.replace(' ', '_')}.db")
+            )
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", "--agents", str(args.agents), "--lookups", str(args.lookups)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{label:>12} ({result['source']}): import {result['import_ms']:7.0f} ms, "
+                  f"peak RSS {result['max_rss_mb']:6.1f} MB, lookup {result['lookup_us']:6.1f} us")
+
+if __name__ == "__main__":
+    main()
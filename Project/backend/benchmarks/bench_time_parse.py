@@ -0,0 +1,209 @@
+"""Single-pass clock_time parser vs the original standardize/diff code.
+
+Property check: on randomly generated inputs in every accepted format
+(ISO datetimes and dates, "M/D/YYYY h:mm AM", "h:mm[:ss] [am|pm]", bare
+digits) plus junk and out-of-range values, format_clock and
+clock_difference must return exactly what the original methods did.
+Then times both on a roster-shaped workload, cold and memoized.
+
+    python benchmarks/bench_time_parse.py [--cases 50000] [--rounds 200000]
+"""
+import os
+import re
+import sys
+import time
+import random
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import clock_time
+from clock_time import format_clock, clock_difference, parse_minutes
+
+def legacy_standardize(time_str):
+    """Convert many time formats to consistent h:mm:ss AM/PM or return 'unknown'."""
+    if not time_str or str(time_str).strip() == '':
+        return 'unknown'
+
+    try:
+        s = str(time_str).strip()
+        try:
+            dt = datetime.fromisoformat(s)
+            return dt.strftime("%I:%M:%S %p")
+        except Exception:
+            pass
+
+        m = re.search(r'(\d{1,2}):(\d{2})(?::(\d{2}))?\s*(AM|PM|am|pm)?', s)
+        if m:
+            hour = int(m.group(1))
+            minute = int(m.group(2))
+            second = int(m.group(3)) if m.group(3) else 0
+            period = m.group(4)
+
+            if period:
+                period = period.upper()
+                if period == 'PM' and hour != 12:
+                    hour += 12
+                if period == 'AM' and hour == 12:
+                    hour = 0
+            else:
+                if 0 <= hour <= 23:
+                    pass
+                else:
+
+                    return 'unknown'
+
+            disp_hour = hour
+            disp_period = 'AM'
+            if hour == 0:
+                disp_hour = 12
+                disp_period = 'AM'
+            elif hour == 12:
+                disp_hour = 12
+                disp_period = 'PM'
+            elif hour > 12:
+                disp_hour = hour - 12
+                disp_period = 'PM'
+            else:
+                disp_period = 'AM'
+
+            return f"{disp_hour:02d}:{minute:02d}:{second:02d} {disp_period}"
+
+        m2 = re.search(r'^\d{1,4}$', s)
+        if m2:
+            val = s
+            if len(val) in (3,4):
+                minute_part = val[-2:]
+                hour_part = val[:-2]
+                hour = int(hour_part)
+                minute = int(minute_part)
+                return legacy_standardize(f"{hour}:{minute}:00")
+            elif len(val) <= 2:
+                hour = int(val)
+                return legacy_standardize(f"{hour}:00:00")
+
+        return 'unknown'
+
+    except Exception as e:
+        print(f"Time standardization error: {e}")
+        return 'unknown'
+
+def legacy_difference(time1_str, time2_str):
+    """Calculate time difference in minutes between two time strings. Returns int or None."""
+    if not time1_str or not time2_str:
+        return None
+
+    try:
+        def parse_time_to_minutes(time_str):
+            standardized = legacy_standardize(time_str)
+            if standardized == 'unknown':
+                return None
+            parts = standardized.split(' ')
+            time_part = parts[0]
+            period = parts[1] if len(parts) > 1 else 'AM'
+
+            hours, minutes, seconds = map(int, time_part.split(':'))
+
+            if period.upper() == 'PM' and hours != 12:
+                hours += 12
+            elif period.upper() == 'AM' and hours == 12:
+                hours = 0
+
+            return hours * 60 + minutes
+
+        t1 = parse_time_to_minutes(time1_str)
+        t2 = parse_time_to_minutes(time2_str)
+
+        if t1 is None or t2 is None:
+            return None
+
+        return abs(t1 - t2)
+
+    except Exception as e:
+        print(f"Time difference calculation error: {e}")
+        return None
+
+def random_time(rng):
+    hour = rng.randint(0, 30)
+    minute = rng.randint(0, 99) if rng.random() < 0.1 else rng.randint(0, 59)
+    second = rng.randint(0, 59)
+    period = rng.choice(["AM", "PM", "am", "pm", "Am", ""])
+    kind = rng.randrange(12)
+    if kind == 0:
+        return f"2025-{rng.randint(1, 12):02d}-{rng.randint(1, 28):02d}T{hour % 24:02d}:{minute % 60:02d}:{second:02d}"
+    if kind == 1:
+        return rng.choice(["2025-10-14", "20251014", "2025-10-14T0815", "2025-10-14T08:15:30Z", "2025-10-14 08:15:30+05:30"])
+    if kind == 2:
+        return f"{rng.randint(1, 12)}/{rng.randint(1, 28)}/2025 {hour % 13}:{minute:02d} {period}"
+    if kind == 3:
+        return f"{hour}:{minute:02d}:{second:02d}{rng.choice(['', ' '])}{period}"
+    if kind == 4:
+        return f"{hour}:{minute:02d} {period}"
+    if kind == 5:
+        return str(rng.randint(0, 9999)).zfill(rng.randint(1, 4))
+    if kind == 6:
+        return rng.choice(["", "   ", "unknown", "N/A", "noon", "9.15", "9h15", "12345", "1:5", None, 0, 815])
+    if kind == 7:
+        return f"  {hour}:{minute:02d}{period}  "
+    if kind == 8:
+        return f"1{hour}:{minute:02d}"
+    if kind == 9:
+        return f"at {hour}:{minute:02d} {period} today"
+    if kind == 10:
+        return legacy_standardize(f"{hour}:{minute:02d} {period}")
+    return f"{rng.randint(0, 9)}{rng.randint(0, 9)}{rng.randint(0, 9)}"
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--cases", type=int, default=50000)
+    parser.add_argument("--rounds", type=int, default=200000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    cases = [random_time(rng) for _ in range(args.cases)]
+    for value in cases:
+        assert format_clock(value) == legacy_standardize(value), (value, format_clock(value), legacy_standardize(value))
+    for value1, value2 in zip(cases, reversed(cases)):
+        assert clock_difference(value1, value2) == legacy_difference(value1, value2), (value1, value2)
+    for value in cases:
+        shown = format_clock(value)
+        if shown != "unknown":
+            assert format_clock(shown) == shown, value
+            assert parse_minutes(shown) == parse_minutes(value), value
+    print(f"Equivalence: OK ({len(cases)} inputs, {len(cases)} pairs)")
+
+    # A roster's worth of distinct start times, looked up repeatedly like per-turn code does
+    roster = [f"10/14/2025 {rng.randint(1, 12)}:{rng.randint(0, 59):02d} {rng.choice(['AM', 'PM'])}" for _ in range(2000)]
+    pairs = [(rng.choice(roster), rng.choice(roster)) for _ in range(args.rounds)]
+
+    started = time.perf_counter()
+    for value1, value2 in pairs:
+        legacy_difference(legacy_standardize(value1), legacy_standardize(value2))
+    legacy = args.rounds / (time.perf_counter() - started)
+
+    clock_time._parse.cache_clear()
+    started = time.perf_counter()
+    for value1, value2 in pairs:
+        clock_difference(format_clock(value1), format_clock(value2))
+    parsed = args.rounds / (time.perf_counter() - started)
+
+    # Uncached parse of distinct strings: the single-pass path on its own
+    distinct = [str(value).strip() for value in cases if value and str(value).strip()]
+    started = time.perf_counter()
+    for value in distinct:
+        legacy_standardize(value)
+    legacy_cold = len(distinct) / (time.perf_counter() - started)
+    started = time.perf_counter()
+    for value in distinct:
+        clock = clock_time._parse.__wrapped__(value)
+        clock.display() if clock is not None else 'unknown'
+    parsed_cold = len(distinct) / (time.perf_counter() - started)
+
+    print(f"     legacy: {legacy:10.0f} diffs/s, {legacy_cold:10.0f} parses/s uncached")
+    print(f" clock_time: {parsed:10.0f} diffs/s, {parsed_cold:10.0f} parses/s uncached")
+    print(f"    speedup: {parsed / legacy:.1f}x memoized, {parsed_cold / legacy_cold:.1f}x uncached (cache {clock_time.cache_stats()})")
+
+if __name__ == "__main__":
+    main()
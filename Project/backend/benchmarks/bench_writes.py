@@ -0,0 +1,74 @@
+"""Message write throughput through POST /sessions/<id>/messages.
+
+Each configuration runs in its own process against a throwaway database:
+the legacy rollback journal with FULL sync, WAL with tuned pragmas, and
+WAL plus the group-commit writer.
+
+    python benchmarks/bench_writes.py [--threads 16] [--messages 200]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+import argparse
+import subprocess
+import threading
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CONFIGS = [
+    ("delete journal, synchronous=FULL", {"SQLITE_JOURNAL_MODE": "DELETE", "SQLITE_SYNCHRONOUS": "FULL", "DB_GROUP_COMMIT": "0"}),
+    ("WAL, synchronous=NORMAL", {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "DB_GROUP_COMMIT": "0"}),
+    ("WAL + group commit", {"SQLITE_JOURNAL_MODE": "WAL", "SQLITE_SYNCHRONOUS": "NORMAL", "DB_GROUP_COMMIT": "1"}),
+]
+
+def run_worker(threads, messages):
+    sys.path.insert(0, BACKEND_DIR)
+    import app
+
+    client = app.app.test_client()
+    session_id = client.post("/create_session", json={"agent": "bench"}).get_json()["id"]
+    errors = []
+
+    def post_messages():
+        local_client = app.app.test_client()
+        for i in range(messages):
+            resp = local_client.post(f"/sessions/{session_id}/messages", json={"role": "user", "content": f"message {i}"})
+            if resp.status_code != 201:
+                errors.append(resp.status_code)
+
+    workers = [threading.Thread(target=post_messages) for _ in range(threads)]
+    started = time.perf_counter()
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    elapsed = time.perf_counter() - started
+
+    total = threads * messages
+    print(json.dumps({"messages_per_sec": total / elapsed, "errors": len(errors), "total": total}))
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--worker", action="store_true")
+    args = parser.parse_args()
+
+    if args.worker:
+        run_worker(args.threads, args.messages)
+        return
+
+    for label, overrides in CONFIGS:
+        with tempfile.TemporaryDirectory() as tmp:
+            env = dict(os.environ, DB_PATH=os.path.join(tmp, "sessions.db"), **overrides)
+            out = subprocess.run(
+                [sys.executable, __file__, "--worker", "--threads", str(args.threads), "--messages", str(args.messages)],
+                env=env, capture_output=True, text=True, check=True
+            ).stdout
+            result = json.loads(out.strip().splitlines()[-1])
+            print(f"{label:>34}: {result['messages_per_sec']:8.0f} msg/s ({result['total']} messages, {result['errors']} errors)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,100 @@
+"""Closing summaries from the summary job vs the inline path, for both request shapes.
+
+Runs the same scripted conversation against a throwaway database and
+roster four times: posting only the new `message` (server history) or the
+whole `messages` array (legacy clients), each with SUMMARY_JOBS on and
+off. The summary the background job stores must match the one generated
+inline for the same conversation.
+
+    python benchmarks/check_summary_jobs.py
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+
+AGENT = {
+    "name": "Check Agent",
+    "agent_id": "C1",
+    "schedule": {"start_time": "10/14/2025 9:00 AM", "end_time": "10/14/2025 5:00 PM"},
+    "system": {"start_time": "10/14/2025 9:05 AM", "end_time": "10/14/2025 5:00 PM"},
+    "phone": {"start_time": "10/14/2025 8:40 AM", "end_time": "10/14/2025 5:00 PM"},
+    "agent_disputed": {"start_time": "10/14/2025 8:15 AM", "end_time": "10/14/2025 5:00 PM"}
+}
+
+USER_TURNS = [
+    "I was in a team meeting before my shift",
+    "my supervisor organized it to go over the new schedule",
+    "it lasted about 45 minutes",
+    "I arrived at 8:15 am",
+    "my team lead can verify that",
+    "the phone glitch was because the face scan failed",
+    "that is everything"
+]
+
+def run_conversation(client, legacy):
+    """Chat until the closing turn; returns that turn's JSON and the session id"""
+    session_id = client.post("/initialize_session", json={"agent_name": AGENT["name"]}).get_json()["session_id"]
+    messages = []
+    for text in USER_TURNS:
+        if legacy:
+            messages.append({"role": "user", "content": text})
+            body = {"session_id": session_id, "agent_name": AGENT["name"], "messages": messages}
+        else:
+            body = {"session_id": session_id, "agent_name": AGENT["name"], "message": text}
+        reply = client.post("/chat_with_ai", json=body).get_json()
+        if "job_id" in reply or reply["response"].startswith("CONVERSATION SUMMARY:"):
+            return reply, session_id
+        messages.append({"role": "assistant", "content": reply["response"]})
+    raise AssertionError("conversation never reached its summary")
+
+def wait_for_job(app, job_id, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = app.job_queue.get(job_id)
+        if job["status"] in ("done", "failed"):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"job {job_id} didn't finish")
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "data.json")
+        with open(data_path, "w", encoding="utf-8") as f:
+            json.dump({"agents": [AGENT]}, f)
+        os.environ.update(
+            DB_PATH=os.path.join(tmp, "sessions.db"),
+            DATA_JSON_PATH=data_path,
+            ROSTER_SNAPSHOT_PATH=os.path.join(tmp, "roster.db"),
+            JOB_DB_PATH=os.path.join(tmp, "jobs.db"),
+            LLM_MODE="off"
+        )
+        import app
+        client = app.app.test_client()
+
+        for legacy in (False, True):
+            shape = "messages array" if legacy else "single message"
+            app.SUMMARY_JOBS = False
+            inline, _ = run_conversation(client, legacy)
+            app.SUMMARY_JOBS = True
+            queued, session_id = run_conversation(client, legacy)
+            job = wait_for_job(app, queued["job_id"])
+            assert job["status"] == "done", f"{shape}: summary job failed: {job['error']}"
+            summary = job["result"]["summary"]
+            assert summary == inline["response"], (
+                f"{shape}: job summary differs from the inline one:\n{summary}\n--- inline ---\n{inline['response']}"
+            )
+            db = app.SessionLocal()
+            try:
+                stored = app.load_session_history(db, session_id)[-1]["content"]
+            finally:
+                db.close()
+            assert stored == summary, f"{shape}: stored summary differs from the job result"
+            print(f"{shape:>15}: job summary matches inline ({len(summary.splitlines())} lines)")
+
+if __name__ == "__main__":
+    main()
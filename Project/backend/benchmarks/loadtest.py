@@ -0,0 +1,233 @@
+"""Offline end-to-end load test: Flask backend + stub LLM, multi-turn conversations.
+
+Starts the stub OpenAI-compatible server (benchmarks/stub_llm.py) and the
+backend in a subprocess against a throwaway database and roster, then
+runs --concurrency virtual users, each holding conversations through
+/initialize_session and /chat_with_ai. Reports throughput and p50/p95/p99
+latency per route.
+
+With --baseline, the run is compared to an earlier --output file and the
+exit status is 1 if throughput drops or p95 grows by more than
+--max-regression, so it can gate merges.
+
+    python benchmarks/loadtest.py [--concurrency 16] [--conversations 200] [--turns 5]
+        [--latency-ms 300 --jitter-ms 100 --error-rate 0.02] [--llm-mode full]
+        [--output result.json] [--baseline result.json --max-regression 0.2]
+"""
+import os
+import sys
+import json
+import math
+import time
+import random
+import socket
+import argparse
+import tempfile
+import threading
+import subprocess
+
+import requests
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from stub_llm import start_stub_server
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+USER_REPLIES = [
+    "I was in a meeting with my supervisor", "there was a training session before my shift",
+    "I arrived early to prepare for the day", "it lasted about 30 minutes",
+    "the phone had a glitch that morning", "the team lead organized a briefing",
+    "I was doing preparation work", "no one else was there", "we discussed the agenda",
+    "I think the system clock is wrong"
+]
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an ascending list"""
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct / 100 * len(sorted_values)))
+    return sorted_values[min(rank, len(sorted_values)) - 1]
+
+def write_roster(path, agents):
+    roster = []
+    for i in range(agents):
+        roster.append({
+            "name": f"Load Agent {i}",
+            "agent_id": f"L{i}",
+            "schedule": {"start_time": "10/14/2025 9:00 AM", "end_time": "10/14/2025 5:00 PM"},
+            "system": {"start_time": f"10/14/2025 9:{i % 50 + 5:02d} AM", "end_time": "10/14/2025 5:00 PM"},
+            "phone": {"start_time": f"10/14/2025 8:{i % 50 + 5:02d} AM", "end_time": "10/14/2025 5:00 PM"},
+            "agent_disputed": {"start_time": "10/14/2025 8:15 AM", "end_time": "10/14/2025 5:00 PM"}
+        })
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump({"agents": roster}, f)
+
+def start_backend(port, env):
+    code = f"import app; app.start_background_workers(); app.app.run(host='127.0.0.1', port={port}, threaded=True, debug=False, use_reloader=False)"
+    proc = subprocess.Popen(
+        [sys.executable, "-c", code], cwd=BACKEND_DIR, env=env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 60
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError("backend exited during startup")
+        try:
+            if requests.get(f"{base}/health", timeout=1).ok:
+                return proc, base
+        except requests.RequestException:
+            time.sleep(0.2)
+    proc.terminate()
+    raise RuntimeError("backend did not become healthy")
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}
+        self.errors = {}
+        self._lock = threading.Lock()
+
+    def record(self, route, seconds, ok):
+        with self._lock:
+            self.latencies.setdefault(route, []).append(seconds)
+            if not ok:
+                self.errors[route] = self.errors.get(route, 0) + 1
+
+def run_user(base, recorder, conversations, turns, agents, seed):
+    rng = random.Random(seed)
+    http = requests.Session()
+
+    def post(route, path, body):
+        started = time.perf_counter()
+        try:
+            resp = http.post(f"{base}{path}", json=body, timeout=60)
+            ok = resp.ok
+            data = resp.json() if ok else None
+        except (requests.RequestException, ValueError):
+            ok, data = False, None
+        recorder.record(route, time.perf_counter() - started, ok)
+        return data
+
+    while True:
+        with conversations["lock"]:
+            if conversations["remaining"] <= 0:
+                return
+            conversations["remaining"] -= 1
+        agent_name = f"Load Agent {rng.randrange(agents)}"
+        started = post("/initialize_session", "/initialize_session", {"agent_name": agent_name})
+        if not started or "session_id" not in started:
+            continue
+        for _ in range(turns):
+            post("/chat_with_ai", "/chat_with_ai", {
+                "session_id": started["session_id"],
+                "agent_name": agent_name,
+                "message": rng.choice(USER_REPLIES)
+            })
+
+def summarize(recorder, elapsed):
+    routes = {}
+    total = 0
+    for route, values in sorted(recorder.latencies.items()):
+        values = sorted(values)
+        total += len(values)
+        routes[route] = {
+            "requests": len(values),
+            "errors": recorder.errors.get(route, 0),
+            "throughput_rps": len(values) / elapsed,
+            "p50_ms": percentile(values, 50) * 1000,
+            "p95_ms": percentile(values, 95) * 1000,
+            "p99_ms": percentile(values, 99) * 1000
+        }
+    return {"elapsed_s": elapsed, "requests": total, "throughput_rps": total / elapsed, "routes": routes}
+
+def compare(result, baseline, max_regression):
+    """Regression messages for throughput drops or p95 growth beyond max_regression"""
+    failures = []
+    if result["throughput_rps"] < baseline["throughput_rps"] * (1 - max_regression):
+        failures.append(f"throughput {result['throughput_rps']:.1f} < baseline {baseline['throughput_rps']:.1f} rps")
+    for route, stats in result["routes"].items():
+        base = baseline["routes"].get(route)
+        if base and stats["p95_ms"] > base["p95_ms"] * (1 + max_regression):
+            failures.append(f"{route} p95 {stats['p95_ms']:.1f} > baseline {base['p95_ms']:.1f} ms")
+    return failures
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--conversations", type=int, default=200)
+    parser.add_argument("--turns", type=int, default=5)
+    parser.add_argument("--agents", type=int, default=500)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--llm-mode", default="full", choices=["full", "off", "shadow", "budgeted"])
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", help="write the result JSON here")
+    parser.add_argument("--baseline", help="result JSON from an earlier run to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.2)
+    args = parser.parse_args()
+
+    stub, stub_config = start_stub_server(0, args.latency_ms, args.jitter_ms, args.error_rate, args.seed)
+    with tempfile.TemporaryDirectory() as tmp:
+        data_path = os.path.join(tmp, "data.json")
+        write_roster(data_path, args.agents)
+        env = dict(
+            os.environ,
+            OPENAI_API_BASE=f"http://127.0.0.1:{stub.server_address[1]}/v1",
+            OPENAI_API_KEY="stub",
+            DB_PATH=os.path.join(tmp, "sessions.db"),
+            DATA_JSON_PATH=data_path,
+            ROSTER_SNAPSHOT_PATH=os.path.join(tmp, "roster.db"),
+            JOB_DB_PATH=os.path.join(tmp, "jobs.db"),
+            LLM_MODE=args.llm_mode,
+            LLM_CACHE_SIZE="0"
+        )
+        backend, base = start_backend(free_port(), env)
+        try:
+            recorder = Recorder()
+            conversations = {"remaining": args.conversations, "lock": threading.Lock()}
+            users = [
+                threading.Thread(target=run_user, args=(base, recorder, conversations, args.turns, args.agents, args.seed + i))
+                for i in range(args.concurrency)
+            ]
+            started = time.perf_counter()
+            for user in users:
+                user.start()
+            for user in users:
+                user.join()
+            result = summarize(recorder, time.perf_counter() - started)
+        finally:
+            backend.terminate()
+            backend.wait(timeout=10)
+            stub.shutdown()
+
+    result["config"] = {key: value for key, value in vars(args).items() if key not in ("output", "baseline")}
+    result["stub"] = {"requests": stub_config.requests, "errors": stub_config.errors}
+
+    print(f"{result['requests']} requests in {result['elapsed_s']:.1f}s, {result['throughput_rps']:.1f} req/s "
+          f"(stub: {stub_config.requests} calls, {stub_config.errors} injected errors)")
+    for route, stats in result["routes"].items():
+        print(f"{route:>20}: {stats['requests']:6d} req {stats['errors']:4d} err  "
+              f"p50 {stats['p50_ms']:7.1f}  p95 {stats['p95_ms']:7.1f}  p99 {stats['p99_ms']:7.1f} ms")
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            failures = compare(result, json.load(f), args.max_regression)
+        for failure in failures:
+            print(f"REGRESSION: {failure}")
+        if failures:
+            sys.exit(1)
+        print(f"No regression beyond {args.max_regression:.0%} of baseline")
+
+if __name__ == "__main__":
+    main()
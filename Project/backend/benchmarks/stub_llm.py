@@ -0,0 +1,138 @@
+"""Stub OpenAI/Ollama-compatible server for offline benchmarks.
+
+Answers POST /v1/chat/completions (plain and stream=True) after a
+configurable latency with jitter, failing a configurable fraction of
+requests with HTTP 500. With --parallel N only N requests are processed
+at once and the rest queue, like a model server with OLLAMA_NUM_PARALLEL=N. The reply is the question the backend's prompt
+asks for, so the rest of the turn behaves as with a real model.
+
+    python benchmarks/stub_llm.py [--port 11500] [--latency-ms 300] [--jitter-ms 100] [--error-rate 0.02] [--parallel 0]
+"""
+import re
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+QUESTION_PATTERN = re.compile(r'Ask ONLY this specific question: "([^"]+)"')
+
+class StubConfig:
+    def __init__(self, latency_ms=300, jitter_ms=100, error_rate=0.0, seed=None, parallel=0):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = 0
+        self.errors = 0
+        self.slots = threading.Semaphore(parallel) if parallel > 0 else None
+        self._lock = threading.Lock()
+
+    def draw(self):
+        """(delay seconds, fail?) for one request"""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.rng.gauss(self.latency_ms, self.jitter_ms)) / 1000
+            fail = self.rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+def make_handler(config):
+    class StubHandler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, format, *args):
+            pass
+
+        def _send_json(self, status, body):
+            data = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def do_GET(self):
+            if self.path.rstrip("/").endswith("/models"):
+                self._send_json(200, {"object": "list", "data": [{"id": "stub", "object": "model"}]})
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def do_POST(self):
+            length = int(self.headers.get("Content-Length") or 0)
+            try:
+                payload = json.loads(self.rfile.read(length) or b"{}")
+            except ValueError:
+                payload = {}
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self._send_json(404, {"error": "not found"})
+                return
+
+            delay, fail = config.draw()
+            if config.slots is not None:
+                with config.slots:
+                    time.sleep(delay)
+            else:
+                time.sleep(delay)
+            if fail:
+                self._send_json(500, {"error": {"message": "stub failure", "type": "server_error"}})
+                return
+
+            prompt = " ".join(m.get("content") or "" for m in payload.get("messages", []) if m.get("role") == "system")
+            match = QUESTION_PATTERN.search(prompt)
+            content = match.group(1) if match else "Could you tell me more about what happened?"
+            model = payload.get("model", "stub")
+
+            if payload.get("stream"):
+                self.send_response(200)
+                self.send_header("Content-Type", "text/event-stream")
+                self.send_header("Connection", "close")
+                self.end_headers()
+                for word in re.findall(r"\S+\s*", content):
+                    chunk = {"object": "chat.completion.chunk", "model": model,
+                             "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                    self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode())
+                self.wfile.write(b"data: [DONE]\n\n")
+                self.close_connection = True
+                return
+
+            self._send_json(200, {
+                "id": "chatcmpl-stub",
+                "object": "chat.completion",
+                "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": content}, "finish_reason": "stop"}],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0}
+            })
+
+    return StubHandler
+
+def start_stub_server(port=0, latency_ms=300, jitter_ms=100, error_rate=0.0, seed=None, parallel=0):
+    """Serve the stub on a background thread; returns (server, config). port=0 picks a free port."""
+    config = StubConfig(latency_ms, jitter_ms, error_rate, seed, parallel)
+    server = ThreadingHTTPServer(("127.0.0.1", port), make_handler(config))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="stub-llm", daemon=True).start()
+    return server, config
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--port", type=int, default=11500)
+    parser.add_argument("--latency-ms", type=float, default=300)
+    parser.add_argument("--jitter-ms", type=float, default=100)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--parallel", type=int, default=0, help="requests processed at once (0 = unlimited)")
+    args = parser.parse_args()
+
+    server, _ = start_stub_server(args.port, args.latency_ms, args.jitter_ms, args.error_rate, args.seed, args.parallel)
+    print(f"Stub LLM on http://127.0.0.1:{server.server_address[1]}/v1 "
+          f"(latency {args.latency_ms}±{args.jitter_ms} ms, error rate {args.error_rate})")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,123 @@
+import math
+import time
+import threading
+from collections import deque
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling a backend whose circuit is open"""
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker with half-open probing.
+
+    closed: calls go through; failure_threshold consecutive failures open it.
+    open: calls are refused until reset_timeout has passed, then it goes
+    half-open. half_open: up to max_probes calls go through; one success
+    closes the circuit, one failure re-opens it for another reset_timeout.
+    """
+    def __init__(self, failure_threshold=5, reset_timeout=30, max_probes=1, name=""):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.max_probes = max_probes
+        self.state = "closed"
+        self.failures = 0
+        self.opened = 0
+        self.rejected = 0
+        self._opened_at = 0.0
+        self._probes = 0
+        self._lock = threading.Lock()
+
+    def allow(self):
+        """True if a call may go out now; callers must report it via success()/failure()"""
+        with self._lock:
+            if self.state == "open":
+                if time.monotonic() - self._opened_at < self.reset_timeout:
+                    self.rejected += 1
+                    return False
+                self.state = "half_open"
+                self._probes = 0
+            if self.state == "half_open":
+                if self._probes >= self.max_probes:
+                    self.rejected += 1
+                    return False
+                self._probes += 1
+            return True
+
+    def success(self):
+        with self._lock:
+            self.failures = 0
+            if self.state == "half_open":
+                self.state = "closed"
+                self._probes = 0
+
+    def abandon(self):
+        """A call allowed by allow() ended without an outcome (cancelled); frees its probe slot"""
+        with self._lock:
+            if self.state == "half_open" and self._probes > 0:
+                self._probes -= 1
+
+    def failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened += 1
+                self._opened_at = time.monotonic()
+                self._probes = 0
+
+    def stats(self):
+        with self._lock:
+            return {
+                "state": self.state,
+                "consecutive_failures": self.failures,
+                "times_opened": self.opened,
+                "rejected": self.rejected
+            }
+
+class LatencyWindow:
+    """Latencies (seconds) of the last `size` successful calls, for percentile-based hedging delays"""
+    def __init__(self, size=200):
+        self._values = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        with self._lock:
+            self._values.append(seconds)
+
+    def percentile(self, pct, min_samples=1):
+        """Nearest-rank percentile, or None with fewer than min_samples observations"""
+        with self._lock:
+            values = sorted(self._values)
+        if len(values) < max(min_samples, 1):
+            return None
+        rank = max(1, math.ceil(pct / 100 * len(values)))
+        return values[min(rank, len(values)) - 1]
+
+    def __len__(self):
+        with self._lock:
+            return len(self._values)
+
+class HedgeBudget:
+    """
+    Caps hedged requests at `ratio` of all requests: each request deposits
+    `ratio` of a token, each hedge spends a whole one, and at most `burst`
+    tokens are saved up. Keeps a latency spike from doubling the load on a
+    backend that is already slow.
+    """
+    def __init__(self, ratio=0.05, burst=5):
+        self.ratio = ratio
+        self.burst = burst
+        self._tokens = float(burst)
+        self._lock = threading.Lock()
+
+    def deposit(self):
+        with self._lock:
+            self._tokens = min(self.burst, self._tokens + self.ratio)
+
+    def try_spend(self):
+        with self._lock:
+            if self._tokens < 1:
+                return False
+            self._tokens -= 1
+            return True
@@ -0,0 +1,112 @@
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+from typing import NamedTuple
+
+TIME_PARSE_CACHE_SIZE = int(os.getenv("TIME_PARSE_CACHE_SIZE", "4096"))
+
+CLOCK_PATTERN = re.compile(r'(\d{1,2}):(\d{2})(?::(\d{2}))?\s*(AM|PM|am|pm)?')
+DIGITS_PATTERN = re.compile(r'^\d{1,4}$')
+
+class ClockTime(NamedTuple):
+    """Time of day as parsed from a roster or chat string.
+
+    hour is on the 24h clock but isn't clamped (a "13:00 PM" entry is hour
+    25), and minute/second are kept as written so the display round-trips
+    exactly.
+    """
+    hour: int
+    minute: int
+    second: int
+
+    @property
+    def minutes(self):
+        """Minutes since midnight"""
+        return self.hour * 60 + self.minute
+
+    def display(self):
+        """hh:mm:ss AM/PM"""
+        hour = self.hour
+        if hour == 0:
+            return f"12:{self.minute:02d}:{self.second:02d} AM"
+        if hour < 12:
+            return f"{hour:02d}:{self.minute:02d}:{self.second:02d} AM"
+        return f"{hour - 12 if hour > 12 else 12:02d}:{self.minute:02d}:{self.second:02d} PM"
+
+def _from_match(match):
+    if match is None:
+        return None
+    hour = int(match.group(1))
+    minute = int(match.group(2))
+    second = int(match.group(3)) if match.group(3) else 0
+    period = match.group(4)
+    if period:
+        period = period.upper()
+        if period == 'PM' and hour != 12:
+            hour += 12
+        if period == 'AM' and hour == 12:
+            hour = 0
+        # 24 AM displays as 12 PM, which reads back as noon
+        if hour == 24:
+            hour = 12
+    elif hour > 23:
+        return None
+    return ClockTime(hour, minute, second)
+
+@lru_cache(maxsize=TIME_PARSE_CACHE_SIZE)
+def _parse(s):
+    # ISO dates always lead with a four-digit year
+    if s[:4].isdigit():
+        try:
+            dt = datetime.fromisoformat(s)
+            return ClockTime(dt.hour, dt.minute, dt.second)
+        except ValueError:
+            pass
+
+    match = CLOCK_PATTERN.search(s)
+    if match:
+        return _from_match(match)
+
+    if DIGITS_PATTERN.match(s):
+        # Bare digits are read as "h:m:00" / "h:00:00", exactly as the
+        # original formatter re-parsed them (so "905" is 5:00, not 9:05)
+        if len(s) > 2:
+            return _from_match(CLOCK_PATTERN.search(f"{int(s[:-2])}:{int(s[-2:])}:00"))
+        return _from_match(CLOCK_PATTERN.search(f"{int(s)}:00:00"))
+    return None
+
+def parse_clock(value):
+    """ClockTime for a time string (ISO, "9:05 AM", "10/14/2025 9:05 AM", "0905", ...) or None"""
+    if not value:
+        return None
+    s = str(value).strip()
+    if not s:
+        return None
+    try:
+        return _parse(s)
+    except Exception as e:
+        print(f"Time parse error: {e}")
+        return None
+
+def parse_minutes(value):
+    """Minutes since midnight, or None if value isn't a recognizable time"""
+    clock = parse_clock(value)
+    return clock.minutes if clock is not None else None
+
+def format_clock(value):
+    """Display form hh:mm:ss AM/PM, or 'unknown'"""
+    clock = parse_clock(value)
+    return clock.display() if clock is not None else 'unknown'
+
+def clock_difference(value1, value2):
+    """Absolute difference in minutes between two times, or None"""
+    clock1 = parse_clock(value1)
+    clock2 = parse_clock(value2)
+    if clock1 is None or clock2 is None:
+        return None
+    return abs(clock1.minutes - clock2.minutes)
+
+def cache_stats():
+    info = _parse.cache_info()
+    return {"hits": info.hits, "misses": info.misses, "size": info.currsize, "max_size": info.maxsize}
@@ -0,0 +1,274 @@
+import os
+import json
+import sqlite3
+import threading
+import time
+import traceback
+from metrics import JOBS
+
+JOB_DB_PATH = os.getenv("JOB_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "jobs.db"))
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "2"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETRY_DELAY_S = float(os.getenv("JOB_RETRY_DELAY_S", "2"))
+JOB_LEASE_S = float(os.getenv("JOB_LEASE_S", "300"))
+JOB_POLL_INTERVAL_S = float(os.getenv("JOB_POLL_INTERVAL_S", "1"))
+
+JOB_STATUSES = ("queued", "running", "done", "failed")
+
+class JobQueue:
+    """
+    Durable background jobs in a WAL-mode SQLite file, run by a thread pool.
+
+    enqueue() stores a job (kind + JSON payload) and wakes a worker, which
+    calls the handler registered for its kind. The handler's return value
+    is stored as the job's JSON result; an exception re-queues the job with
+    exponential backoff until max_attempts, then marks it failed. A job
+    whose worker died is picked up again once its lease expires (or failed,
+    if that was its last attempt), so jobs survive restarts. Leases of jobs
+    still running are renewed every lease / 3 seconds. A worker only records
+    its outcome while the job is still on the attempt it claimed, so a
+    worker whose lease was taken over can't overwrite the new attempt.
+    Several processes can share one queue file.
+    """
+    def __init__(self, path=JOB_DB_PATH, workers=JOB_WORKERS, max_attempts=JOB_MAX_ATTEMPTS,
+                 retry_delay=JOB_RETRY_DELAY_S, lease=JOB_LEASE_S, poll_interval=JOB_POLL_INTERVAL_S, busy_timeout_ms=5000):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.lease = lease
+        self.poll_interval = poll_interval
+        self.busy_timeout_ms = busy_timeout_ms
+        self.handlers = {}
+        self._local = threading.local()
+        self._wakeup = threading.Event()
+        self._threads = []
+        self._start_lock = threading.Lock()
+        self._running = {}
+        self._running_lock = threading.Lock()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                kind TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                status TEXT NOT NULL DEFAULT 'queued',
+                attempts INTEGER NOT NULL DEFAULT 0,
+                max_attempts INTEGER NOT NULL,
+                dedupe_key TEXT UNIQUE,
+                run_after REAL NOT NULL,
+                lease_until REAL,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS ix_jobs_claim ON jobs (status, run_after);
+        """)
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def register(self, kind, handler):
+        """handler(payload_dict, job_dict) -> JSON-serializable result"""
+        self.handlers[kind] = handler
+
+    def enqueue(self, kind, payload, dedupe_key=None, delay=0.0, max_attempts=None):
+        """Store a job and return its id; with dedupe_key, an existing job with that key is returned instead"""
+        now = time.time()
+        conn = self._connection()
+        cursor = conn.execute(
+            """
+            INSERT INTO jobs (kind, payload, max_attempts, dedupe_key, run_after, created_at, updated_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(dedupe_key) DO NOTHING
+            """,
+            (kind, json.dumps(payload), max_attempts or self.max_attempts, dedupe_key, now + delay, now, now)
+        )
+        if cursor.rowcount:
+            job_id = cursor.lastrowid
+            JOBS.inc(kind=kind, outcome="queued")
+        else:
+            job_id = conn.execute("SELECT id FROM jobs WHERE dedupe_key = ?", (dedupe_key,)).fetchone()[0]
+        self.start()
+        self._wakeup.set()
+        return job_id
+
+    def get(self, job_id):
+        row = self._connection().execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._to_dict(row) if row else None
+
+    @staticmethod
+    def _to_dict(row):
+        return {
+            "id": row["id"],
+            "kind": row["kind"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "max_attempts": row["max_attempts"],
+            "payload": json.loads(row["payload"]),
+            "result": json.loads(row["result"]) if row["result"] is not None else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"]
+        }
+
+    def _claim(self):
+        """Atomically take the oldest runnable job (queued, or running with an expired lease)"""
+        now = time.time()
+        conn = self._connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # A lease that ran out on the last attempt fails the job instead of running it again
+            exhausted = conn.execute(
+                "SELECT kind FROM jobs WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts",
+                (now,)
+            ).fetchall()
+            if exhausted:
+                conn.execute(
+                    """
+                    UPDATE jobs SET status = 'failed', error = 'Lease expired on the last attempt', lease_until = NULL, updated_at = ?
+                    WHERE status = 'running' AND lease_until < ? AND attempts >= max_attempts
+                    """,
+                    (now, now)
+                )
+            row = conn.execute(
+                """
+                SELECT * FROM jobs
+                WHERE (status = 'queued' AND run_after <= ?) OR (status = 'running' AND lease_until < ?)
+                ORDER BY id LIMIT 1
+                """,
+                (now, now)
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                self._count_exhausted(exhausted)
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, lease_until = ?, updated_at = ? WHERE id = ?",
+                (now + self.lease, now, row["id"])
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self._count_exhausted(exhausted)
+        job = self._to_dict(row)
+        job["attempts"] += 1
+        job["status"] = "running"
+        return job
+
+    @staticmethod
+    def _count_exhausted(rows):
+        for (kind,) in rows:
+            JOBS.inc(kind=kind, outcome="failed")
+
+    def _finish(self, job, outcome, sql, params):
+        """Run an outcome UPDATE fenced on the claimed attempt; a superseded worker's outcome is dropped"""
+        cursor = self._connection().execute(
+            sql + " WHERE id = ? AND status = 'running' AND attempts = ?", (*params, job["id"], job["attempts"])
+        )
+        if not cursor.rowcount:
+            print(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} lost its lease; outcome dropped")
+            outcome = "superseded"
+        JOBS.inc(kind=job["kind"], outcome=outcome)
+
+    def _complete(self, job, result):
+        self._finish(
+            job, "done",
+            "UPDATE jobs SET status = 'done', result = ?, error = NULL, lease_until = NULL, updated_at = ?",
+            (json.dumps(result), time.time())
+        )
+
+    def _fail(self, job, error):
+        now = time.time()
+        if job["attempts"] < job["max_attempts"]:
+            status, run_after, outcome = "queued", now + self.retry_delay * 2 ** (job["attempts"] - 1), "retried"
+        else:
+            status, run_after, outcome = "failed", now, "failed"
+        self._finish(
+            job, outcome,
+            "UPDATE jobs SET status = ?, error = ?, run_after = ?, lease_until = NULL, updated_at = ?",
+            (status, error, run_after, now)
+        )
+
+    def renew_leases(self):
+        """Push out the lease of every job this process is running; returns how many were renewed"""
+        with self._running_lock:
+            running = list(self._running.items())
+        now = time.time()
+        conn = self._connection()
+        renewed = 0
+        for job_id, attempts in running:
+            renewed += conn.execute(
+                "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = 'running' AND attempts = ?",
+                (now + self.lease, now, job_id, attempts)
+            ).rowcount
+        return renewed
+
+    def _lease_keeper(self):
+        while True:
+            time.sleep(self.lease / 3)
+            try:
+                self.renew_leases()
+            except Exception as e:
+                print(f"Job lease renewal error: {e}")
+
+    def run_one(self):
+        """Claim and run one job; returns it, or None if nothing was runnable"""
+        job = self._claim()
+        if job is None:
+            return None
+        handler = self.handlers.get(job["kind"])
+        with self._running_lock:
+            self._running[job["id"]] = job["attempts"]
+        try:
+            if handler is None:
+                raise LookupError(f"No handler registered for job kind {job['kind']!r}")
+            self._complete(job, handler(job["payload"], job))
+        except Exception as e:
+            print(f"Job {job['id']} ({job['kind']}) attempt {job['attempts']} failed: {e}")
+            self._fail(job, "".join(traceback.format_exception_only(type(e), e)).strip())
+        finally:
+            with self._running_lock:
+                self._running.pop(job["id"], None)
+        return job
+
+    def _worker(self):
+        while True:
+            try:
+                if self.run_one() is not None:
+                    continue
+            except Exception as e:
+                print(f"Job queue error: {e}")
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+    def start(self):
+        """Start the worker threads once; later calls are no-ops"""
+        if self._threads or self.workers <= 0:
+            return
+        with self._start_lock:
+            if self._threads:
+                return
+            for i in range(self.workers):
+                thread = threading.Thread(target=self._worker, name=f"job-worker-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+            threading.Thread(target=self._lease_keeper, name="job-leases", daemon=True).start()
+
+    def stats(self):
+        rows = self._connection().execute("SELECT status, COUNT(*) FROM jobs GROUP BY status").fetchall()
+        counts = {status: 0 for status in JOB_STATUSES}
+        counts.update({status: count for status, count in rows})
+        return {"workers": len(self._threads), **counts}
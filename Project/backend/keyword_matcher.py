@@ -0,0 +1,101 @@
+import re
+
+# Past this length CPython's substring search beats sre's alternation, so
+# literal keywords are checked one by one instead.
+LONG_TEXT = 96
+
+class KeywordMatcher:
+    """
+    Precompiled multi-category matcher: one call over a text returns every
+    category with at least one hit.
+
+    Literal keywords (substring semantics, like `word in text`) are compiled
+    into a single prefix-factored alternation scanned once. Regex patterns
+    (re.search semantics) are compiled into one expression with a lookahead
+    per pattern.
+    """
+    def __init__(self, categories, regex=False):
+        self.regex = regex
+        self.names = list(categories)
+        if regex:
+            self._compile_patterns(categories)
+        else:
+            self._compile_keywords(categories)
+
+    def _compile_keywords(self, categories):
+        keyword_categories = {}
+        for name, keywords in categories.items():
+            for keyword in keywords:
+                keyword_categories.setdefault(keyword, set()).add(name)
+
+        # The trie regex prefers the longest keyword at a position; any shorter
+        # keyword that is a prefix of that hit matches there too, so fold its
+        # categories into the hit.
+        self._hit_categories = {}
+        for keyword in keyword_categories:
+            hit = set()
+            for other in keyword_categories:
+                if keyword.startswith(other):
+                    hit |= keyword_categories[other]
+            self._hit_categories[keyword] = frozenset(hit)
+        self._keywords = [(keyword, frozenset(names)) for keyword, names in keyword_categories.items()]
+
+        self._pattern = re.compile(self._trie_pattern(keyword_categories)) if keyword_categories else None
+
+    @staticmethod
+    def _trie_pattern(keywords):
+        """Alternation factored by common prefixes so each position tries few branches"""
+        trie = {}
+        for keyword in keywords:
+            node = trie
+            for ch in keyword:
+                node = node.setdefault(ch, {})
+            node[""] = True
+
+        def build(node):
+            leaves = [ch for ch in sorted(node) if ch and list(node[ch]) == [""]]
+            branches = [re.escape(ch) + build(node[ch]) for ch in sorted(node) if ch and ch not in leaves]
+            if len(leaves) == 1:
+                branches.append(re.escape(leaves[0]))
+            elif leaves:
+                branches.append("[" + "".join(re.escape(ch) for ch in leaves) + "]")
+            if not branches:
+                return ""
+            body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+            return f"(?:{body})?" if "" in node else body
+
+        return build(trie)
+
+    def _compile_patterns(self, categories):
+        self._groups = {}
+        lookaheads = []
+        for i, (name, patterns) in enumerate(categories.items()):
+            group = f"c{i}"
+            self._groups[group] = name
+            alternation = "|".join(f"(?:{p})" for p in patterns)
+            lookaheads.append(f"(?:(?=[\\s\\S]*?(?P<{group}>{alternation})))?")
+        self._pattern = re.compile("".join(lookaheads))
+
+    def categories(self, text):
+        """Set of category names that hit anywhere in text"""
+        if not text or self._pattern is None:
+            return set()
+        if self.regex:
+            match = self._pattern.match(text)
+            return {self._groups[g] for g, v in match.groupdict().items() if v is not None}
+
+        hits = set()
+        if len(text) > LONG_TEXT:
+            for keyword, names in self._keywords:
+                if not names <= hits and keyword in text:
+                    hits |= names
+            return hits
+
+        search = self._pattern.search
+        match = search(text)
+        while match is not None:
+            hits |= self._hit_categories[match.group()]
+            if len(hits) == len(self.names):
+                break
+            match = search(text, match.start() + 1)
+        return hits
@@ -0,0 +1,220 @@
+import time
+import asyncio
+import threading
+import requests
+from metrics import LLM_BACKEND_REQUESTS
+from circuit_breaker import CircuitBreaker, CircuitOpenError, LatencyWindow
+
+ROUTING_POLICIES = ("least_outstanding", "ewma")
+
+class NoBackendAvailable(CircuitOpenError):
+    """Every backend in the pool is unhealthy or has its circuit open"""
+
+class LLMBackend:
+    """One OpenAI-compatible server: base URL, optional model override and concurrency cap"""
+    def __init__(self, base_url, model=None, max_concurrency=32, breaker=None):
+        self.base_url = base_url.rstrip("/")
+        self.model = model or None
+        self.max_concurrency = max_concurrency
+        self.breaker = breaker or CircuitBreaker(name=self.base_url)
+        self.outstanding = 0
+        self.ewma = None
+        self.healthy = True
+        self.requests = 0
+        self.failures = 0
+        self.last_success = None
+
+    def stats(self):
+        return {
+            "base_url": self.base_url,
+            "model": self.model,
+            "healthy": self.healthy,
+            "outstanding": self.outstanding,
+            "max_concurrency": self.max_concurrency,
+            "ewma_ms": round(self.ewma * 1000, 1) if self.ewma is not None else None,
+            "requests": self.requests,
+            "failures": self.failures,
+            "circuit": self.breaker.stats()
+        }
+
+def parse_backends(spec, default_concurrency=32, breaker_factory=None):
+    """
+    "url[|model[|max_concurrency]],..." -> [LLMBackend]. An empty model
+    keeps the model the caller asked for.
+    """
+    backends = []
+    for entry in spec.split(","):
+        parts = [part.strip() for part in entry.strip().split("|")]
+        if not parts[0]:
+            continue
+        model = parts[1] if len(parts) > 1 else None
+        cap = int(parts[2]) if len(parts) > 2 and parts[2] else default_concurrency
+        breaker = breaker_factory(parts[0]) if breaker_factory else None
+        backends.append(LLMBackend(parts[0], model, cap, breaker))
+    return backends
+
+def _wake(future):
+    if not future.done():
+        future.set_result(None)
+
+class BackendPool:
+    """
+    Routes LLM calls across several backends.
+
+    acquire()/aacquire() pick a healthy backend with a free slot whose
+    circuit lets the call through, waiting (up to a timeout) while every
+    usable backend is at its cap; release() frees the slot and records the
+    outcome. "least_outstanding" picks the fewest in-flight requests,
+    "ewma" the lowest (outstanding + 1) * EWMA latency. With two or more
+    backends, a background thread marks backends unhealthy while
+    GET <base_url>/models fails, unless real calls to one are succeeding
+    with its circuit closed; a lone backend is left to its circuit breaker.
+    """
+    def __init__(self, backends, routing="least_outstanding", health_interval=10, health_timeout=2, ewma_alpha=0.3, api_key=None):
+        if not backends:
+            raise ValueError("BackendPool needs at least one backend")
+        if routing not in ROUTING_POLICIES:
+            raise ValueError(f"Unknown routing policy {routing!r}; expected one of {ROUTING_POLICIES}")
+        self.backends = list(backends)
+        self.routing = routing
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.ewma_alpha = ewma_alpha
+        self.api_key = api_key
+        self.latency = LatencyWindow()
+        self._turn = 0
+        self._cond = threading.Condition()
+        self._async_waiters = []
+        self._health_thread = None
+
+    def _score(self, backend):
+        if self.routing == "ewma":
+            return (backend.outstanding + 1) * (backend.ewma or 0.0), backend.outstanding
+        return backend.outstanding, backend.ewma or 0.0
+
+    def _pick(self, exclude):
+        """Best backend with a free slot, None if all usable ones are full; caller holds _cond"""
+        n = len(self.backends)
+        self._turn = (self._turn + 1) % n
+        # Rotating the tie-break spreads an idle pool's traffic instead of always using backend 0
+        candidates = sorted(
+            (b for b in self.backends if b.healthy and b not in exclude),
+            key=lambda b: (self._score(b), (self.backends.index(b) - self._turn) % n)
+        )
+        usable = False
+        for backend in candidates:
+            if backend.breaker.state == "closed":
+                usable = True
+            if backend.outstanding >= backend.max_concurrency:
+                continue
+            if backend.breaker.allow():
+                backend.outstanding += 1
+                backend.requests += 1
+                return backend
+        if not usable:
+            raise NoBackendAvailable(", ".join(b.base_url for b in self.backends))
+        return None
+
+    def acquire(self, timeout, exclude=()):
+        """Reserve a slot on the best backend, blocking while all are busy"""
+        self._ensure_health_checks()
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                backend = self._pick(exclude)
+                if backend is not None:
+                    return backend
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError("no LLM backend slot freed up in time")
+                self._cond.wait(remaining)
+
+    async def aacquire(self, timeout, exclude=()):
+        """acquire() for coroutines; waits on a future instead of blocking the loop"""
+        self._ensure_health_checks()
+        loop = asyncio.get_running_loop()
+        deadline = time.monotonic() + timeout
+        while True:
+            with self._cond:
+                backend = self._pick(exclude)
+                if backend is not None:
+                    return backend
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                raise TimeoutError("no LLM backend slot freed up in time")
+            try:
+                await asyncio.wait_for(waiter, remaining)
+            except asyncio.TimeoutError:
+                pass
+
+    def release(self, backend, outcome, seconds=None):
+        """Free backend's slot; outcome is "success", "failure" or "abandon" (cancelled)"""
+        if outcome == "success":
+            backend.breaker.success()
+        elif outcome == "failure":
+            backend.breaker.failure()
+        else:
+            backend.breaker.abandon()
+        with self._cond:
+            backend.outstanding -= 1
+            if outcome == "failure":
+                backend.failures += 1
+            if outcome == "success":
+                backend.last_success = time.monotonic()
+            if outcome == "success" and seconds is not None:
+                backend.ewma = seconds if backend.ewma is None else (
+                    self.ewma_alpha * seconds + (1 - self.ewma_alpha) * backend.ewma
+                )
+            self._notify()
+        if outcome == "success" and seconds is not None:
+            self.latency.observe(seconds)
+        LLM_BACKEND_REQUESTS.inc(backend=backend.base_url, outcome=outcome)
+
+    def _notify(self):
+        """Wake sync and async waiters to re-run _pick; caller holds _cond"""
+        self._cond.notify_all()
+        waiters, self._async_waiters = self._async_waiters, []
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(_wake, waiter)
+
+    def _ensure_health_checks(self):
+        if self.health_interval <= 0 or len(self.backends) < 2 or self._health_thread is not None:
+            return
+        with self._cond:
+            if self._health_thread is None:
+                self._health_thread = threading.Thread(target=self._health_loop, name="llm-health", daemon=True)
+                self._health_thread.start()
+
+    def check_health(self):
+        """Probe every backend once; returns {base_url: healthy}"""
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        for backend in self.backends:
+            try:
+                healthy = requests.get(f"{backend.base_url}/models", headers=headers, timeout=self.health_timeout).ok
+            except requests.RequestException:
+                healthy = False
+            if not healthy and self._serving(backend):
+                healthy = True
+            if healthy != backend.healthy:
+                print(f"LLM backend {backend.base_url} is {'healthy' if healthy else 'unhealthy'}")
+            with self._cond:
+                backend.healthy = healthy
+                self._notify()
+        return {backend.base_url: backend.healthy for backend in self.backends}
+
+    def _serving(self, backend):
+        """Closed circuit and a successful call since the previous probe: real traffic outranks the probe"""
+        last_success = backend.last_success
+        return (backend.breaker.state == "closed" and last_success is not None and
+                time.monotonic() - last_success <= max(self.health_interval, self.health_timeout) * 2)
+
+    def _health_loop(self):
+        while True:
+            time.sleep(self.health_interval)
+            self.check_health()
+
+    def stats(self):
+        with self._cond:
+            return {"routing": self.routing, "backends": [backend.stats() for backend in self.backends]}
@@ -0,0 +1,102 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from sqlalchemy import insert, update, bindparam
+
+class MessageWriter:
+    """
+    Background writer that batches message inserts into group commits.
+
+    Callers submit rows (plus an optional conversation_state update) and get
+    a Future resolving to the inserted message ids. A batch is committed when
+    it reaches max_batch rows or max_delay_ms after its first write arrived,
+    so one fsync covers many requests.
+    """
+    def __init__(self, engine, messages_table, sessions_table, max_batch=256, max_delay_ms=5):
+        self.engine = engine
+        self.messages = messages_table
+        self.sessions = sessions_table
+        self.max_batch = max_batch
+        self.max_delay = max_delay_ms / 1000
+        self.batches = 0
+        self.rows_written = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+        self._thread.start()
+
+    def submit(self, rows, session_id=None, conversation_state=None):
+        """Queue message rows (dicts of messages columns); returns a Future of their ids"""
+        future = Future()
+        self._queue.put((list(rows), session_id, conversation_state, future))
+        return future
+
+    def write(self, rows, session_id=None, conversation_state=None, timeout=30):
+        return self.submit(rows, session_id, conversation_state).result(timeout=timeout)
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            row_count = len(batch[0][0])
+            deadline = time.monotonic() + self.max_delay
+            while row_count < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(item)
+                row_count += len(item[0])
+            self._flush(batch)
+
+    def _flush(self, batch):
+        try:
+            ids = self._commit(batch)
+        except Exception as e:
+            if len(batch) == 1:
+                batch[0][3].set_exception(e)
+                return
+            # Isolate the failing write so it doesn't take the rest of the batch down
+            for item in batch:
+                self._flush([item])
+            return
+
+        offset = 0
+        for rows, _, _, future in batch:
+            future.set_result(ids[offset:offset + len(rows)])
+            offset += len(rows)
+
+    def _commit(self, batch):
+        all_rows = [row for rows, _, _, _ in batch for row in rows]
+        states = [
+            {"b_id": session_id, "b_state": state}
+            for _, session_id, state, _ in batch if session_id is not None and state is not None
+        ]
+        with self.engine.begin() as conn:
+            ids = []
+            if all_rows:
+                result = conn.execute(
+                    insert(self.messages).returning(self.messages.c.id, sort_by_parameter_order=True),
+                    all_rows
+                )
+                ids = list(result.scalars())
+            if states:
+                conn.execute(
+                    update(self.sessions)
+                    .where(self.sessions.c.id == bindparam("b_id"))
+                    .values(conversation_state=bindparam("b_state")),
+                    states
+                )
+        self.batches += 1
+        self.rows_written += len(all_rows)
+        return ids
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "rows_written": self.rows_written,
+            "avg_batch_rows": round(self.rows_written / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize()
+        }
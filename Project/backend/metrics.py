@@ -0,0 +1,170 @@
+import time
+import threading
+from bisect import bisect_left
+
+# Seconds; spans cache hits through slow LLM calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _number(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+class Counter:
+    """Monotonic counter with labels, rendered in Prometheus text format"""
+    kind = "counter"
+
+    def __init__(self, name, documentation, labelnames=(), registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        key = tuple(labels.get(name, "") for name in self.labelnames)
+        with self._lock:
+            return self._values.get(key, 0)
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        return [f"{self.name}{_labels(self.labelnames, key)} {_number(value)}" for key, value in values]
+
+class _Timer:
+    __slots__ = ("histogram", "key", "started")
+
+    def __init__(self, histogram, key):
+        self.histogram = histogram
+        self.key = key
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.histogram._observe(self.key, time.perf_counter() - self.started)
+        return False
+
+class Histogram:
+    """
+    Latency histogram with labels, rendered in Prometheus text format.
+
+    Observations only bump one bucket slot under a lock; the cumulative
+    bucket counts Prometheus expects are built at render time.
+    """
+    kind = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS, registry=None):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series = {}
+        self._lock = threading.Lock()
+        (registry or REGISTRY).register(self)
+
+    def _observe(self, key, value):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def observe(self, value, **labels):
+        self._observe(tuple(labels.get(name, "") for name in self.labelnames), value)
+
+    def time(self, **labels):
+        """Context manager observing the wall time of its block"""
+        return _Timer(self, tuple(labels.get(name, "") for name in self.labelnames))
+
+    def samples(self):
+        with self._lock:
+            series = sorted((key, (list(counts), total, count)) for key, (counts, total, count) in self._series.items())
+        out = []
+        for key, (counts, total, count) in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {cumulative}")
+            le = 'le="+Inf"'
+            out.append(f"{self.name}_bucket{_labels(self.labelnames, key, le)} {count}")
+            out.append(f"{self.name}_sum{_labels(self.labelnames, key)} {total}")
+            out.append(f"{self.name}_count{_labels(self.labelnames, key)} {count}")
+        return out
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics.append(metric)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format (0.0.4)"""
+        with self._lock:
+            metrics = list(self._metrics)
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "Flask request latency by route",
+    ["route", "method", "status"]
+)
+STAGE_SECONDS = Histogram(
+    "chat_stage_duration_seconds", "Time spent in each stage of a chat turn",
+    ["stage"]
+)
+LLM_TIMEOUTS = Counter(
+    "llm_timeouts_total", "LLM calls that hit a timeout or the latency budget",
+    ["client"]
+)
+LLM_FALLBACKS = Counter(
+    "llm_fallbacks_total", "Turns answered with the deterministic question instead of model output",
+    ["reason"]
+)
+LLM_CACHE_REQUESTS = Counter(
+    "llm_cache_requests_total", "LLM response cache lookups",
+    ["result"]
+)
+LLM_HEDGES = Counter(
+    "llm_hedged_requests_total", "Hedged LLM requests sent to the secondary endpoint, how many it won, and hedges skipped by the budget",
+    ["outcome"]
+)
+LLM_BACKEND_REQUESTS = Counter(
+    "llm_backend_requests_total", "Completed LLM calls per pooled backend",
+    ["backend", "outcome"]
+)
+CHAT_TURNS_COALESCED = Counter(
+    "chat_turns_coalesced_total", "Duplicate chat turns answered with an identical in-flight or just-finished turn's result"
+)
+JOBS = Counter(
+    "jobs_total", "Background job state transitions",
+    ["kind", "outcome"]
+)
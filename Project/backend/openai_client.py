@@ -3,14 +3,109 @@ import os
 import requests
 import json
 import re
+import asyncio
+import atexit
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import aiohttp
+from requests.adapters import HTTPAdapter
+from metrics import LLM_TIMEOUTS, LLM_FALLBACKS, LLM_CACHE_REQUESTS, LLM_HEDGES
+from circuit_breaker import CircuitBreaker, CircuitOpenError, HedgeBudget
+from llm_pool import BackendPool, LLMBackend, parse_backends
 
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "ollama")
 OPENAI_API_BASE = os.getenv("OPENAI_API_BASE", "http://localhost:11434/v1")
 DEFAULT_MODEL = os.getenv("DEFAULT_MODEL", "qwen:1.8b")
+LLM_TIMEOUT = float(os.getenv("LLM_TIMEOUT", "10"))
+LLM_POOL_SIZE = int(os.getenv("LLM_POOL_SIZE", "64"))
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "32"))
+LLM_KEEPALIVE = float(os.getenv("LLM_KEEPALIVE", "60"))
+LLM_CACHE_SIZE = int(os.getenv("LLM_CACHE_SIZE", "2048"))
+LLM_CACHE_TTL = float(os.getenv("LLM_CACHE_TTL", "600"))
+LLM_BREAKER_FAILURES = int(os.getenv("LLM_BREAKER_FAILURES", "5"))
+LLM_BREAKER_RESET_S = float(os.getenv("LLM_BREAKER_RESET_S", "30"))
+LLM_HEDGE_API_BASE = os.getenv("LLM_HEDGE_API_BASE", "")
+LLM_HEDGE_MODEL = os.getenv("LLM_HEDGE_MODEL", "")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_DELAY_MS = float(os.getenv("LLM_HEDGE_DELAY_MS", "1000"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MAX_RATIO = float(os.getenv("LLM_HEDGE_MAX_RATIO", "0.05"))
+LLM_HEDGE_BURST = int(os.getenv("LLM_HEDGE_BURST", "5"))
+# "url[|model[|max_concurrency]],..."; defaults to OPENAI_API_BASE alone
+LLM_BACKENDS = os.getenv("LLM_BACKENDS", "")
+LLM_ROUTING = os.getenv("LLM_ROUTING", "least_outstanding")
+LLM_HEALTH_INTERVAL_S = float(os.getenv("LLM_HEALTH_INTERVAL_S", "10"))
 
 openai.api_key = OPENAI_API_KEY
 openai.api_base = OPENAI_API_BASE
 
+_requests_session = requests.Session()
+_requests_session.mount("http://", HTTPAdapter(pool_connections=4, pool_maxsize=LLM_POOL_SIZE))
+_requests_session.mount("https://", HTTPAdapter(pool_connections=4, pool_maxsize=LLM_POOL_SIZE))
+openai.requestssession = _requests_session
+
+class ResponseCache:
+    """Size-bounded TTL cache of validated model responses"""
+    def __init__(self, max_size=2048, ttl=600):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(model, messages, temperature, max_tokens, top_p):
+        """(model, normalized system prompt, trailing messages, sampling params)"""
+        system_prompt = " ".join(_system_prompt(messages).split())
+        trailing = tuple((m["role"], m["content"].strip()) for m in messages if m["role"] != "system")
+        return (model, system_prompt, trailing, temperature, max_tokens, top_p)
+
+    def get(self, key):
+        if self.max_size <= 0:
+            return None
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and time.monotonic() - entry[1] <= self.ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                LLM_CACHE_REQUESTS.inc(result="hit")
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            self.misses += 1
+            LLM_CACHE_REQUESTS.inc(result="miss")
+            return None
+
+    def put(self, key, response):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (response, time.monotonic())
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_size": self.max_size,
+                "ttl_seconds": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 4) if total else 0.0
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+response_cache = ResponseCache(LLM_CACHE_SIZE, LLM_CACHE_TTL)
+
 def clean_ascii(text):
     if text is None:
         return ""
@@ -33,7 +128,148 @@ def validate_question(response, system_prompt):
     
     return response
 
-def chat_with_gpt(messages, model=None, temperature=0.1, max_tokens=80):
+def is_timeout(error):
+    """True for the timeout errors raised by openai/requests (sync) and aiohttp/asyncio (async)"""
+    return isinstance(error, (
+        TimeoutError, asyncio.TimeoutError, requests.exceptions.Timeout, openai.error.Timeout
+    ))
+
+def record_llm_error(error, client):
+    if isinstance(error, CircuitOpenError):
+        LLM_FALLBACKS.inc(reason="circuit_open")
+        return
+    if is_timeout(error):
+        LLM_TIMEOUTS.inc(client=client)
+    LLM_FALLBACKS.inc(reason="error")
+
+def fallback_question(messages):
+    """Deterministic question embedded in the system prompt, used when the model is unavailable"""
+    for msg in messages:
+        if msg["role"] == "system":
+            match = (re.search(r'QUESTION TO ASK: "(.+?)"', msg["content"]) or
+                     re.search(r'Ask ONLY this specific question: "(.+?)"', msg["content"]))
+            if match:
+                return match.group(1)
+    return "Can you provide more details about this?"
+
+def _system_prompt(messages):
+    for msg in messages:
+        if msg["role"] == "system":
+            return msg["content"]
+    return ""
+
+def _breaker(api_base):
+    return CircuitBreaker(LLM_BREAKER_FAILURES, LLM_BREAKER_RESET_S, name=api_base)
+
+llm_pool = BackendPool(
+    parse_backends(LLM_BACKENDS, LLM_MAX_CONCURRENCY, _breaker) or
+    [LLMBackend(OPENAI_API_BASE, None, LLM_MAX_CONCURRENCY, _breaker(OPENAI_API_BASE))],
+    routing=LLM_ROUTING,
+    health_interval=LLM_HEALTH_INTERVAL_S,
+    api_key=OPENAI_API_KEY
+)
+hedge_pool = BackendPool(
+    [LLMBackend(LLM_HEDGE_API_BASE, LLM_HEDGE_MODEL, LLM_MAX_CONCURRENCY, _breaker(LLM_HEDGE_API_BASE))],
+    health_interval=LLM_HEALTH_INTERVAL_S,
+    api_key=OPENAI_API_KEY
+) if LLM_HEDGE_API_BASE else None
+hedge_budget = HedgeBudget(LLM_HEDGE_MAX_RATIO, LLM_HEDGE_BURST)
+_hedge_executor = None
+_hedge_executor_lock = threading.Lock()
+_hedge_slots = threading.BoundedSemaphore(LLM_POOL_SIZE)
+
+def llm_backend_stats():
+    return {
+        "pool": llm_pool.stats(),
+        "hedge": hedge_pool.stats() if hedge_pool else None
+    }
+
+def hedge_delay():
+    """Seconds to wait on the pool before hedging: its recent p95, or LLM_HEDGE_DELAY_MS until there's enough data"""
+    p95 = llm_pool.latency.percentile(LLM_HEDGE_PERCENTILE, LLM_HEDGE_MIN_SAMPLES)
+    return p95 if p95 is not None else LLM_HEDGE_DELAY_MS / 1000
+
+def _create_completion(pool, model, messages, temperature, max_tokens, params):
+    """One completion on the pool's best backend, holding one of its slots"""
+    backend = pool.acquire(LLM_TIMEOUT)
+    started = time.perf_counter()
+    try:
+        resp = openai.ChatCompletion.create(
+            model=backend.model or model,
+            messages=messages,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            api_base=backend.base_url,
+            timeout=LLM_TIMEOUT,
+            request_timeout=LLM_TIMEOUT,
+            **params
+        )
+        response = resp.choices[0].message["content"].strip()
+    except Exception:
+        pool.release(backend, "failure")
+        raise
+    pool.release(backend, "success", time.perf_counter() - started)
+    return response
+
+def _submit_completion(pool, *args):
+    """
+    _create_completion on the hedge executor, or None when all of its threads
+    are busy: a task queued behind them would only look slow and be hedged.
+    """
+    global _hedge_executor
+    if not _hedge_slots.acquire(blocking=False):
+        return None
+    if _hedge_executor is None:
+        with _hedge_executor_lock:
+            if _hedge_executor is None:
+                _hedge_executor = ThreadPoolExecutor(max_workers=LLM_POOL_SIZE, thread_name_prefix="llm-hedge")
+    future = _hedge_executor.submit(_create_completion, pool, *args)
+    future.add_done_callback(lambda _: _hedge_slots.release())
+    return future
+
+def _hedged_completion(model, messages, temperature, max_tokens, params):
+    """
+    Completion from llm_pool, hedged to LLM_HEDGE_API_BASE when set.
+
+    If the primary hasn't answered within hedge_delay() (or fails/is open
+    first), the same request goes to the hedge endpoint and the first
+    successful answer wins. The loser is left to finish in the background,
+    holding an executor thread, so hedges are limited to hedge_budget's
+    share of requests and to times when the executor has an idle thread.
+    """
+    if hedge_pool is None:
+        return _create_completion(llm_pool, model, messages, temperature, max_tokens, params)
+
+    hedge_budget.deposit()
+    deadline = time.monotonic() + LLM_TIMEOUT
+    args = (model, messages, temperature, max_tokens, params)
+    primary = _submit_completion(llm_pool, *args)
+    if primary is None:
+        return _create_completion(llm_pool, *args)
+    wait([primary], timeout=hedge_delay())
+    if primary.done() and primary.exception() is None:
+        return primary.result()
+
+    hedge = _submit_completion(hedge_pool, *args) if hedge_budget.try_spend() else None
+    if hedge is None:
+        LLM_HEDGES.inc(outcome="skipped")
+        return primary.result(timeout=max(0.0, deadline - time.monotonic()))
+    LLM_HEDGES.inc(outcome="sent")
+    last_error = primary.exception() if primary.done() else None
+    pending = {hedge} if primary.done() else {primary, hedge}
+    while pending:
+        done, pending = wait(pending, timeout=max(0.0, deadline - time.monotonic()), return_when=FIRST_COMPLETED)
+        if not done:
+            break
+        for future in done:
+            if future.exception() is None:
+                if future is hedge:
+                    LLM_HEDGES.inc(outcome="won")
+                return future.result()
+            last_error = future.exception()
+    raise last_error or TimeoutError("hedged LLM request timed out")
+
+def chat_with_gpt(messages, model=None, temperature=0.1, max_tokens=80, top_p=None, use_cache=True):
     """
     Professional AI that follows strict conversation rules
     """
@@ -42,31 +278,233 @@ def chat_with_gpt(messages, model=None, temperature=0.1, max_tokens=80):
         
     cleaned = [{"role": m["role"], "content": clean_ascii(m["content"])} for m in messages]
 
+    cache_key = ResponseCache.make_key(model, cleaned, temperature, max_tokens, top_p) if use_cache else None
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
     try:
-        system_prompt = ""
-        for msg in cleaned:
-            if msg["role"] == "system":
-                system_prompt = msg["content"]
-                break
+        system_prompt = _system_prompt(cleaned)
         
-        resp = openai.ChatCompletion.create(
-            model=model, 
-            messages=cleaned, 
-            temperature=temperature,
-            max_tokens=max_tokens,
-            timeout=10
-        )
-        response = resp.choices[0].message["content"].strip()
+        params = {}
+        if top_p is not None:
+            params["top_p"] = top_p
+
+        response = _hedged_completion(model, cleaned, temperature, max_tokens, params)
         
         validated_response = validate_question(response, system_prompt)
+        if cache_key is not None:
+            response_cache.put(cache_key, validated_response)
         
         return validated_response
         
     except Exception as e:
-        print(f"AI service error: {e}")
-        for msg in messages:
-            if msg["role"] == "system":
-                match = re.search(r'QUESTION TO ASK: "(.+?)"', msg["content"])
-                if match:
-                    return match.group(1)
-        return "Can you provide more details about this?"
\ No newline at end of file
+        if not isinstance(e, CircuitOpenError):
+            print(f"AI service error: {e}")
+        record_llm_error(e, "sync")
+        return fallback_question(messages)
+
+def complete_text(messages, model=None, temperature=0.2, max_tokens=200):
+    """
+    Free-form completion through the backend pool, without question
+    validation or fallback: errors are raised so callers can retry.
+    """
+    if model is None:
+        model = DEFAULT_MODEL
+    cleaned = [{"role": m["role"], "content": clean_ascii(m["content"])} for m in messages]
+    return _hedged_completion(model, cleaned, temperature, max_tokens, {})
+
+def stream_chat_with_gpt(messages, model=None, temperature=0.1, max_tokens=80, top_p=None, use_cache=True):
+    """
+    Yield response text chunks as the model produces them (stream=True).
+    Transport errors are raised so the caller can fall back.
+    """
+    if model is None:
+        model = DEFAULT_MODEL
+
+    cleaned = [{"role": m["role"], "content": clean_ascii(m["content"])} for m in messages]
+
+    cache_key = ResponseCache.make_key(model, cleaned, temperature, max_tokens, top_p) if use_cache else None
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            yield cached
+            return
+
+    params = {}
+    if top_p is not None:
+        params["top_p"] = top_p
+
+    backend = llm_pool.acquire(LLM_TIMEOUT)
+    started = time.perf_counter()
+    parts = []
+    try:
+        resp = openai.ChatCompletion.create(
+            model=backend.model or model,
+            messages=cleaned,
+            temperature=temperature,
+            max_tokens=max_tokens,
+            stream=True,
+            api_base=backend.base_url,
+            request_timeout=LLM_TIMEOUT,
+            **params
+        )
+        for chunk in resp:
+            delta = chunk["choices"][0].get("delta", {}).get("content")
+            if delta:
+                parts.append(delta)
+                yield delta
+    except GeneratorExit:
+        llm_pool.release(backend, "abandon")
+        raise
+    except Exception:
+        llm_pool.release(backend, "failure")
+        raise
+    llm_pool.release(backend, "success", time.perf_counter() - started)
+
+    if cache_key is not None:
+        response_cache.put(cache_key, validate_question("".join(parts), _system_prompt(cleaned)))
+
+_loop = None
+_loop_lock = threading.Lock()
+_pools = {}
+
+def _http_session():
+    """Keep-alive HTTP session for the running event loop (concurrency is capped per backend by the pool)"""
+    loop = asyncio.get_running_loop()
+    session = _pools.get(loop)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(limit=LLM_POOL_SIZE, keepalive_timeout=LLM_KEEPALIVE)
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=LLM_TIMEOUT),
+            headers={"Authorization": f"Bearer {OPENAI_API_KEY}"}
+        )
+        _pools[loop] = session
+    return session
+
+async def _apost_completion(pool, payload):
+    """One completion on the pool's best backend, holding one of its slots (async)"""
+    backend = await pool.aacquire(LLM_TIMEOUT)
+    if backend.model:
+        payload = dict(payload, model=backend.model)
+    started = time.perf_counter()
+    try:
+        async with _http_session().post(f"{backend.base_url}/chat/completions", json=payload) as resp:
+            resp.raise_for_status()
+            data = await resp.json()
+        response = (data["choices"][0]["message"]["content"] or "").strip()
+    except asyncio.CancelledError:
+        pool.release(backend, "abandon")
+        raise
+    except Exception:
+        pool.release(backend, "failure")
+        raise
+    pool.release(backend, "success", time.perf_counter() - started)
+    return response
+
+async def _ahedged_completion(payload):
+    """Async counterpart of _hedged_completion; the losing request is cancelled"""
+    if hedge_pool is None:
+        return await _apost_completion(llm_pool, payload)
+
+    hedge_budget.deposit()
+    primary = asyncio.ensure_future(_apost_completion(llm_pool, payload))
+    hedge = None
+    try:
+        await asyncio.wait({primary}, timeout=hedge_delay())
+        if primary.done() and primary.exception() is None:
+            return primary.result()
+
+        if not hedge_budget.try_spend():
+            LLM_HEDGES.inc(outcome="skipped")
+            return await primary
+        LLM_HEDGES.inc(outcome="sent")
+        hedge = asyncio.ensure_future(_apost_completion(hedge_pool, payload))
+        last_error = primary.exception() if primary.done() else None
+        pending = {hedge} if primary.done() else {primary, hedge}
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    if task is hedge:
+                        LLM_HEDGES.inc(outcome="won")
+                    return task.result()
+                last_error = task.exception()
+        raise last_error
+    finally:
+        for task in (primary, hedge):
+            if task is not None and not task.done():
+                task.cancel()
+
+async def achat_with_gpt(messages, model=None, temperature=0.1, max_tokens=80, top_p=None, use_cache=True, fallback=True):
+    """
+    Non-blocking chat_with_gpt over pooled keep-alive connections to the llm_pool backends.
+    With fallback=False errors are raised instead of answered with (and
+    counted as) the fallback question, for callers that don't serve the result.
+    """
+    if model is None:
+        model = DEFAULT_MODEL
+
+    cleaned = [{"role": m["role"], "content": clean_ascii(m["content"])} for m in messages]
+    payload = {
+        "model": model,
+        "messages": cleaned,
+        "temperature": temperature,
+        "max_tokens": max_tokens
+    }
+    if top_p is not None:
+        payload["top_p"] = top_p
+
+    cache_key = ResponseCache.make_key(model, cleaned, temperature, max_tokens, top_p) if use_cache else None
+    if cache_key is not None:
+        cached = response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+
+    try:
+        response = await _ahedged_completion(payload)
+
+        validated_response = validate_question(response, _system_prompt(cleaned))
+        if cache_key is not None:
+            response_cache.put(cache_key, validated_response)
+
+        return validated_response
+
+    except Exception as e:
+        if not fallback:
+            raise
+        if not isinstance(e, CircuitOpenError):
+            print(f"AI service error: {e!r}")
+        record_llm_error(e, "async")
+        return fallback_question(messages)
+
+def _client_loop():
+    """Background event loop that owns the async pool for synchronous callers"""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever, name="llm-client", daemon=True).start()
+    return _loop
+
+def _shutdown_client_loop():
+    if _loop is not None and _loop.is_running():
+        try:
+            asyncio.run_coroutine_threadsafe(close_async_client(), _loop).result(timeout=2)
+        except Exception:
+            pass
+        _loop.call_soon_threadsafe(_loop.stop)
+
+atexit.register(_shutdown_client_loop)
+
+def submit_chat_with_gpt(messages, **kwargs):
+    """Schedule achat_with_gpt from a worker thread; returns a concurrent.futures.Future"""
+    return asyncio.run_coroutine_threadsafe(achat_with_gpt(messages, **kwargs), _client_loop())
+
+async def close_async_client():
+    """Close the pooled connections owned by the running event loop"""
+    session = _pools.pop(asyncio.get_running_loop(), None)
+    if session is not None:
+        await session.close()
\ No newline at end of file
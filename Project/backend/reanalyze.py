@@ -0,0 +1,193 @@
+"""Re-run conversation analysis and summaries over every stored session.
+
+Sessions are streamed from sessions.db in id order, analyzed in a process
+pool with the current ConversationManager rules, and written back in one
+executemany per chunk. The recomputed state (plus a "summary" key) replaces
+sessions.conversation_state; asked_questions are carried over. Sessions
+with no stored user turns (legacy clients that post the whole `messages`
+array) have nothing to replay and keep their state; they are counted as
+skipped.
+
+Progress is checkpointed in the reanalysis_runs table in the same
+transaction as each chunk's writes, so an interrupted run picks up after
+the last written chunk when started again with the same --run-id.
+
+    python reanalyze.py [--run-id default] [--workers N] [--chunk 200] [--restart]
+
+Running backend processes keep their in-memory trackers, so restart them
+afterwards unless STATE_BACKEND is a shared store (which is updated too).
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from sqlalchemy import text, select, update, bindparam, func
+
+import app
+from app import (
+    engine, ChatSession, ChatMessage, ConversationManager, SessionTracker,
+    reanalyze_session, tracker_from_state, tracker_to_state
+)
+
+CHECKPOINT_TABLE = """
+CREATE TABLE IF NOT EXISTS reanalysis_runs (
+    run_id TEXT PRIMARY KEY,
+    last_session_id INTEGER NOT NULL,
+    processed INTEGER NOT NULL,
+    started_at DATETIME NOT NULL,
+    updated_at DATETIME NOT NULL,
+    finished_at DATETIME
+)
+"""
+
+_manager = None
+
+def _init_worker():
+    global _manager
+    _manager = ConversationManager(SessionTracker())
+
+def reanalyze_chunk(sessions):
+    """[(session_id, agent, stored_state, messages)] -> [(session_id, state_json, or None if skipped)]"""
+    if _manager is None:
+        _init_worker()
+    results = []
+    for session_id, agent, stored_state, messages in sessions:
+        state = reanalyze_session(_manager, session_id, agent, stored_state, messages)
+        results.append((session_id, json.dumps(state) if state is not None else None))
+    return results
+
+def iter_session_chunks(after_id, chunk_size):
+    """Chunks of (session_id, agent, stored_state, messages) in id order, after_id exclusive"""
+    while True:
+        with engine.connect() as conn:
+            sessions = conn.execute(
+                select(ChatSession.id, ChatSession.agent, ChatSession.conversation_state)
+                .where(ChatSession.id > after_id)
+                .order_by(ChatSession.id)
+                .limit(chunk_size)
+            ).all()
+            if not sessions:
+                return
+            messages = {row.id: [] for row in sessions}
+            rows = conn.execute(
+                select(ChatMessage.session_id, ChatMessage.role, ChatMessage.content)
+                .where(ChatMessage.session_id.in_(list(messages)))
+                .order_by(ChatMessage.session_id, ChatMessage.id)
+            )
+            for row in rows:
+                messages[row.session_id].append({"role": row.role, "content": row.content})
+
+        chunk = []
+        for row in sessions:
+            try:
+                stored_state = json.loads(row.conversation_state or "{}")
+            except ValueError:
+                stored_state = {}
+            chunk.append((row.id, row.agent, stored_state, messages[row.id]))
+        yield chunk
+        after_id = sessions[-1].id
+
+def load_checkpoint(run_id, restart):
+    with engine.begin() as conn:
+        conn.execute(text(CHECKPOINT_TABLE))
+        if restart:
+            conn.execute(text("DELETE FROM reanalysis_runs WHERE run_id = :run_id"), {"run_id": run_id})
+        row = conn.execute(
+            text("SELECT last_session_id, processed, finished_at FROM reanalysis_runs WHERE run_id = :run_id"),
+            {"run_id": run_id}
+        ).first()
+        if row is None:
+            now = datetime.utcnow()
+            conn.execute(text("""
+                INSERT INTO reanalysis_runs (run_id, last_session_id, processed, started_at, updated_at)
+                VALUES (:run_id, 0, 0, :now, :now)
+            """), {"run_id": run_id, "now": now})
+            return 0, 0, None
+        return row.last_session_id, row.processed, row.finished_at
+
+def write_chunk(run_id, results, processed):
+    """Write one chunk's states and advance the checkpoint atomically"""
+    written = [(session_id, state) for session_id, state in results if state is not None]
+    with engine.begin() as conn:
+        if written:
+            conn.execute(
+                update(ChatSession.__table__)
+                .where(ChatSession.__table__.c.id == bindparam("b_id"))
+                .values(conversation_state=bindparam("b_state")),
+                [{"b_id": session_id, "b_state": state} for session_id, state in written]
+            )
+        conn.execute(text("""
+            UPDATE reanalysis_runs SET last_session_id = :last_id, processed = :processed, updated_at = :now
+            WHERE run_id = :run_id
+        """), {"last_id": results[-1][0], "processed": processed, "now": datetime.utcnow(), "run_id": run_id})
+
+    store = app.conv_manager.asked_questions_tracker.store
+    if store is not None:
+        for session_id, state in written:
+            try:
+                store.save(session_id, tracker_to_state(tracker_from_state(json.loads(state))))
+            except Exception as e:
+                print(f"State store save error: {e}", file=sys.stderr)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--run-id", default="default", help="checkpoint name; reuse it to resume")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--chunk", type=int, default=200, help="sessions per chunk")
+    parser.add_argument("--restart", action="store_true", help="discard the checkpoint and start from the first session")
+    args = parser.parse_args()
+
+    last_id, processed, finished_at = load_checkpoint(args.run_id, args.restart)
+    if finished_at is not None:
+        print(f"Run '{args.run_id}' already finished at {finished_at}; use --restart to run it again")
+        return
+    with engine.connect() as conn:
+        remaining = conn.execute(select(func.count()).select_from(ChatSession.__table__).where(ChatSession.id > last_id)).scalar()
+    total = processed + remaining
+    if last_id:
+        print(f"Resuming run '{args.run_id}' after session {last_id} ({processed} already done)")
+
+    started = time.perf_counter()
+    done_this_run = 0
+    skipped = 0
+    pending = deque()
+
+    def write_oldest():
+        # Results are written strictly in submission order so the checkpoint
+        # is always a contiguous prefix of session ids.
+        nonlocal processed, done_this_run, skipped
+        results = pending.popleft().result()
+        processed += len(results)
+        done_this_run += len(results)
+        skipped += sum(1 for _, state in results if state is None)
+        write_chunk(args.run_id, results, processed)
+        report_progress(processed, total, done_this_run, started)
+
+    with ProcessPoolExecutor(max_workers=args.workers, initializer=_init_worker) as pool:
+        for chunk in iter_session_chunks(last_id, args.chunk):
+            pending.append(pool.submit(reanalyze_chunk, chunk))
+            if len(pending) >= args.workers * 2:
+                write_oldest()
+        while pending:
+            write_oldest()
+
+    with engine.begin() as conn:
+        conn.execute(text("UPDATE reanalysis_runs SET finished_at = :now WHERE run_id = :run_id"),
+                     {"now": datetime.utcnow(), "run_id": args.run_id})
+    elapsed = time.perf_counter() - started
+    print(f"\nDone: {done_this_run - skipped} sessions re-analyzed, {skipped} skipped (no stored user turns) "
+          f"in {elapsed:.1f}s ({processed}/{total} total)")
+
+def report_progress(processed, total, done_this_run, started):
+    elapsed = time.perf_counter() - started
+    rate = done_this_run / elapsed if elapsed else 0.0
+    eta = (total - processed) / rate if rate else 0.0
+    print(f"\r{processed}/{total} sessions ({rate:.0f}/s, ETA {eta:.0f}s)", end="", file=sys.stderr, flush=True)
+
+if __name__ == "__main__":
+    main()
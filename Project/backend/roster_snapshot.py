@@ -0,0 +1,170 @@
+import os
+import sys
+import json
+import sqlite3
+import itertools
+import threading
+from collections import OrderedDict
+
+SNAPSHOT_CACHE_SIZE = int(os.getenv("ROSTER_SNAPSHOT_CACHE_SIZE", "4096"))
+
+# Each thread keeps one read-only connection per snapshot path, tagged with
+# the generation of the SnapshotRoster that opened it
+_thread_conns = threading.local()
+_generations = itertools.count(1)
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE agents (
+    pos INTEGER PRIMARY KEY,
+    name TEXT,
+    name_lower TEXT,
+    agent_id TEXT,
+    record TEXT NOT NULL
+);
+CREATE INDEX ix_agents_name_lower ON agents (name_lower, pos);
+CREATE INDEX ix_agents_agent_id ON agents (agent_id, pos);
+"""
+
+def build_snapshot(json_path, snapshot_path):
+    """Compile data.json into a SQLite snapshot; returns the number of agents written.
+
+    The snapshot records the source file's mtime so a stale one is ignored.
+    It is written to a temp file and renamed into place, so readers never
+    see a half-built snapshot.
+    """
+    source_mtime = os.stat(json_path).st_mtime_ns
+    with open(json_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    agents = data.get("agents", [])
+    rest = {key: value for key, value in data.items() if key != "agents"}
+
+    tmp_path = f"{snapshot_path}.tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(SCHEMA)
+        conn.executemany("INSERT INTO meta (key, value) VALUES (?, ?)", [
+            ("source_mtime_ns", str(source_mtime)),
+            ("extra", json.dumps(rest)),
+            ("count", str(len(agents)))
+        ])
+        conn.executemany(
+            "INSERT INTO agents (pos, name, name_lower, agent_id, record) VALUES (?, ?, ?, ?, ?)",
+            (
+                (
+                    pos,
+                    agent.get("name"),
+                    agent.get("name").lower() if agent.get("name") else None,
+                    str(agent["agent_id"]) if agent.get("agent_id") is not None else None,
+                    json.dumps(agent, separators=(",", ":"))
+                )
+                for pos, agent in enumerate(agents)
+            )
+        )
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, snapshot_path)
+    return len(agents)
+
+def snapshot_source_mtime(snapshot_path):
+    """source_mtime_ns recorded in a snapshot, or None if it's missing or unreadable"""
+    try:
+        conn = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+        try:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'source_mtime_ns'").fetchone()
+        finally:
+            conn.close()
+    except sqlite3.Error:
+        return None
+    return int(row[0]) if row else None
+
+class SnapshotRoster:
+    """
+    Read-only view of a compiled roster snapshot.
+
+    Nothing is read until the first lookup; agent records are decoded from
+    the snapshot only when asked for and kept in a bounded LRU.
+
+    Connections are per thread and per path rather than per instance, so a
+    reload doesn't strand the old roster's connections: the first lookup a
+    thread makes on the new roster closes the connection it held for the
+    old one (and with it the replaced snapshot file).
+    """
+    def __init__(self, snapshot_path, mtime, cache_size=SNAPSHOT_CACHE_SIZE):
+        self.path = snapshot_path
+        self.mtime = mtime
+        self.cache_size = cache_size
+        self.generation = next(_generations)
+        self._cache = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self._count = None
+
+    def _conn(self):
+        conns = getattr(_thread_conns, "by_path", None)
+        if conns is None:
+            conns = _thread_conns.by_path = {}
+        held = conns.get(self.path)
+        if held is not None:
+            generation, conn = held
+            if generation == self.generation:
+                return conn
+            # Only this thread ever uses it, so closing here can't race a query
+            conn.close()
+        conn = sqlite3.connect(f"file:{self.path}?mode=ro", uri=True)
+        conns[self.path] = (self.generation, conn)
+        return conn
+
+    def _record(self, column, value):
+        key = (column, value)
+        with self._cache_lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+        row = self._conn().execute(
+            f"SELECT record FROM agents WHERE {column} = ? ORDER BY pos LIMIT 1", (value,)
+        ).fetchone()
+        agent = json.loads(row[0]) if row else None
+        with self._cache_lock:
+            self._cache[key] = agent
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return agent
+
+    def by_name(self, name):
+        return self._record("name_lower", name.lower())
+
+    def by_id(self, agent_id):
+        return self._record("agent_id", str(agent_id))
+
+    def summaries(self):
+        return [
+            {"name": name, "agent_id": agent_id}
+            for name, agent_id in self._conn().execute("SELECT name, agent_id FROM agents ORDER BY pos")
+        ]
+
+    @property
+    def agents(self):
+        return [json.loads(record) for (record,) in self._conn().execute("SELECT record FROM agents ORDER BY pos")]
+
+    @property
+    def data(self):
+        extra = self._conn().execute("SELECT value FROM meta WHERE key = 'extra'").fetchone()
+        return {**json.loads(extra[0]), "agents": self.agents}
+
+    def __len__(self):
+        if self._count is None:
+            self._count = int(self._conn().execute("SELECT value FROM meta WHERE key = 'count'").fetchone()[0])
+        return self._count
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2 or sys.argv[1] != "build":
+        print("usage: python roster_snapshot.py build [data.json] [snapshot.db]")
+        sys.exit(2)
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    json_path = sys.argv[2] if len(sys.argv) > 2 else os.getenv("DATA_JSON_PATH", os.path.join(base_dir, "..", "data", "data.json"))
+    snapshot_path = sys.argv[3] if len(sys.argv) > 3 else os.getenv("ROSTER_SNAPSHOT_PATH", os.path.join(base_dir, "..", "data", "roster.db"))
+    count = build_snapshot(json_path, snapshot_path)
+    print(f"Wrote {count} agents to {snapshot_path}")
@@ -0,0 +1,247 @@
+import os
+import sys
+import json
+import time
+import argparse
+import threading
+
+from clock_time import parse_minutes
+
+# Pinned in requirements.txt; the pure-Python engine covers installs without it
+try:
+    import numpy as np
+    NUMPY_AVAILABLE = True
+except ImportError:
+    np = None
+    NUMPY_AVAILABLE = False
+
+# Worst first; ties are broken by the largest start-time discrepancy
+SCENARIO_SEVERITY = {
+    "large_discrepancy_both": 8,
+    "system_vs_edited_large": 7,
+    "significant_edit": 6,
+    "missing_system_time": 5,
+    "phone_disagrees": 4,
+    "moderate_edit": 3,
+    "missing_phone_time": 2,
+    "phone_supports_edit": 1,
+    "general_inquiry": 0
+}
+
+# Minute thresholds for time_scenario; the NumPy engine applies the same ones
+SCENARIO_THRESHOLDS = {
+    "large_edit": 30,
+    "large_phone_edit": 15,
+    "phone_matches_system": 5,
+    "moderate_edit": 15,
+    "phone_supports_edit": 10,
+    "phone_disagrees": 20
+}
+
+TRIAGE_FIELDS = ("start_time_diff", "phone_system_diff", "phone_edited_diff")
+
+def start_time_columns(agents):
+    """Names, ids and raw system/phone/edited start strings as parallel lists"""
+    def start(agent, section):
+        return (agent.get(section) or {}).get("start_time")
+    return {
+        "name": [agent.get("name") for agent in agents],
+        "agent_id": [agent.get("agent_id") for agent in agents],
+        "system": [start(agent, "system") for agent in agents],
+        "phone": [start(agent, "phone") for agent in agents],
+        "edited": [start(agent, "agent_disputed") for agent in agents]
+    }
+
+def _minutes_by_string(*columns):
+    """Parse each distinct time string once; rosters repeat the same times a lot"""
+    parsed = {}
+    for column in columns:
+        for value in column:
+            if value not in parsed:
+                parsed[value] = parse_minutes(value)
+    return parsed
+
+def time_scenario(system_known, phone_known, edited_known, start_diff, phone_system, phone_edited):
+    """
+    The scenario rules behind analyze_time_scenario, shared by the chat path
+    and both triage engines. Diffs are minutes, None when unknown; a zero
+    diff counts as no diff.
+    """
+    t = SCENARIO_THRESHOLDS
+    if not system_known and edited_known:
+        return "missing_system_time"
+    if not phone_known and edited_known:
+        return "missing_phone_time"
+    if start_diff and start_diff > t["large_edit"]:
+        if phone_edited and phone_edited > t["large_phone_edit"]:
+            return "large_discrepancy_both"
+        if phone_system and phone_system < t["phone_matches_system"]:
+            return "system_vs_edited_large"
+        return "significant_edit"
+    if start_diff and start_diff > t["moderate_edit"]:
+        if phone_edited and phone_edited < t["phone_supports_edit"]:
+            return "phone_supports_edit"
+        return "moderate_edit"
+    if phone_known and phone_edited and phone_edited > t["phone_disagrees"]:
+        return "phone_disagrees"
+    return "general_inquiry"
+
+def _diff(a, b):
+    return abs(a - b) if a is not None and b is not None else None
+
+def _triage_python(columns):
+    parsed = _minutes_by_string(columns["system"], columns["phone"], columns["edited"])
+    system = [parsed[v] for v in columns["system"]]
+    phone = [parsed[v] for v in columns["phone"]]
+    edited = [parsed[v] for v in columns["edited"]]
+
+    start_diff = [_diff(e, s) for e, s in zip(edited, system)]
+    phone_system = [_diff(p, s) for p, s in zip(phone, system)]
+    phone_edited = [_diff(p, e) for p, e in zip(phone, edited)]
+    scenarios = [
+        time_scenario(s is not None, p is not None, e is not None, *diffs)
+        for s, p, e, *diffs in zip(system, phone, edited, start_diff, phone_system, phone_edited)
+    ]
+
+    def sort_key(i):
+        worst = max(start_diff[i] or 0, phone_edited[i] or 0)
+        return (-SCENARIO_SEVERITY[scenarios[i]], -worst)
+
+    order = sorted(range(len(scenarios)), key=sort_key)
+    return order, scenarios, {
+        "start_time_diff": start_diff,
+        "phone_system_diff": phone_system,
+        "phone_edited_diff": phone_edited
+    }
+
+def _triage_numpy(columns):
+    parsed = _minutes_by_string(columns["system"], columns["phone"], columns["edited"])
+
+    def minutes(column):
+        return np.array([np.nan if parsed[v] is None else parsed[v] for v in column], dtype=np.float64)
+
+    system, phone, edited = minutes(columns["system"]), minutes(columns["phone"]), minutes(columns["edited"])
+    system_known, phone_known, edited_known = ~np.isnan(system), ~np.isnan(phone), ~np.isnan(edited)
+
+    # NaN diffs stand in for None; every comparison against NaN is False,
+    # matching the truthiness checks in time_scenario
+    start_diff = np.abs(edited - system)
+    phone_system = np.abs(phone - system)
+    phone_edited = np.abs(phone - edited)
+
+    t = SCENARIO_THRESHOLDS
+    large = start_diff > t["large_edit"]
+    medium = ~large & (start_diff > t["moderate_edit"])
+    labels = np.array(list(SCENARIO_SEVERITY), dtype=object)
+    codes = {name: i for i, name in enumerate(labels)}
+    scenario = np.select(
+        [
+            ~system_known & edited_known,
+            ~phone_known & edited_known,
+            large & (phone_edited > t["large_phone_edit"]),
+            large & (phone_system > 0) & (phone_system < t["phone_matches_system"]),
+            large,
+            medium & (phone_edited > 0) & (phone_edited < t["phone_supports_edit"]),
+            medium,
+            phone_known & (phone_edited > t["phone_disagrees"])
+        ],
+        [
+            codes["missing_system_time"],
+            codes["missing_phone_time"],
+            codes["large_discrepancy_both"],
+            codes["system_vs_edited_large"],
+            codes["significant_edit"],
+            codes["phone_supports_edit"],
+            codes["moderate_edit"],
+            codes["phone_disagrees"]
+        ],
+        default=codes["general_inquiry"]
+    )
+
+    severity = np.array([SCENARIO_SEVERITY[name] for name in labels])[scenario]
+    worst = np.fmax(np.nan_to_num(start_diff, nan=0.0), np.nan_to_num(phone_edited, nan=0.0))
+    # lexsort is stable and sorts by the last key first, like the sorted() fallback
+    order = np.lexsort((-worst, -severity))
+
+    def as_ints(values):
+        return [None if v != v else int(v) for v in values.tolist()]
+
+    return order.tolist(), labels[scenario].tolist(), {
+        "start_time_diff": as_ints(start_diff),
+        "phone_system_diff": as_ints(phone_system),
+        "phone_edited_diff": as_ints(phone_edited)
+    }
+
+class RosterTriage:
+    """
+    Every agent's start-time diffs and scenario label, ranked worst first.
+
+    Computed for the whole roster in one vectorized pass (NumPy when
+    installed, plain Python otherwise) and kept until the roster reloads, so
+    paging through the result doesn't recompute it.
+    """
+    def __init__(self, roster, use_numpy=NUMPY_AVAILABLE):
+        self.roster = roster
+        self.use_numpy = use_numpy and NUMPY_AVAILABLE
+        self._lock = threading.Lock()
+        self._version = object()
+        self._result = None
+        self.compute_ms = None
+
+    @property
+    def engine(self):
+        return "numpy" if self.use_numpy else "python"
+
+    def _current(self):
+        version = self.roster.version
+        with self._lock:
+            if version != self._version:
+                started = time.perf_counter()
+                columns = start_time_columns(self.roster.agents)
+                triage = _triage_numpy if self.use_numpy else _triage_python
+                self._result = (columns, *triage(columns))
+                self._version = version
+                self.compute_ms = (time.perf_counter() - started) * 1000
+            return self._result
+
+    def page(self, offset=0, limit=100, scenario=None):
+        """(total matching, rows for this page)"""
+        columns, order, scenarios, diffs = self._current()
+        if scenario:
+            order = [i for i in order if scenarios[i] == scenario]
+        rows = [
+            {
+                "rank": offset + n + 1,
+                "name": columns["name"][i],
+                "agent_id": columns["agent_id"][i],
+                "scenario": scenarios[i],
+                "severity": SCENARIO_SEVERITY[scenarios[i]],
+                **{field: diffs[field][i] for field in TRIAGE_FIELDS}
+            }
+            for n, i in enumerate(order[offset:offset + limit])
+        ]
+        return len(order), rows
+
+if __name__ == "__main__":
+    from agent_roster import AgentRoster
+
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    parser = argparse.ArgumentParser(description="Rank agents by start-time discrepancy")
+    parser.add_argument("data_json", nargs="?", default=os.getenv("DATA_JSON_PATH", os.path.join(base_dir, "..", "data", "data.json")))
+    parser.add_argument("--snapshot", default=os.getenv("ROSTER_SNAPSHOT_PATH", os.path.join(base_dir, "..", "data", "roster.db")))
+    parser.add_argument("--limit", type=int, default=50)
+    parser.add_argument("--offset", type=int, default=0)
+    parser.add_argument("--scenario", choices=list(SCENARIO_SEVERITY))
+    parser.add_argument("--json", action="store_true", help="print rows as JSON lines")
+    args = parser.parse_args()
+
+    triage = RosterTriage(AgentRoster(args.data_json, snapshot_path=args.snapshot))
+    total, rows = triage.page(args.offset, args.limit, args.scenario)
+    if args.json:
+        for row in rows:
+            print(json.dumps(row))
+    else:
+        for row in rows:
+            print(f"{row['rank']:>6}  {str(row['name'])[:28]:<28} {row['scenario']:<24} "
+                  f"edit {row['start_time_diff']!s:>5}  phone/edit {row['phone_edited_diff']!s:>5}")
+    print(f"{total} agents ranked in {triage.compute_ms:.0f} ms ({triage.engine})", file=sys.stderr)
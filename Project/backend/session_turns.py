@@ -0,0 +1,146 @@
+import time
+import threading
+from collections import deque
+from metrics import CHAT_TURNS_COALESCED
+
+class TurnWaitTimeout(TimeoutError):
+    """A leader's turn didn't come up within begin()'s timeout"""
+
+class TurnFlight:
+    """One chat turn in progress (or recently finished) for a (session, fingerprint) pair"""
+    __slots__ = ("key", "queue", "ticket", "event", "result", "done_at")
+
+    def __init__(self, key):
+        self.key = key
+        self.queue = None
+        self.ticket = 0
+        self.event = threading.Event()
+        self.result = None
+        self.done_at = None
+
+    def wait(self, timeout=None):
+        """The leader's result, or None if it failed or didn't finish within timeout"""
+        if not self.event.wait(timeout):
+            return None
+        return self.result
+
+class _SessionQueue:
+    __slots__ = ("cond", "next_ticket", "serving", "refs", "abandoned")
+
+    def __init__(self):
+        self.cond = threading.Condition()
+        self.next_ticket = 0
+        self.serving = 0
+        self.refs = 0
+        self.abandoned = set()
+
+class SessionTurns:
+    """
+    Per-session single-flight and FIFO ordering of chat turns.
+
+    begin() returns (flight, leader). Identical turns (same session and
+    fingerprint) arriving while one is in flight, or within dedup_window
+    seconds after it finished, are followers: they wait() for the leader's
+    result instead of recomputing and re-persisting it. Leaders of one
+    session run one at a time in arrival order (a ticket queue per session),
+    while different sessions never wait on each other. Leaders must call
+    finish() exactly once, normally from a finally block. A leader still
+    queued after begin()'s timeout gives up its ticket and gets
+    TurnWaitTimeout; its followers get None from wait().
+
+    The state is per process; with several workers, route a session's
+    requests to one worker for coalescing to apply across retries.
+    """
+    def __init__(self, dedup_window=2.0):
+        self.dedup_window = dedup_window
+        self._flights = {}
+        self._recent = deque()
+        self._queues = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _session_key(session_id):
+        try:
+            return int(session_id)
+        except (TypeError, ValueError):
+            return session_id
+
+    def _expire(self, now):
+        while self._recent and now - self._recent[0][0] > self.dedup_window:
+            _, key = self._recent.popleft()
+            flight = self._flights.get(key)
+            if flight is not None and flight.done_at is not None and now - flight.done_at > self.dedup_window:
+                del self._flights[key]
+
+    def begin(self, session_id, fingerprint, timeout=None):
+        session_key = self._session_key(session_id)
+        key = (session_key, fingerprint)
+        with self._lock:
+            self._expire(time.monotonic())
+            flight = self._flights.get(key)
+            if flight is not None:
+                CHAT_TURNS_COALESCED.inc()
+                return flight, False
+            flight = self._flights[key] = TurnFlight(key)
+            queue = self._queues.get(session_key)
+            if queue is None:
+                queue = self._queues[session_key] = _SessionQueue()
+            queue.refs += 1
+            flight.queue = queue
+            flight.ticket = queue.next_ticket
+            queue.next_ticket += 1
+
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with queue.cond:
+            while queue.serving != flight.ticket:
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    # finish() skips the ticket when the queue reaches it
+                    queue.abandoned.add(flight.ticket)
+                    break
+                queue.cond.wait(remaining)
+            else:
+                return flight, True
+        self._retire(flight, None)
+        flight.event.set()
+        raise TurnWaitTimeout(f"session {session_id} was busy for {timeout}s")
+
+    def finish(self, flight, result=None):
+        """Publish the leader's result (None on failure) and let the session's next turn run; idempotent"""
+        if not self._retire(flight, result):
+            return
+        queue = flight.queue
+        with queue.cond:
+            queue.serving += 1
+            while queue.serving in queue.abandoned:
+                queue.abandoned.remove(queue.serving)
+                queue.serving += 1
+            queue.cond.notify_all()
+        flight.event.set()
+
+    def _retire(self, flight, result):
+        """Record the flight's result and drop its queue reference; False if it was already retired"""
+        queue = flight.queue
+        with self._lock:
+            if flight.done_at is not None:
+                return False
+            now = time.monotonic()
+            flight.result = result
+            flight.done_at = now
+            queue.refs -= 1
+            if queue.refs == 0:
+                del self._queues[flight.key[0]]
+            if result is None or self.dedup_window <= 0:
+                if self._flights.get(flight.key) is flight:
+                    del self._flights[flight.key]
+            else:
+                self._recent.append((now, flight.key))
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {
+                "in_flight": sum(1 for flight in self._flights.values() if flight.done_at is None),
+                "recent": sum(1 for flight in self._flights.values() if flight.done_at is not None),
+                "sessions": len(self._queues)
+            }
@@ -0,0 +1,235 @@
+import os
+import json
+import sqlite3
+import sys
+import threading
+import time
+from collections import OrderedDict
+from multiprocessing.managers import BaseManager
+
+STATE_BACKEND = os.getenv("STATE_BACKEND", "local")
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "data", "state.db"))
+STATE_SOCKET_ADDRESS = os.getenv("STATE_SOCKET_ADDRESS", "127.0.0.1:50055")
+# Required for the socket backend; the manager protocol unpickles what it receives
+STATE_SOCKET_AUTHKEY = os.getenv("STATE_SOCKET_AUTHKEY", "")
+STATE_SOCKET_MAX_SESSIONS = int(os.getenv("STATE_SOCKET_MAX_SESSIONS", "100000"))
+
+class StateStore:
+    """Tracker state shared by every worker process serving the backend.
+
+    States are plain JSON-serializable dicts keyed by session id. Every
+    write bumps the session's version; compare_and_save() only writes if
+    the version is still the one the caller loaded (0 = no state yet).
+    """
+    def load(self, session_id):
+        state, _ = self.load_versioned(session_id)
+        return state
+
+    def load_versioned(self, session_id):
+        """(state or None, version)"""
+        raise NotImplementedError
+
+    def save(self, session_id, state):
+        raise NotImplementedError
+
+    def compare_and_save(self, session_id, state, expected_version):
+        """Write state if the stored version is expected_version; returns whether it did"""
+        raise NotImplementedError
+
+    def delete(self, session_id):
+        raise NotImplementedError
+
+class SQLiteStateStore(StateStore):
+    """State store in a WAL-mode SQLite file, safe for concurrent worker processes"""
+    def __init__(self, path=STATE_DB_PATH, busy_timeout_ms=5000):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        self._local = threading.local()
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        conn = self._connection()
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS tracker_state (
+                session_id TEXT PRIMARY KEY,
+                state TEXT NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                updated_at REAL NOT NULL
+            )
+        """)
+        columns = [row[1] for row in conn.execute("PRAGMA table_info(tracker_state)")]
+        if "version" not in columns:
+            conn.execute("ALTER TABLE tracker_state ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        conn.commit()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def load_versioned(self, session_id):
+        row = self._connection().execute(
+            "SELECT state, version FROM tracker_state WHERE session_id = ?", (str(session_id),)
+        ).fetchone()
+        return (json.loads(row[0]), row[1]) if row else (None, 0)
+
+    def save(self, session_id, state):
+        conn = self._connection()
+        conn.execute(
+            """
+            INSERT INTO tracker_state (session_id, state, version, updated_at) VALUES (?, ?, 1, ?)
+            ON CONFLICT(session_id) DO UPDATE SET
+                state = excluded.state, version = tracker_state.version + 1, updated_at = excluded.updated_at
+            """,
+            (str(session_id), json.dumps(state), time.time())
+        )
+        conn.commit()
+
+    def compare_and_save(self, session_id, state, expected_version):
+        conn = self._connection()
+        if expected_version == 0:
+            cursor = conn.execute(
+                """
+                INSERT INTO tracker_state (session_id, state, version, updated_at) VALUES (?, ?, 1, ?)
+                ON CONFLICT(session_id) DO NOTHING
+                """,
+                (str(session_id), json.dumps(state), time.time())
+            )
+        else:
+            cursor = conn.execute(
+                """
+                UPDATE tracker_state SET state = ?, version = version + 1, updated_at = ?
+                WHERE session_id = ? AND version = ?
+                """,
+                (json.dumps(state), time.time(), str(session_id), expected_version)
+            )
+        conn.commit()
+        return cursor.rowcount == 1
+
+    def delete(self, session_id):
+        conn = self._connection()
+        conn.execute("DELETE FROM tracker_state WHERE session_id = ?", (str(session_id),))
+        conn.commit()
+
+class _StateTable:
+    """In-memory table living in the state server process"""
+    def __init__(self, max_sessions=STATE_SOCKET_MAX_SESSIONS):
+        self.max_sessions = max_sessions
+        self._states = OrderedDict()
+        self._lock = threading.Lock()
+
+    def load(self, session_id):
+        """(payload or None, version)"""
+        with self._lock:
+            entry = self._states.get(str(session_id))
+            if entry is None:
+                return None, 0
+            self._states.move_to_end(str(session_id))
+            return entry
+
+    def _store(self, key, payload, version):
+        self._states[key] = (payload, version)
+        self._states.move_to_end(key)
+        while len(self._states) > self.max_sessions:
+            self._states.popitem(last=False)
+
+    def save(self, session_id, payload):
+        key = str(session_id)
+        with self._lock:
+            self._store(key, payload, self._states.get(key, (None, 0))[1] + 1)
+
+    def compare_and_save(self, session_id, payload, expected_version):
+        key = str(session_id)
+        with self._lock:
+            version = self._states.get(key, (None, 0))[1]
+            if version != expected_version:
+                return False
+            self._store(key, payload, version + 1)
+            return True
+
+    def delete(self, session_id):
+        with self._lock:
+            self._states.pop(str(session_id), None)
+
+class _StateManager(BaseManager):
+    pass
+
+def parse_address(address):
+    """'host:port' becomes a TCP address, anything else is a Unix socket path"""
+    host, sep, port = address.rpartition(":")
+    if sep and port.isdigit():
+        return (host or "127.0.0.1", int(port))
+    return address
+
+def require_authkey(authkey):
+    if not authkey:
+        raise ValueError("STATE_SOCKET_AUTHKEY must be set to a secret for the socket state backend")
+
+class SocketStateStore(StateStore):
+    """Client for the shared-memory state server started with `python state_store.py serve`.
+
+    Connects on first use rather than at import, and again in each process
+    that uses it, so pre-fork workers don't share the parent's socket and a
+    server that isn't up yet only fails the calls made before it is.
+    """
+    def __init__(self, address=STATE_SOCKET_ADDRESS, authkey=STATE_SOCKET_AUTHKEY):
+        require_authkey(authkey)
+        _StateManager.register("state_table")
+        self.address = parse_address(address)
+        self._authkey = authkey.encode()
+        self._lock = threading.Lock()
+        self._pid = None
+        self._proxy = None
+
+    def _table(self):
+        pid = os.getpid()
+        if self._pid != pid:
+            with self._lock:
+                if self._pid != pid:
+                    manager = _StateManager(address=self.address, authkey=self._authkey)
+                    manager.connect()
+                    self._proxy = manager.state_table()
+                    self._pid = pid
+        return self._proxy
+
+    def load_versioned(self, session_id):
+        payload, version = self._table().load(session_id)
+        return (json.loads(payload) if payload is not None else None), version
+
+    def save(self, session_id, state):
+        self._table().save(session_id, json.dumps(state))
+
+    def compare_and_save(self, session_id, state, expected_version):
+        return self._table().compare_and_save(session_id, json.dumps(state), expected_version)
+
+    def delete(self, session_id):
+        self._table().delete(session_id)
+
+def serve_state_store(address=STATE_SOCKET_ADDRESS, authkey=STATE_SOCKET_AUTHKEY):
+    """Run the shared state server in the foreground"""
+    require_authkey(authkey)
+    table = _StateTable()
+    _StateManager.register("state_table", callable=lambda: table)
+    manager = _StateManager(address=parse_address(address), authkey=authkey.encode())
+    server = manager.get_server()
+    print(f"State server listening on {address}")
+    server.serve_forever()
+
+def create_state_store(backend=STATE_BACKEND):
+    """Build the configured store, or None for the in-process tracker only"""
+    if backend == "sqlite":
+        return SQLiteStateStore()
+    if backend == "socket":
+        return SocketStateStore()
+    if backend in ("", "local", None):
+        return None
+    raise ValueError(f"Unknown STATE_BACKEND: {backend}")
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "serve":
+        serve_state_store(sys.argv[2] if len(sys.argv) > 2 else STATE_SOCKET_ADDRESS)
+    else:
+        print("Usage: python state_store.py serve [address]")
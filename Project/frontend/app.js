@@ -190,33 +190,33 @@ document.addEventListener("DOMContentLoaded", () => {
     gptMessages.push({ role: "user", content: text });
 
     try {
-      const res = await fetch(`${API_BASE}/chat_with_ai`, {
-        method: "POST",
-        headers: { "Content-Type": "application/json" },
-        body: JSON.stringify({
-          messages: gptMessages,
-          session_id: sessionId,
-          agent_name: "Nabeel Ahmad"
-        }),
+      const { reply, jobId } = await streamChat({
+        message: text,
+        session_id: sessionId,
+        agent_name: "Nabeel Ahmad"
       });
-
-      if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
-      
-      const data = await res.json();
-      const reply = data.response || "No response received.";
       
       console.log("Received reply:", reply);
       
-      if (reply.includes("CONVERSATION SUMMARY:") || reply.includes("Thank you for providing")) {
-        appendMessage("assistant", reply);
-        gptMessages.push({ role: "assistant", content: reply });
-        
+      gptMessages.push({ role: "assistant", content: reply });
+      saveMessage("assistant", reply);
+
+      // The closing summary is generated by a background job
+      let summary = "";
+      if (jobId) {
+        const result = await waitForJob(jobId);
+        summary = (result && result.summary) || "";
+        if (summary) {
+          gptMessages.push({ role: "assistant", content: summary });
+          appendMessage("assistant", summary, false);
+          saveMessage("assistant", summary);
+        }
+      }
+
+      if (summary || reply.includes("CONVERSATION SUMMARY:") || reply.includes("Thank you for providing")) {
         setTimeout(() => {
           startCountdownTimer();
         }, 1000);
-      } else {
-        appendMessage("assistant", reply);
-        gptMessages.push({ role: "assistant", content: reply });
       }
     } catch (err) {
       console.error("Error sending message:", err);
@@ -224,6 +224,83 @@ document.addEventListener("DOMContentLoaded", () => {
     }
   });
 
+  async function streamChat(payload) {
+    const res = await fetch(`${API_BASE}/chat_with_ai/stream`, {
+      method: "POST",
+      headers: { "Content-Type": "application/json" },
+      body: JSON.stringify(payload),
+    });
+
+    if (!res.ok) throw new Error(`HTTP error! status: ${res.status}`);
+
+    // Early validation errors come back as plain JSON instead of a stream
+    if (!(res.headers.get("Content-Type") || "").includes("text/event-stream")) {
+      const data = await res.json();
+      const reply = data.response || "No response received.";
+      appendMessage("assistant", reply, false);
+      return { reply, jobId: data.job_id };
+    }
+
+    const div = appendMessage("assistant", "", false);
+    const reader = res.body.getReader();
+    const decoder = new TextDecoder();
+    let buffer = "";
+    let streamed = "";
+    let reply = null;
+    let jobId = null;
+
+    while (reply === null) {
+      const { value, done } = await reader.read();
+      if (done) break;
+      buffer += decoder.decode(value, { stream: true });
+
+      let boundary;
+      while ((boundary = buffer.indexOf("\n\n")) !== -1) {
+        const rawEvent = buffer.slice(0, boundary);
+        buffer = buffer.slice(boundary + 2);
+
+        let eventName = "message";
+        let data = "";
+        rawEvent.split("\n").forEach(line => {
+          if (line.startsWith("event:")) eventName = line.slice(6).trim();
+          else if (line.startsWith("data:")) data += line.slice(5).trim();
+        });
+        if (!data) continue;
+
+        const payload = JSON.parse(data);
+        if (eventName === "token") {
+          streamed += payload.token;
+          setMessageText(div, "assistant", streamed);
+        } else if (eventName === "done") {
+          reply = payload.response || "No response received.";
+          jobId = payload.job_id || null;
+        }
+      }
+    }
+
+    reply = reply || streamed || "No response received.";
+    setMessageText(div, "assistant", reply);
+    return { reply, jobId };
+  }
+
+  async function waitForJob(jobId, timeoutMs = 30000) {
+    const deadline = Date.now() + timeoutMs;
+    while (Date.now() < deadline) {
+      try {
+        const res = await fetch(`${API_BASE}/jobs/${jobId}`);
+        if (res.ok) {
+          const job = await res.json();
+          if (job.status === "done") return job.result;
+          if (job.status === "failed") return null;
+        }
+      } catch (err) {
+        console.error("Error polling job:", err);
+      }
+      await new Promise(resolve => setTimeout(resolve, 500));
+    }
+    return null;
+  }
+
   userInput.addEventListener("keypress", (e) => {
     if (e.key === "Enter") {
       sendBtn.click();
@@ -239,19 +316,27 @@ document.addEventListener("DOMContentLoaded", () => {
     
     const div = document.createElement("div");
     div.className = `${role} message`;
-    
-    const label = role === "user" ? "AGENT" : "QUARTZ AI";
-    div.innerHTML = `<b>${label}:</b><br>${text.replace(/\n/g, "<br>")}`;
     chatBox.appendChild(div);
-
-    chatBox.scrollTop = chatBox.scrollHeight;
+    setMessageText(div, role, text);
 
     if (save) {
-      const saved = JSON.parse(localStorage.getItem("chatMessages") || "[]");
-      saved.push({ role, text });
-      localStorage.setItem("chatMessages", JSON.stringify(saved));
-      localStorage.setItem("gptMessages", JSON.stringify(gptMessages));
+      saveMessage(role, text);
     }
+
+    return div;
+  }
+
+  function setMessageText(div, role, text) {
+    const label = role === "user" ? "AGENT" : "QUARTZ AI";
+    div.innerHTML = `<b>${label}:</b><br>${text.replace(/\n/g, "<br>")}`;
+    chatBox.scrollTop = chatBox.scrollHeight;
+  }
+
+  function saveMessage(role, text) {
+    const saved = JSON.parse(localStorage.getItem("chatMessages") || "[]");
+    saved.push({ role, text });
+    localStorage.setItem("chatMessages", JSON.stringify(saved));
+    localStorage.setItem("gptMessages", JSON.stringify(gptMessages));
   }
 
   chatToggle.addEventListener("click", function() {